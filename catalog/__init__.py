@@ -0,0 +1,7 @@
+__all__ = [
+    "Catalog",
+    "DEFAULT_DB_PATH",
+    "SimilarBook",
+]
+
+from .store import DEFAULT_DB_PATH, Catalog, SimilarBook
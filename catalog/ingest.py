@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+from .store import DEFAULT_DB_PATH, Catalog
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="python -m catalog.ingest",
+        description="Load Step1 txt files and Step2 slice runs into a local SQLite catalog (FTS5).",
+    )
+    p.add_argument(
+        "paths",
+        nargs="*",
+        help="Library dirs (scanned for *.txt and *_slice/*/slices.json), .txt files or slice run dirs. Default: book/",
+    )
+    p.add_argument("--db", default=str(DEFAULT_DB_PATH), help=f"SQLite path. Default: {DEFAULT_DB_PATH}")
+    p.add_argument("--force", action="store_true", help="Re-ingest even if unchanged / already ingested.")
+    return p
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    paths = [Path(p) for p in (args.paths or ["book"])]
+    counts = {"books": 0, "runs": 0, "skipped": 0}
+    with Catalog(args.db) as catalog:
+        for p in paths:
+            if p.is_dir() and (p / "slices.json").exists():
+                key = "runs" if catalog.ingest_slice_run(p, force=args.force) else "skipped"
+                counts[key] += 1
+            elif p.is_dir():
+                for k, v in catalog.ingest_library(p, force=args.force).items():
+                    counts[k] += v
+            elif p.suffix == ".txt":
+                key = "books" if catalog.ingest_txt(p, force=args.force) else "skipped"
+                counts[key] += 1
+            else:
+                build_parser().error(f"unsupported path: {p}")
+    print(f"books={counts['books']} runs={counts['runs']} skipped={counts['skipped']}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
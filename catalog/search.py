@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import argparse
+import json
+from dataclasses import asdict
+
+from .store import DEFAULT_DB_PATH, Catalog
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="python -m catalog.search",
+        description="Full-text search over slices (title/summary/text) or cleaned lines in the SQLite catalog.",
+    )
+    p.add_argument("query", nargs="?", help="Text to search for (substring match)")
+    p.add_argument("--db", default=str(DEFAULT_DB_PATH), help=f"SQLite path. Default: {DEFAULT_DB_PATH}")
+    p.add_argument("--book", help="Restrict to one book (txt stem)")
+    p.add_argument("--lines", action="store_true", help="Search Step1 lines instead of slices.")
+    p.add_argument("--all-runs", action="store_true", help="Include slices of older runs (default: latest ok run).")
+    p.add_argument("--limit", type=int, default=20, help="Max results (default 20).")
+    p.add_argument("--json", action="store_true", help="Print results as JSON lines.")
+    p.add_argument("--list-books", action="store_true", help="List ingested books and exit.")
+    return p
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    with Catalog(args.db) as catalog:
+        if args.list_books:
+            for b in catalog.list_books():
+                if args.json:
+                    print(json.dumps(asdict(b), ensure_ascii=False))
+                else:
+                    print(f"{b.stem}\tlines={b.line_count}\tchars={b.char_count}\truns={b.runs}")
+            return 0
+        if not args.query:
+            build_parser().error("query is required")
+        if args.lines:
+            for h in catalog.search_lines(args.query, book=args.book, limit=args.limit):
+                if args.json:
+                    print(json.dumps(asdict(h), ensure_ascii=False))
+                else:
+                    print(f"{h.book}:{h.line_no}\t{h.text}")
+            return 0
+        for s in catalog.search_slices(
+            args.query,
+            book=args.book,
+            limit=args.limit,
+            latest_only=not args.all_runs,
+        ):
+            if args.json:
+                print(json.dumps(asdict(s), ensure_ascii=False))
+            else:
+                title = f" {s.title}" if s.title else ""
+                print(f"{s.book}#{s.slice_id} L{s.start_line}-{s.end_line}{title}\t{s.snippet}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,523 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from step1_cleaning.fingerprint import band_keys, book_signature, load_signature, similarity
+
+
+DEFAULT_DB_PATH = Path("book") / "catalog.sqlite"
+
+_BATCH_ROWS = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    stem TEXT NOT NULL UNIQUE,
+    txt_path TEXT,
+    txt_sha256 TEXT,
+    line_count INTEGER NOT NULL DEFAULT 0,
+    char_count INTEGER NOT NULL DEFAULT 0,
+    ingested_at TEXT
+);
+CREATE TABLE IF NOT EXISTS lines (
+    id INTEGER PRIMARY KEY,
+    book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+    line_no INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS lines_book_line ON lines(book_id, line_no);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+    run_dir TEXT NOT NULL UNIQUE,
+    created_at TEXT,
+    status TEXT,
+    dry_run INTEGER NOT NULL DEFAULT 0,
+    providers_used TEXT,
+    models_used TEXT,
+    slices_written INTEGER,
+    meta TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_book ON runs(book_id, created_at);
+CREATE TABLE IF NOT EXISTS slices (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+    slice_id INTEGER NOT NULL,
+    start_line INTEGER NOT NULL,
+    end_line INTEGER NOT NULL,
+    char_len INTEGER,
+    title TEXT,
+    summary TEXT,
+    text TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS slices_run ON slices(run_id, slice_id);
+CREATE INDEX IF NOT EXISTS slices_book_span ON slices(book_id, start_line, end_line);
+CREATE TABLE IF NOT EXISTS book_signatures (
+    book_id INTEGER PRIMARY KEY REFERENCES books(id) ON DELETE CASCADE,
+    signature TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS signature_bands (
+    band_key INTEGER NOT NULL,
+    book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS signature_bands_key ON signature_bands(band_key);
+CREATE INDEX IF NOT EXISTS signature_bands_book ON signature_bands(book_id);
+"""
+
+# Whole-book MinHash signatures are split into LSH bands of this many bins; books sharing a band
+# are near-duplicate candidates (see step1_cleaning/fingerprint.py).
+_BAND_ROWS = 4
+_MAX_CANDIDATES = 50
+
+# External-content FTS5 tables kept in sync by triggers.
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS lines_fts USING fts5(
+    text, content='lines', content_rowid='id', tokenize='{tokenize}'
+);
+CREATE TRIGGER IF NOT EXISTS lines_ai AFTER INSERT ON lines BEGIN
+    INSERT INTO lines_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS lines_ad AFTER DELETE ON lines BEGIN
+    INSERT INTO lines_fts(lines_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE VIRTUAL TABLE IF NOT EXISTS slices_fts USING fts5(
+    title, summary, text, content='slices', content_rowid='id', tokenize='{tokenize}'
+);
+CREATE TRIGGER IF NOT EXISTS slices_ai AFTER INSERT ON slices BEGIN
+    INSERT INTO slices_fts(rowid, title, summary, text) VALUES (new.id, new.title, new.summary, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS slices_ad AFTER DELETE ON slices BEGIN
+    INSERT INTO slices_fts(slices_fts, rowid, title, summary, text)
+    VALUES ('delete', old.id, old.title, old.summary, old.text);
+END;
+"""
+
+# Latest successful run per book; older runs stay searchable with latest_only=False.
+_LATEST_RUN = """
+r.id = (
+    SELECT r2.id FROM runs r2
+    WHERE r2.book_id = r.book_id AND r2.status = 'ok'
+    ORDER BY r2.created_at DESC, r2.id DESC LIMIT 1
+)
+"""
+
+
+@dataclass(frozen=True)
+class BookInfo:
+    stem: str
+    txt_path: str | None
+    line_count: int
+    char_count: int
+    runs: int
+    ingested_at: str | None
+
+
+@dataclass(frozen=True)
+class SimilarBook:
+    stem: str
+    txt_path: str | None
+    similarity: float
+    run_dir: str | None  # latest successful slice run, if any
+
+
+@dataclass(frozen=True)
+class LineHit:
+    book: str
+    line_no: int
+    text: str
+
+
+@dataclass(frozen=True)
+class SliceHit:
+    book: str
+    run_dir: str
+    slice_id: int
+    start_line: int
+    end_line: int
+    char_len: int | None
+    title: str | None
+    summary: str | None
+    snippet: str
+    models_used: list[str]
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _batched(rows: Iterable[tuple[Any, ...]], size: int) -> Iterator[list[tuple[Any, ...]]]:
+    batch: list[tuple[Any, ...]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _count_chars(text: str) -> int:
+    return sum(1 for ch in text if not ch.isspace())
+
+
+def _band_hashes(sig: list[int]) -> list[int]:
+    # One signed 64-bit key per band, for an integer index.
+    return [
+        int.from_bytes(hashlib.blake2b(repr(key).encode("ascii"), digest_size=8).digest(), "little", signed=True)
+        for key in band_keys(sig, _BAND_ROWS)
+    ]
+
+
+class Catalog:
+    def __init__(self, path: str | Path = DEFAULT_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        self.tokenizer = self._init_fts()
+
+    def _init_fts(self) -> str:
+        row = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'lines_fts'").fetchone()
+        if row is not None:
+            return "trigram" if "trigram" in row["sql"] else "unicode61"
+        # trigram (SQLite >= 3.34) gives substring search for CJK text, where unicode61 would
+        # treat a whole run of Chinese characters as one token.
+        for tokenize in ("trigram", "unicode61"):
+            try:
+                self._conn.executescript(_FTS_SCHEMA.format(tokenize=tokenize))
+                return tokenize
+            except sqlite3.OperationalError:
+                continue
+        raise RuntimeError("SQLite FTS5 is not available in this Python build")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> Catalog:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _book_id(self, stem: str) -> int:
+        self._conn.execute("INSERT OR IGNORE INTO books(stem) VALUES (?)", (stem,))
+        return int(self._conn.execute("SELECT id FROM books WHERE stem = ?", (stem,)).fetchone()["id"])
+
+    def ingest_txt(self, txt_path: str | Path, *, force: bool = False) -> bool:
+        txt_path = Path(txt_path)
+        digest = _sha256_file(txt_path)
+        stem = txt_path.stem
+        row = self._conn.execute(
+            "SELECT b.txt_sha256, s.book_id AS signed FROM books b "
+            "LEFT JOIN book_signatures s ON s.book_id = b.id WHERE b.stem = ?",
+            (stem,),
+        ).fetchone()
+        # Books ingested before signatures existed are read again once to get one.
+        if row is not None and row["txt_sha256"] == digest and row["signed"] is not None and not force:
+            return False
+
+        # Line numbers follow step2_slice: 1-based over non-empty lines.
+        char_count = 0
+        line_count = 0
+        sig = load_signature(txt_path)  # Step1 sidecar; computed from the lines if missing
+        texts: list[str] | None = None if sig is not None else []
+
+        def rows(book_id: int) -> Iterator[tuple[int, int, str]]:
+            nonlocal char_count, line_count
+            with txt_path.open("r", encoding="utf-8") as f:
+                for raw in f:
+                    s = raw.strip()
+                    if not s:
+                        continue
+                    line_count += 1
+                    char_count += _count_chars(s)
+                    if texts is not None:
+                        texts.append(s)
+                    yield (book_id, line_count, s)
+
+        with self._conn:
+            book_id = self._book_id(stem)
+            self._conn.execute("DELETE FROM lines WHERE book_id = ?", (book_id,))
+            for batch in _batched(rows(book_id), _BATCH_ROWS):
+                self._conn.executemany("INSERT INTO lines(book_id, line_no, text) VALUES (?, ?, ?)", batch)
+            self._conn.execute(
+                "UPDATE books SET txt_path = ?, txt_sha256 = ?, line_count = ?, char_count = ?, ingested_at = ? "
+                "WHERE id = ?",
+                (
+                    str(txt_path),
+                    digest,
+                    line_count,
+                    char_count,
+                    time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+                    book_id,
+                ),
+            )
+            if sig is None:
+                sig, _ = book_signature(texts or [])
+            self._set_signature(book_id, sig)
+        return True
+
+    def _set_signature(self, book_id: int, sig: list[int]) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO book_signatures(book_id, signature) VALUES (?, ?)", (book_id, json.dumps(sig))
+        )
+        self._conn.execute("DELETE FROM signature_bands WHERE book_id = ?", (book_id,))
+        self._conn.executemany(
+            "INSERT INTO signature_bands(band_key, book_id) VALUES (?, ?)",
+            [(k, book_id) for k in _band_hashes(sig)],
+        )
+
+    def similar_books(
+        self,
+        sig: list[int],
+        *,
+        threshold: float,
+        exclude: str | None = None,
+        limit: int = 5,
+    ) -> list[SimilarBook]:
+        # Books whose estimated similarity to `sig` is at least threshold, most similar first.
+        # Candidates come from the band index (one indexed lookup per band), so the cost does not
+        # grow with the number of books; only candidates' signatures are compared.
+        keys = _band_hashes(sig)
+        if not keys:
+            return []
+        marks = ",".join("?" * len(keys))
+        rows = self._conn.execute(
+            "SELECT b.id, b.stem, b.txt_path, s.signature, COUNT(*) AS hits FROM signature_bands sb "
+            "JOIN books b ON b.id = sb.book_id JOIN book_signatures s ON s.book_id = b.id "
+            f"WHERE sb.band_key IN ({marks}) GROUP BY b.id ORDER BY hits DESC LIMIT ?",
+            [*keys, _MAX_CANDIDATES],
+        ).fetchall()
+        out: list[SimilarBook] = []
+        for r in rows:
+            if r["stem"] == exclude:
+                continue
+            sim = similarity(sig, json.loads(r["signature"]))
+            if sim < threshold:
+                continue
+            run = self._conn.execute(
+                "SELECT run_dir FROM runs WHERE book_id = ? AND status = 'ok' AND dry_run = 0 "
+                "ORDER BY created_at DESC, id DESC LIMIT 1",
+                (r["id"],),
+            ).fetchone()
+            out.append(
+                SimilarBook(
+                    stem=r["stem"],
+                    txt_path=r["txt_path"],
+                    similarity=sim,
+                    run_dir=run["run_dir"] if run else None,
+                )
+            )
+        out.sort(key=lambda b: (-b.similarity, b.stem))
+        return out[:limit]
+
+    def ingest_slice_run(self, run_dir: str | Path, *, force: bool = False) -> bool:
+        run_dir = Path(run_dir)
+        slices_path = run_dir / "slices.json"
+        meta_path = run_dir / "run.json"
+        meta: dict[str, Any] = {}
+        if meta_path.exists():
+            loaded = json.loads(meta_path.read_text(encoding="utf-8"))
+            if isinstance(loaded, dict):
+                meta = loaded
+        items = json.loads(slices_path.read_text(encoding="utf-8"))
+        if not isinstance(items, list):
+            raise ValueError(f"slices.json must be a JSON array: {slices_path}")
+
+        if meta.get("reused_from"):
+            # Copy of another book's run (slice_many --near-duplicates reuse); that run is the one indexed.
+            return False
+
+        source = meta.get("source_txt")
+        if source:
+            stem = Path(str(source)).stem
+        else:
+            # book/<stem>_slice/<timestamp>/slices.json
+            stem = run_dir.parent.name.removesuffix("_slice")
+
+        key = str(run_dir.resolve())
+        row = self._conn.execute("SELECT id FROM runs WHERE run_dir = ?", (key,)).fetchone()
+        if row is not None and not force:
+            return False
+
+        with self._conn:
+            book_id = self._book_id(stem)
+            if row is not None:
+                self._conn.execute("DELETE FROM runs WHERE id = ?", (row["id"],))
+            cur = self._conn.execute(
+                "INSERT INTO runs(book_id, run_dir, created_at, status, dry_run, providers_used, models_used, "
+                "slices_written, meta) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    book_id,
+                    key,
+                    meta.get("created_at"),
+                    meta.get("status"),
+                    1 if meta.get("dry_run") else 0,
+                    json.dumps(meta.get("providers_used") or [], ensure_ascii=False),
+                    json.dumps(meta.get("models_used") or [], ensure_ascii=False),
+                    meta.get("slices_written", len(items)),
+                    json.dumps(meta, ensure_ascii=False),
+                ),
+            )
+            run_id = cur.lastrowid
+            rows = (
+                (
+                    run_id,
+                    book_id,
+                    int(it.get("slice_id", 0)),
+                    int(it.get("start_line", 0)),
+                    int(it.get("end_line", 0)),
+                    it.get("char_len"),
+                    it.get("title"),
+                    it.get("summary"),
+                    it.get("text"),
+                    it.get("error"),
+                )
+                for it in items
+                if isinstance(it, dict)
+            )
+            for batch in _batched(rows, _BATCH_ROWS):
+                self._conn.executemany(
+                    "INSERT INTO slices(run_id, book_id, slice_id, start_line, end_line, char_len, title, summary, "
+                    "text, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    batch,
+                )
+        return True
+
+    def ingest_library(self, root: str | Path = "book", *, force: bool = False) -> dict[str, int]:
+        root = Path(root)
+        counts = {"books": 0, "runs": 0, "skipped": 0}
+        for txt in sorted(root.glob("*.txt")):
+            if self.ingest_txt(txt, force=force):
+                counts["books"] += 1
+            else:
+                counts["skipped"] += 1
+        for slices_json in sorted(root.glob("*_slice/*/slices.json")):
+            if self.ingest_slice_run(slices_json.parent, force=force):
+                counts["runs"] += 1
+            else:
+                counts["skipped"] += 1
+        return counts
+
+    def _match_clause(self, table: str, query: str) -> tuple[str, str]:
+        # trigram needs >= 3 characters; shorter queries fall back to LIKE (a scan).
+        if self.tokenizer == "trigram" and len(query) < 3:
+            like = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            return f"{table}.text LIKE ? ESCAPE '\\'", like
+        return f"{table} MATCH ?", '"' + query.replace('"', '""') + '"'
+
+    def search_lines(self, query: str, *, book: str | None = None, limit: int = 20) -> list[LineHit]:
+        clause, param = self._match_clause("lines_fts", query)
+        sql = (
+            "SELECT b.stem, l.line_no, l.text FROM lines_fts "
+            "JOIN lines l ON l.id = lines_fts.rowid JOIN books b ON b.id = l.book_id "
+            f"WHERE {clause}"
+        )
+        params: list[Any] = [param]
+        if book:
+            sql += " AND b.stem = ?"
+            params.append(book)
+        sql += " ORDER BY b.stem, l.line_no LIMIT ?"
+        params.append(limit)
+        return [LineHit(book=r[0], line_no=r[1], text=r[2]) for r in self._conn.execute(sql, params)]
+
+    def search_slices(
+        self,
+        query: str,
+        *,
+        book: str | None = None,
+        limit: int = 20,
+        latest_only: bool = True,
+    ) -> list[SliceHit]:
+        clause, param = self._match_clause("slices_fts", query)
+        fts = "MATCH" in clause
+        if fts:
+            snip, snip_params = "snippet(slices_fts, 2, '[', ']', '…', 24)", []
+        else:
+            snip, snip_params = "substr(s.text, max(1, instr(s.text, ?) - 24), 64)", [query]
+        sql = (
+            "SELECT b.stem, r.run_dir, r.models_used, s.slice_id, s.start_line, s.end_line, s.char_len, "
+            f"s.title, s.summary, {snip} AS snip "
+            "FROM slices_fts JOIN slices s ON s.id = slices_fts.rowid "
+            "JOIN runs r ON r.id = s.run_id JOIN books b ON b.id = s.book_id "
+            f"WHERE {clause} AND s.error IS NULL"
+        )
+        params: list[Any] = [*snip_params, param]
+        if latest_only:
+            sql += " AND " + _LATEST_RUN
+        if book:
+            sql += " AND b.stem = ?"
+            params.append(book)
+        sql += " ORDER BY " + ("bm25(slices_fts)" if fts else "b.stem, s.slice_id") + " LIMIT ?"
+        params.append(limit)
+        return [
+            SliceHit(
+                book=r["stem"],
+                run_dir=r["run_dir"],
+                slice_id=r["slice_id"],
+                start_line=r["start_line"],
+                end_line=r["end_line"],
+                char_len=r["char_len"],
+                title=r["title"],
+                summary=r["summary"],
+                snippet=r["snip"] or "",
+                models_used=json.loads(r["models_used"] or "[]"),
+            )
+            for r in self._conn.execute(sql, params)
+        ]
+
+    def slice_at_line(self, book: str, line_no: int) -> SliceHit | None:
+        row = self._conn.execute(
+            "SELECT b.stem, r.run_dir, r.models_used, s.slice_id, s.start_line, s.end_line, s.char_len, "
+            "s.title, s.summary, substr(s.text, 1, 80) AS snip "
+            "FROM slices s JOIN runs r ON r.id = s.run_id JOIN books b ON b.id = s.book_id "
+            f"WHERE b.stem = ? AND s.start_line <= ? AND s.end_line >= ? AND {_LATEST_RUN}",
+            (book, line_no, line_no),
+        ).fetchone()
+        if row is None:
+            return None
+        return SliceHit(
+            book=row["stem"],
+            run_dir=row["run_dir"],
+            slice_id=row["slice_id"],
+            start_line=row["start_line"],
+            end_line=row["end_line"],
+            char_len=row["char_len"],
+            title=row["title"],
+            summary=row["summary"],
+            snippet=row["snip"] or "",
+            models_used=json.loads(row["models_used"] or "[]"),
+        )
+
+    def list_books(self) -> list[BookInfo]:
+        rows = self._conn.execute(
+            "SELECT b.stem, b.txt_path, b.line_count, b.char_count, b.ingested_at, "
+            "(SELECT COUNT(*) FROM runs r WHERE r.book_id = b.id) AS runs FROM books b ORDER BY b.stem"
+        )
+        return [
+            BookInfo(
+                stem=r["stem"],
+                txt_path=r["txt_path"],
+                line_count=r["line_count"],
+                char_count=r["char_count"],
+                runs=r["runs"],
+                ingested_at=r["ingested_at"],
+            )
+            for r in rows
+        ]
@@ -0,0 +1,13 @@
+__all__ = [
+    "Counter",
+    "Histogram",
+    "HttpExporter",
+    "REGISTRY",
+    "Registry",
+    "TextfileExporter",
+    "add_arguments",
+    "start",
+]
+
+from .export import HttpExporter, TextfileExporter, add_arguments, start
+from .registry import REGISTRY, Counter, Histogram, Registry
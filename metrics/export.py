@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import argparse
+import os
+import threading
+from pathlib import Path
+from typing import Any
+
+from .registry import REGISTRY, Registry
+
+
+class TextfileExporter:
+    # Rewrites `path` every interval_s seconds (atomically, for node_exporter's textfile
+    # collector or any scraper reading the file) and once more on close().
+    def __init__(self, path: str | Path, *, interval_s: float = 15.0, registry: Registry = REGISTRY):
+        if interval_s <= 0:
+            raise ValueError("interval_s must be positive")
+        self.path = Path(path)
+        self.interval_s = interval_s
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-file", daemon=True)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.write()
+        self._thread.start()
+
+    def write(self) -> None:
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.registry.render(), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.write()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+
+class HttpExporter:
+    # Serves GET /metrics from a daemon thread.
+    def __init__(self, port: int, *, host: str = "127.0.0.1", registry: Registry = REGISTRY):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                pass
+
+            def do_GET(self) -> None:  # noqa: N802
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class Exporters:
+    def __init__(self, exporters: list[TextfileExporter | HttpExporter]):
+        self.exporters = exporters
+
+    def close(self) -> None:
+        for exporter in self.exporters:
+            exporter.close()
+
+
+def _positive_float(value: str) -> float:
+    f = float(value)
+    if f <= 0:
+        raise argparse.ArgumentTypeError("must be positive")
+    return f
+
+
+def add_arguments(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--metrics-file",
+        help="Write Prometheus text-format metrics to this file, refreshed every --metrics-interval-s",
+    )
+    p.add_argument(
+        "--metrics-interval-s",
+        type=_positive_float,
+        default=15.0,
+        help="Refresh interval for --metrics-file (default 15)",
+    )
+    p.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics on http://127.0.0.1:<port>/metrics while running",
+    )
+
+
+def start(args: argparse.Namespace) -> Exporters:
+    # From the add_arguments options; close() the result when the run ends (writes the final
+    # values to --metrics-file).
+    exporters: list[TextfileExporter | HttpExporter] = []
+    if args.metrics_file:
+        exporters.append(TextfileExporter(args.metrics_file, interval_s=args.metrics_interval_s))
+    if args.metrics_port is not None:
+        exporters.append(HttpExporter(args.metrics_port))
+    return Exporters(exporters)
@@ -1,5 +1,22 @@
 __all__ = [
+    "CleanStream",
     "clean_epub_to_sentences",
+    "load_chapters",
+    "write_chapters",
 ]
 
-from .pipeline import clean_epub_to_sentences
+from typing import Any
+
+
+def __getattr__(name: str) -> Any:
+    # Resolved on first use, so importing a submodule (e.g. step1_cleaning.chapters from Step2)
+    # does not pull in the whole EPUB/HTML cleaning stack.
+    if name in ("CleanStream", "clean_epub_to_sentences"):
+        from . import pipeline
+
+        return getattr(pipeline, name)
+    if name in ("load_chapters", "write_chapters"):
+        from . import chapters
+
+        return getattr(chapters, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
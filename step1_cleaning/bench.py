@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def _run_once(epub: str, out: Path, read_workers: int, workers: int) -> tuple[float, float]:
+    # One `clean` run in a child process: (wall seconds, peak RSS in MiB). wait4 gives the
+    # rusage of exactly this child, so runs do not mix.
+    cmd = [sys.executable, "-m", "step1_cleaning.clean", epub, "-o", str(out)]
+    cmd += ["--read-workers", str(read_workers), "--workers", str(workers)]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - t0
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError(f"clean failed (exit {proc.returncode}): {' '.join(cmd)}")
+    rss_kib = usage.ru_maxrss if sys.platform != "darwin" else usage.ru_maxrss // 1024
+    return wall, rss_kib / 1024
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="python -m step1_cleaning.bench",
+        description="Benchmark Step1 cleaning (wall time, peak RSS) for different --read-workers/--workers settings.",
+    )
+    p.add_argument("epub", nargs="+", help="EPUB files to clean")
+    p.add_argument(
+        "--read-workers",
+        type=int,
+        nargs="+",
+        default=[0, 2, 4],
+        help="Settings to compare (default: 0 2 4)",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1],
+        help="Cleaning process counts to compare (default: 1)",
+    )
+    p.add_argument("--repeat", type=int, default=3, help="Runs per setting; the median is reported (default 3)")
+    return p
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.repeat <= 0:
+        build_parser().error("--repeat must be positive")
+    for epub in args.epub:
+        if not Path(epub).exists():
+            build_parser().error(f"epub not found: {epub}")
+
+    with tempfile.TemporaryDirectory(prefix="step1-bench-") as tmp:
+        for epub in args.epub:
+            size_mb = Path(epub).stat().st_size / (1 << 20)
+            for read_workers in args.read_workers:
+                for workers in args.workers:
+                    out = Path(tmp) / "out.txt"
+                    runs = [_run_once(epub, out, read_workers, workers) for _ in range(args.repeat)]
+                    print(
+                        json.dumps(
+                            {
+                                "epub": epub,
+                                "epub_mb": round(size_mb, 1),
+                                "read_workers": read_workers,
+                                "workers": workers,
+                                "wall_s": round(statistics.median(r[0] for r in runs), 3),
+                                "peak_rss_mb": round(statistics.median(r[1] for r in runs), 1),
+                            },
+                            ensure_ascii=False,
+                        )
+                    )
+                    sys.stdout.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
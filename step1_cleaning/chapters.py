@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+
+# Kept apart from pipeline.py so Step2 can read the sidecar without importing the EPUB/HTML
+# cleaning stack.
+
+
+@dataclass(frozen=True)
+class Chapter:
+    title: str
+    start: int  # 0-based index into CleanResult.lines
+
+
+def chapter_ranges(chapters: list[Chapter], line_count: int) -> list[tuple[int, int]]:
+    # [start, end) line range of every chapter, aligned with `chapters` (empty ones included).
+    return [
+        (c.start, chapters[i + 1].start if i + 1 < len(chapters) else line_count) for i, c in enumerate(chapters)
+    ]
+
+
+def chapters_path(txt_path: str | Path) -> Path:
+    # Sidecar next to the Step1 txt: book/xxx.txt -> book/xxx.chapters.json
+    return Path(txt_path).with_suffix(".chapters.json")
+
+
+def write_chapters(txt_path: str | Path, chapters: Iterable[Chapter]) -> Path:
+    path = chapters_path(txt_path)
+    data = [{"title": c.title, "start_line": c.start + 1} for c in chapters]
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    return path
+
+
+def load_chapters(txt_path: str | Path) -> list[Chapter]:
+    path = chapters_path(txt_path)
+    if not path.exists():
+        return []
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return [Chapter(title=str(c.get("title") or ""), start=int(c["start_line"]) - 1) for c in data]
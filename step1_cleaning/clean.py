@@ -2,10 +2,20 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
+import sys
 from pathlib import Path
 
-from .config import load_clean_config
-from .pipeline import clean_epub_to_sentences
+import metrics
+
+# Prefetching only pays off when inflation can run on another core.
+_DEFAULT_READ_WORKERS = 2 if (os.cpu_count() or 1) > 1 else 0
+# Same as dedup.POLICIES and the DedupConfig / NoiseConfig defaults; repeated here so --help does
+# not load those modules.
+_DUPLICATE_POLICIES = ("flag", "keep-first", "keep-last")
+_DUPLICATE_THRESHOLD = 0.7
+_NOISE_MIN_CHAPTERS = 5
+_NOISE_MIN_RATIO = 0.3
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -23,6 +33,72 @@ def build_parser() -> argparse.ArgumentParser:
         "--extracted-out",
         help="Optional output JSONL path to store extracted noise (e.g. solicitations)",
     )
+    p.add_argument(
+        "--detect-noise",
+        action="store_true",
+        help="Drop sentences repeated across many chapters (watermarks/sign-offs) into the extracted output",
+    )
+    p.add_argument(
+        "--noise-min-chapters",
+        type=int,
+        default=_NOISE_MIN_CHAPTERS,
+        help=f"--detect-noise: min chapters a sentence must repeat in (default {_NOISE_MIN_CHAPTERS})",
+    )
+    p.add_argument(
+        "--noise-min-ratio",
+        type=float,
+        default=_NOISE_MIN_RATIO,
+        help=f"--detect-noise: min share of chapters a sentence must repeat in (default {_NOISE_MIN_RATIO})",
+    )
+    p.add_argument(
+        "--noise-rules-out",
+        help="--detect-noise: optional output JSON path with candidate rules for review (rules.json format)",
+    )
+    p.add_argument(
+        "--duplicates",
+        choices=_DUPLICATE_POLICIES,
+        help=(
+            "Detect chapters repeated in the book (same or nearly the same text): report them in the extracted "
+            "output (flag), or also drop all but the first (keep-first) / last (keep-last) copy"
+        ),
+    )
+    p.add_argument(
+        "--duplicate-threshold",
+        type=float,
+        default=_DUPLICATE_THRESHOLD,
+        help=f"--duplicates: min estimated text similarity (0-1) of near-duplicates (default {_DUPLICATE_THRESHOLD})",
+    )
+    p.add_argument(
+        "--read-workers",
+        type=int,
+        default=_DEFAULT_READ_WORKERS,
+        help=(
+            "Threads inflating upcoming EPUB documents while the current one is cleaned "
+            f"(0 = off; default {_DEFAULT_READ_WORKERS}, off on single-core machines)"
+        ),
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=(
+            "Processes cleaning spine documents in parallel; output is identical to a serial run "
+            "(default 1; ignored with --profile-rules)"
+        ),
+    )
+    p.add_argument(
+        "--no-nav",
+        action="store_true",
+        help=(
+            "Parse every spine text document instead of skipping the ones whose EPUB table of contents "
+            "entries are non-chapter headings (preface, afterword, ...)"
+        ),
+    )
+    p.add_argument(
+        "--profile-rules",
+        help="Optional output JSON path for a per-rule profile (evaluations, hits, match time, risky patterns)",
+    )
+    metrics.add_arguments(p)
     return p
 
 
@@ -30,6 +106,18 @@ def main(argv: list[str] | None = None) -> int:
     args = build_parser().parse_args(argv)
     if not args.epub:
         build_parser().error("epub is required")
+    if args.read_workers < 0:
+        build_parser().error("--read-workers must be >= 0")
+    if args.workers < 1:
+        build_parser().error("--workers must be >= 1")
+    if not 0 < args.duplicate_threshold <= 1:
+        build_parser().error("--duplicate-threshold must be in (0, 1]")
+
+    # Imported here so --help and argument errors return without loading the EPUB/HTML stack.
+    from .chapters import write_chapters
+    from .fingerprint import write_signature
+    from .config import load_clean_config
+    from .pipeline import clean_epub_to_sentences
 
     rules_path = Path(__file__).resolve().parent / "rule" / "rules.json"
     if not rules_path.exists():
@@ -37,17 +125,71 @@ def main(argv: list[str] | None = None) -> int:
             f"rules file not found: {rules_path} (create it first)"
         )
     rules, headings = load_clean_config(rules_path)
-    result = clean_epub_to_sentences(args.epub, rules=rules, headings=headings)
+    profiler = None
+    if args.profile_rules:
+        from .profiling import RuleProfiler
+
+        profiler = RuleProfiler(rules)
+    exporters = metrics.start(args)
+    try:
+        result = clean_epub_to_sentences(
+            args.epub,
+            rules=rules,
+            headings=headings,
+            profiler=profiler,
+            read_workers=args.read_workers,
+            workers=args.workers,
+            use_nav=not args.no_nav,
+        )
+    finally:
+        exporters.close()
+
+    if args.duplicates:
+        from .dedup import DedupConfig, apply_duplicate_policy, find_duplicate_chapters
+
+        # Before noise detection: copies of a chapter would count its sentences twice.
+        dedup_cfg = DedupConfig(policy=args.duplicates, threshold=args.duplicate_threshold)
+        duplicates = find_duplicate_chapters(result, dedup_cfg)
+        result = apply_duplicate_policy(result, duplicates, bucket=dedup_cfg.bucket)
+        if duplicates:
+            dropped = sum(d.dropped for d in duplicates)
+            print(f"duplicate chapters: {len(duplicates)} ({dropped} dropped)", file=sys.stderr)
+
+    if args.detect_noise:
+        from .noise import NoiseConfig, find_repeated_sentences, remove_repeated_sentences
+
+        noise_cfg = NoiseConfig(min_chapters=args.noise_min_chapters, min_chapter_ratio=args.noise_min_ratio)
+        candidates = find_repeated_sentences(result, noise_cfg)
+        result = remove_repeated_sentences(result, candidates, bucket=noise_cfg.bucket)
+        if args.noise_rules_out:
+            Path(args.noise_rules_out).write_text(
+                json.dumps(
+                    {"rules": [c.to_rule(i) for i, c in enumerate(candidates, start=1)]},
+                    ensure_ascii=False,
+                    indent=2,
+                )
+                + "\n",
+                encoding="utf-8",
+            )
 
     out_path = Path(args.out) if args.out else (Path("book") / (Path(args.epub).stem + ".txt"))
     out_path.parent.mkdir(parents=True, exist_ok=True)
     out_path.write_text("\n".join(result.lines) + "\n", encoding="utf-8")
+    write_chapters(out_path, result.chapters)
+    write_signature(out_path, result.lines)
 
     if args.extracted_out:
         extracted_path = Path(args.extracted_out)
         with extracted_path.open("w", encoding="utf-8") as f:
             for m in result.extracted:
-                f.write(json.dumps({"bucket": m.bucket, "rule": m.rule_name, "text": m.text}, ensure_ascii=False) + "\n")
+                row = {"bucket": m.bucket, "rule": m.rule_name, "text": m.text, **(m.detail or {})}
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    if profiler is not None:
+        Path(args.profile_rules).write_text(
+            json.dumps(profiler.report(), ensure_ascii=False, indent=2) + "\n",
+            encoding="utf-8",
+        )
 
     return 0
 
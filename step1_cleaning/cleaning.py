@@ -2,11 +2,15 @@ from __future__ import annotations
 
 import re
 import unicodedata
-from dataclasses import dataclass
-from typing import Any, Iterable, Iterator
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator
 
+from .chapters import Chapter
 from .rules import Match, Rule, apply_rules
 
+if TYPE_CHECKING:
+    from .profiling import RuleProfiler
+
 
 _ZERO_WIDTH = {
     "\ufeff",  # BOM
@@ -223,6 +227,7 @@ def iter_sentences(text: str) -> Iterator[str]:
 class CleanResult:
     lines: list[str]
     extracted: list[Match]
+    chapters: list[Chapter] = field(default_factory=list)
 
 def _needs_space(prev: str, nxt: str) -> bool:
     if not prev or not nxt:
@@ -232,71 +237,193 @@ def _needs_space(prev: str, nxt: str) -> bool:
     return a.isascii() and b.isascii() and a.isalnum() and b.isalnum()
 
 
-def clean_text_to_paragraph_lines(text: str, rules: Iterable[Rule], headings: HeadingMatcher) -> CleanResult:
-    normalized = normalize_text(text)
-    lines: list[str] = []
-    extracted: list[Match] = []
-    include = False
-    skip_leading = 0
+def join_sentences(sentences: Iterable[str]) -> str:
+    line = ""
+    for s in sentences:
+        if not line:
+            line = s
+        else:
+            line += (" " if _needs_space(line, s) else "") + s
+    return line.strip()
+
+
+# Rule output for one paragraph: (kept sentences, leftover open quotes, matches).
+Analysis = tuple[list[str], str, list[Match]]
 
-    for paragraph in iter_paragraphs(normalized):
-        if headings.is_any_heading(paragraph):
-            include = headings.is_strict_chapter_title(paragraph)
-            skip_leading = headings.skip_leading_titles if include else 0
+_CLOSE_QUOTES = "”’」』》〉】）"
+
+
+def analyze_paragraph(
+    paragraph: str,
+    rules: Iterable[Rule],
+    *,
+    profiler: RuleProfiler | None = None,
+) -> Analysis:
+    # The part of line assembly that does not depend on state carried between paragraphs.
+    matches: list[Match] = []
+    kept: list[str] = []
+    pending_prefix = ""
+    for sentence in iter_sentences(paragraph):
+        if profiler is not None:
+            cleaned, found = profiler.apply(sentence.strip())
+        else:
+            cleaned, found = apply_rules(sentence.strip(), rules)
+        matches.extend(found)
+        if cleaned is None:
             continue
-        if not include:
+        cleaned = cleaned.strip()
+        if not cleaned:
             continue
-        if skip_leading > 0 and looks_like_leading_title(paragraph, max_len=headings.leading_title_max_len):
-            skip_leading -= 1
+        if pending_prefix:
+            cleaned = pending_prefix + cleaned
+            pending_prefix = ""
+        if _OPEN_QUOTES_ONLY.match(cleaned):
+            pending_prefix += cleaned
+            continue
+        if _CLOSE_QUOTES_ONLY.match(cleaned) and kept:
+            kept[-1] += cleaned
             continue
-        skip_leading = 0
-
-        if lines:
-            s = paragraph.lstrip()
-            i = 0
-            while i < len(s) and s[i] in "”’」』》〉】）":
-                i += 1
-            if i > 0:
-                lines[-1] += s[:i]
-                paragraph = s[i:].lstrip()
+        kept.append(cleaned)
+    return kept, pending_prefix, matches
+
+
+def _split_close_quotes(paragraph: str) -> tuple[str, str]:
+    s = paragraph.lstrip()
+    i = 0
+    while i < len(s) and s[i] in _CLOSE_QUOTES:
+        i += 1
+    return s[:i], s[i:].lstrip()
+
+
+@dataclass(frozen=True)
+class AnalyzedParagraph:
+    # A paragraph with its rule output computed ahead (e.g. in a worker process). stripped is
+    # the output for the paragraph without its leading close quotes, which is what gets
+    # analyzed when those quotes are carried over to the previous line.
+    text: str
+    full: Analysis | None  # None for headings (never analyzed)
+    stripped: Analysis | None = None
+
+
+def analyze_text(
+    text: str,
+    rules: Iterable[Rule],
+    headings: HeadingMatcher,
+) -> list[AnalyzedParagraph]:
+    rules = list(rules)
+    out: list[AnalyzedParagraph] = []
+    for paragraph in iter_paragraphs(normalize_text(text)):
+        if headings.is_any_heading(paragraph):
+            out.append(AnalyzedParagraph(text=paragraph, full=None))
+            continue
+        carry, rest = _split_close_quotes(paragraph)
+        stripped = analyze_paragraph(rest, rules) if carry and rest else None
+        out.append(AnalyzedParagraph(text=paragraph, full=analyze_paragraph(paragraph, rules), stripped=stripped))
+    return out
+
+
+class LineAssembler:
+    # Streaming form of clean_text_to_paragraph_lines: feed() yields finished lines as soon as
+    # they can no longer change. The newest line is held back because a following paragraph may
+    # still append close quotes / a dangling open quote to it; close() releases it.
+    def __init__(
+        self,
+        rules: Iterable[Rule],
+        headings: HeadingMatcher,
+        *,
+        profiler: RuleProfiler | None = None,
+    ):
+        self.rules = list(rules)
+        self.headings = headings
+        self.profiler = profiler
+        self.extracted: list[Match] = []
+        self.chapters: list[Chapter] = []
+        self.line_count = 0
+        self._include = False
+        self._skip_leading = 0
+        self._last: str | None = None
+
+    def feed(self, text: str) -> Iterator[str]:
+        for paragraph in iter_paragraphs(normalize_text(text)):
+            yield from self._emit(self._paragraph(paragraph, self._analyze))
+
+    def feed_analyzed(self, paragraphs: Iterable[AnalyzedParagraph]) -> Iterator[str]:
+        # Same lines as feed() on the original text: only the heading/include state machine and
+        # the carry-over between paragraphs run here, the rule output comes precomputed.
+        for p in paragraphs:
+
+            def analyze(text: str, p: AnalyzedParagraph = p) -> Analysis:
+                result = p.full if text == p.text else p.stripped
+                if result is None:
+                    raise ValueError(f"paragraph was not analyzed ahead: {text[:40]!r}")
+                return result
+
+            yield from self._emit(self._paragraph(p.text, analyze))
+
+    def end_chapter(self) -> None:
+        # Same state as after a non-chapter heading, for text left unread (a skipped afterword).
+        self._include = False
+        self._skip_leading = 0
+
+    def close(self) -> Iterator[str]:
+        if self._last is not None:
+            yield self._last
+            self._last = None
+
+    def _emit(self, line: str | None) -> Iterator[str]:
+        if line is None:
+            return
+        if self._last is not None:
+            yield self._last
+        self._last = line
+        self.line_count += 1
+
+    def _analyze(self, paragraph: str) -> Analysis:
+        return analyze_paragraph(paragraph, self.rules, profiler=self.profiler)
+
+    def _paragraph(self, paragraph: str, analyze: Callable[[str], Analysis]) -> str | None:
+        headings = self.headings
+        if headings.is_any_heading(paragraph):
+            self._include = headings.is_strict_chapter_title(paragraph)
+            self._skip_leading = headings.skip_leading_titles if self._include else 0
+            if self._include:
+                self.chapters.append(Chapter(title=paragraph, start=self.line_count))
+            return None
+        if not self._include:
+            return None
+        if self._skip_leading > 0 and looks_like_leading_title(paragraph, max_len=headings.leading_title_max_len):
+            self._skip_leading -= 1
+            return None
+        self._skip_leading = 0
+
+        if self._last is not None:
+            carry, rest = _split_close_quotes(paragraph)
+            if carry:
+                self._last += carry
+                paragraph = rest
                 if not paragraph:
-                    continue
-
-        kept: list[str] = []
-        pending_prefix = ""
-        for sentence in iter_sentences(paragraph):
-            cleaned, matches = apply_rules(sentence.strip(), rules)
-            extracted.extend(matches)
-            if cleaned is None:
-                continue
-            cleaned = cleaned.strip()
-            if not cleaned:
-                continue
-            if pending_prefix:
-                cleaned = pending_prefix + cleaned
-                pending_prefix = ""
-            if _OPEN_QUOTES_ONLY.match(cleaned):
-                pending_prefix += cleaned
-                continue
-            if _CLOSE_QUOTES_ONLY.match(cleaned) and kept:
-                kept[-1] += cleaned
-                continue
-            kept.append(cleaned)
+                    return None
 
+        kept, pending_prefix, matches = analyze(paragraph)
+        self.extracted.extend(matches)
+        kept = list(kept)
         if pending_prefix:
             if kept:
                 kept[-1] += pending_prefix
-            elif lines:
-                lines[-1] += pending_prefix
-
-        paragraph_line = ""
-        for s in kept:
-            if not paragraph_line:
-                paragraph_line = s
-            else:
-                paragraph_line += (" " if _needs_space(paragraph_line, s) else "") + s
-        paragraph_line = paragraph_line.strip()
-        if paragraph_line:
-            lines.append(paragraph_line)
-
-    return CleanResult(lines=lines, extracted=extracted)
+            elif self._last is not None:
+                self._last += pending_prefix
+
+        return join_sentences(kept) or None
+
+
+def clean_text_to_paragraph_lines(
+    text: str,
+    rules: Iterable[Rule],
+    headings: HeadingMatcher,
+    *,
+    profiler: RuleProfiler | None = None,
+) -> CleanResult:
+    assembler = LineAssembler(rules, headings, profiler=profiler)
+    lines = list(assembler.feed(text))
+    lines.extend(assembler.close())
+    return CleanResult(lines=lines, extracted=assembler.extracted, chapters=assembler.chapters)
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import hashlib
+from collections import defaultdict
+from dataclasses import dataclass
+
+from .chapters import chapter_ranges
+from .cleaning import Chapter, CleanResult
+from .fingerprint import band_keys, hash_keys, sentence_keys, signature, similarity
+from .rules import Match
+
+POLICIES = ("flag", "keep-first", "keep-last")
+
+
+@dataclass(frozen=True)
+class DedupConfig:
+    # flag: report only; keep-first / keep-last: keep one chapter of each duplicate group (the
+    # last one is usually the corrected re-upload) and drop the others.
+    policy: str = "keep-first"
+    threshold: float = 0.7  # estimated Jaccard similarity of the sentence sets
+    bins: int = 64
+    band_rows: int = 4
+    min_chars: int = 100  # normalized body length; shorter chapters are never duplicates
+    bucket: str = "duplicate"
+
+
+@dataclass(frozen=True)
+class DuplicateChapter:
+    index: int  # into CleanResult.chapters
+    title: str
+    of_index: int  # the chapter of its group that is kept
+    of_title: str
+    similarity: float  # 1.0 for exact duplicates (same normalized body)
+    lines: int
+    dropped: bool
+
+    def to_match(self, bucket: str) -> Match:
+        return Match(
+            rule_name="duplicate_chapter",
+            bucket=bucket,
+            text=self.title,
+            detail={
+                "duplicate_of": self.of_title,
+                "similarity": round(self.similarity, 3),
+                "lines": self.lines,
+                "action": "dropped" if self.dropped else "flagged",
+            },
+        )
+
+
+def find_duplicate_chapters(result: CleanResult, config: DedupConfig | None = None) -> list[DuplicateChapter]:
+    # Linear in the book size: every chapter is hashed once (exact digest + signature), candidate
+    # pairs come from hash buckets, and only those pairs are compared.
+    config = config or DedupConfig()
+    if config.policy not in POLICIES:
+        raise ValueError(f"unknown duplicate policy: {config.policy}")
+    ranges = chapter_ranges(result.chapters, len(result.lines))
+    parent = list(range(len(ranges)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    exact: dict[bytes, int] = {}
+    bands: dict[tuple[int, ...], list[int]] = defaultdict(list)
+    sigs: dict[int, list[int]] = {}
+    for i, (start, end) in enumerate(ranges):
+        keys = sentence_keys("\n".join(result.lines[start:end]))
+        body = "".join(keys)
+        if len(body) < config.min_chars:
+            continue
+        digest = hashlib.blake2b(body.encode("utf-8"), digest_size=16).digest()
+        if digest in exact:
+            parent[find(i)] = find(exact[digest])
+            sigs[i] = sigs[exact[digest]]
+            continue
+        exact[digest] = i
+        sig = signature(hash_keys(keys), config.bins)
+        sigs[i] = sig
+        checked: set[int] = set()
+        for key in band_keys(sig, config.band_rows):
+            for j in bands[key]:
+                if j in checked:
+                    continue
+                checked.add(j)
+                s = similarity(sig, sigs[j])
+                if s >= config.threshold:
+                    parent[find(i)] = find(j)
+            bands[key].append(i)
+
+    groups: dict[int, list[int]] = defaultdict(list)
+    for i in range(len(ranges)):
+        groups[find(i)].append(i)
+    out: list[DuplicateChapter] = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        keep = members[-1] if config.policy == "keep-last" else members[0]
+        for i in members:
+            if i == keep:
+                continue
+            out.append(
+                DuplicateChapter(
+                    index=i,
+                    title=result.chapters[i].title,
+                    of_index=keep,
+                    of_title=result.chapters[keep].title,
+                    similarity=similarity(sigs[i], sigs[keep]),
+                    lines=ranges[i][1] - ranges[i][0],
+                    dropped=config.policy != "flag",
+                )
+            )
+    return sorted(out, key=lambda d: d.index)
+
+
+def apply_duplicate_policy(
+    result: CleanResult,
+    duplicates: list[DuplicateChapter],
+    *,
+    bucket: str = "duplicate",
+) -> CleanResult:
+    # Reports every duplicate in the extracted output and removes the dropped chapters (title
+    # entry and lines).
+    if not duplicates:
+        return result
+    extracted = list(result.extracted) + [d.to_match(bucket) for d in duplicates]
+    dropped = {d.index for d in duplicates if d.dropped}
+    if not dropped:
+        return CleanResult(lines=result.lines, extracted=extracted, chapters=result.chapters)
+    ranges = chapter_ranges(result.chapters, len(result.lines))
+    lines = list(result.lines[: ranges[0][0]])
+    chapters: list[Chapter] = []
+    for i, (start, end) in enumerate(ranges):
+        if i in dropped:
+            continue
+        chapters.append(Chapter(title=result.chapters[i].title, start=len(lines)))
+        lines.extend(result.lines[start:end])
+    return CleanResult(lines=lines, extracted=extracted, chapters=chapters)
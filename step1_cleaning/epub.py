@@ -2,9 +2,13 @@ from __future__ import annotations
 
 import posixpath
 import zipfile
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import PurePosixPath
 from typing import Iterable
+from urllib.parse import unquote
 from xml.etree import ElementTree as ET
 
 
@@ -16,6 +20,24 @@ class EpubError(RuntimeError):
 class SpineItem:
     href: str
     media_type: str
+    linear: bool = True
+
+
+@dataclass(frozen=True)
+class NavPoint:
+    label: str
+    href: str  # member path, fragment dropped
+
+
+@dataclass(frozen=True)
+class PlannedDocument:
+    href: str
+    after_skipped: bool = False  # documents right before this one were skipped
+
+
+_TEXT_MEDIA_TYPES = {"application/xhtml+xml", "text/html", "application/html+xml"}
+_NCX_MEDIA_TYPE = "application/x-dtbncx+xml"
+_OPS_TYPE = "{http://www.idpf.org/2007/ops}type"
 
 
 def _read_xml(zipf: zipfile.ZipFile, path: str) -> ET.Element:
@@ -40,18 +62,22 @@ def find_opf_path(zipf: zipfile.ZipFile) -> str:
     return opf_path
 
 
-def iter_spine_items(zipf: zipfile.ZipFile, opf_path: str) -> Iterable[SpineItem]:
-    opf = _read_xml(zipf, opf_path)
-    opf_dir = str(PurePosixPath(opf_path).parent)
-    manifest_items: dict[str, tuple[str, str]] = {}
-
+def _read_manifest(opf: ET.Element) -> dict[str, tuple[str, str, str]]:
+    # id -> (href, media type, properties)
+    items: dict[str, tuple[str, str, str]] = {}
     for item in opf.findall(".//{*}manifest/{*}item"):
         item_id = item.attrib.get("id")
         href = item.attrib.get("href")
-        media_type = item.attrib.get("media-type", "")
         if not item_id or not href:
             continue
-        manifest_items[item_id] = (href, media_type)
+        items[item_id] = (href, item.attrib.get("media-type", ""), item.attrib.get("properties", ""))
+    return items
+
+
+def iter_spine_items(zipf: zipfile.ZipFile, opf_path: str) -> Iterable[SpineItem]:
+    opf = _read_xml(zipf, opf_path)
+    opf_dir = str(PurePosixPath(opf_path).parent)
+    manifest_items = _read_manifest(opf)
 
     spine = opf.find(".//{*}spine")
     if spine is None:
@@ -64,20 +90,184 @@ def iter_spine_items(zipf: zipfile.ZipFile, opf_path: str) -> Iterable[SpineItem
         manifest = manifest_items.get(idref)
         if not manifest:
             continue
-        href, media_type = manifest
+        href, media_type, _ = manifest
         if not href:
             continue
         resolved = posixpath.normpath(posixpath.join(opf_dir, href))
-        yield SpineItem(href=resolved, media_type=media_type)
+        linear = itemref.attrib.get("linear", "yes").strip().lower() != "no"
+        yield SpineItem(href=resolved, media_type=media_type, linear=linear)
+
+
+def _is_text(item: SpineItem) -> bool:
+    return (item.media_type or "").lower() in _TEXT_MEDIA_TYPES
 
 
 def iter_text_documents(zipf: zipfile.ZipFile) -> Iterable[str]:
     opf_path = find_opf_path(zipf)
     for item in iter_spine_items(zipf, opf_path):
-        mt = (item.media_type or "").lower()
-        if mt in {
-            "application/xhtml+xml",
-            "text/html",
-            "application/html+xml",
-        }:
+        if _is_text(item):
             yield item.href
+
+
+def _nav_href(base_dir: str, href: str) -> str:
+    href = unquote(href.split("#", 1)[0])
+    return posixpath.normpath(posixpath.join(base_dir, href))
+
+
+def _label(el: ET.Element) -> str:
+    return " ".join("".join(el.itertext()).split())
+
+
+def read_navigation(zipf: zipfile.ZipFile, opf_path: str) -> list[NavPoint]:
+    # Flattened table of contents in reading order: the EPUB 3 nav document (epub:type="toc")
+    # if it parses, otherwise the EPUB 2 toc.ncx. Empty when neither is usable.
+    opf = _read_xml(zipf, opf_path)
+    opf_dir = str(PurePosixPath(opf_path).parent)
+    manifest = _read_manifest(opf)
+
+    for href, _, properties in manifest.values():
+        if "nav" not in properties.split():
+            continue
+        path = posixpath.normpath(posixpath.join(opf_dir, href))
+        try:
+            root = _read_xml(zipf, path)
+        except EpubError:
+            break  # e.g. HTML entities; fall back to the NCX
+        base = str(PurePosixPath(path).parent)
+        for nav in root.findall(".//{*}nav"):
+            if nav.attrib.get(_OPS_TYPE) != "toc":
+                continue
+            points = [
+                NavPoint(label=_label(a), href=_nav_href(base, a.attrib["href"]))
+                for a in nav.findall(".//{*}a")
+                if a.attrib.get("href")
+            ]
+            if points:
+                return points
+        break
+
+    spine = opf.find(".//{*}spine")
+    ncx_id = spine.attrib.get("toc") if spine is not None else None
+    ncx = manifest.get(ncx_id or "")
+    if ncx is None:
+        ncx = next((m for m in manifest.values() if m[1] == _NCX_MEDIA_TYPE), None)
+    if ncx is None:
+        return []
+    path = posixpath.normpath(posixpath.join(opf_dir, ncx[0]))
+    try:
+        root = _read_xml(zipf, path)
+    except EpubError:
+        return []
+    base = str(PurePosixPath(path).parent)
+    points: list[NavPoint] = []
+    for point in root.findall(".//{*}navPoint"):
+        text = point.find("{*}navLabel/{*}text")
+        content = point.find("{*}content")
+        if text is None or content is None or not content.attrib.get("src"):
+            continue
+        points.append(NavPoint(label=_label(text), href=_nav_href(base, content.attrib["src"])))
+    return points
+
+
+def plan_text_documents(
+    zipf: zipfile.ZipFile,
+    is_chapter_title: Callable[[str], bool],
+    is_heading: Callable[[str], bool],
+) -> list[PlannedDocument]:
+    # Spine text documents worth parsing, using the table of contents as a chapter map. Only
+    # documents the table of contents positively marks as non-chapter are skipped: every entry
+    # pointing at them is a heading (is_heading) but not a chapter title (preface, afterword,
+    # ...), and documents following them without an entry of their own (the rest of that
+    # section). Entries heading detection does not recognize (cover, "番外 重逢") keep their
+    # documents, so heading detection decides on them exactly as without the plan. Reading
+    # resumes with after_skipped set: the skipped heading ended the chapter before it. Without
+    # a table of contents that names at least one chapter, every text document is kept. Members
+    # missing from the archive are left out, as the readers skip them (their entries still count).
+    opf_path = find_opf_path(zipf)
+    members = set(zipf.namelist())
+    items = [item for item in iter_spine_items(zipf, opf_path) if _is_text(item)]
+    targets: dict[str, list[str]] = {}
+    for point in read_navigation(zipf, opf_path):
+        targets.setdefault(point.href, []).append(point.label)
+    spine_hrefs = {unquote(item.href) for item in items}
+    spine_labels = [label for href, labels in targets.items() if href in spine_hrefs for label in labels]
+    if not any(is_chapter_title(label) for label in spine_labels):
+        return [PlannedDocument(href=item.href) for item in items if item.href in members]
+
+    out: list[PlannedDocument] = []
+    keep = True
+    skipped = False
+    for item in items:
+        labels = targets.get(unquote(item.href))
+        if labels:
+            keep = any(is_chapter_title(label) or not is_heading(label) for label in labels)
+        if item.href not in members:
+            continue
+        if keep:
+            out.append(PlannedDocument(href=item.href, after_skipped=skipped))
+            skipped = False
+        else:
+            skipped = True
+    return out
+
+
+_CHUNK_BYTES = 1 << 20
+# Members at least this large (uncompressed) are streamed in chunks instead of being inflated
+# ahead into memory; omnibus EPUBs sometimes keep a whole volume in one spine document.
+_STREAM_MIN_BYTES = 8 << 20
+
+
+def _iter_member(zipf: zipfile.ZipFile, path: str) -> Iterator[bytes]:
+    with zipf.open(path) as f:
+        while True:
+            chunk = f.read(_CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_documents(zipf: zipfile.ZipFile, paths: Iterable[str], *, workers: int = 2) -> Iterator[Iterable[bytes]]:
+    # Yields the content of each member as byte chunks, in order, skipping missing members.
+    # With workers > 0, up to `workers` upcoming members are inflated on a thread pool while the
+    # caller parses the current one (zlib releases the GIL); large members are streamed.
+    if workers <= 0:
+        for path in paths:
+            try:
+                data = zipf.read(path)
+            except KeyError:
+                continue
+            yield (data,)
+        return
+
+    def start(path: str) -> Future[bytes] | str | None:
+        try:
+            size = zipf.getinfo(path).file_size
+        except KeyError:
+            return None
+        if size >= _STREAM_MIN_BYTES:
+            return path
+        return pool.submit(zipf.read, path)
+
+    pending: deque[Future[bytes] | str | None] = deque()
+    it = iter(paths)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="epub-read") as pool:
+        try:
+            for path in it:
+                pending.append(start(path))
+                if len(pending) > workers:
+                    break
+            while pending:
+                job = pending.popleft()
+                for path in it:
+                    pending.append(start(path))
+                    break
+                if job is None:
+                    continue
+                if isinstance(job, str):
+                    yield _iter_member(zipf, job)
+                else:
+                    yield (job.result(),)
+        finally:
+            for job in pending:
+                if isinstance(job, Future):
+                    job.cancel()
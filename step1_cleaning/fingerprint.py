@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import json
+import re
+import unicodedata
+import zlib
+from bisect import bisect_left
+from pathlib import Path
+from typing import Iterable
+
+# MinHash-style signatures for near-duplicate text, in one pass over the text.
+#
+# A text is reduced to the set of hashes of its sentences (normalized like noise.normalize_key:
+# case, width, spaces and punctuation do not matter). Sentence shingles are ~20x fewer than
+# character shingles, and survive re-split paragraphs; an edit only changes the sentences it
+# touches. Instead of k independent permutations, one-permutation hashing splits the 32-bit
+# hash space into `bins` equal ranges and keeps the smallest hash in each range: after sorting
+# the set (in C) that is one bisect per bin. Two signatures agree in a bin with probability equal
+# to the Jaccard similarity of the sentence sets; bins empty in both are ignored.
+
+EMPTY = -1
+BOOK_BINS = 128  # whole-book signatures (catalog near-duplicate index)
+
+_SENTENCE_END = re.compile(r"[。！？!?…；;\n]+")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def sentence_keys(text: str) -> list[str]:
+    # Punctuation is removed before NFKC: normalizing full-width punctuation is the slow path of
+    # unicodedata.normalize, the CJK text left over is quick.
+    out: list[str] = []
+    for piece in _SENTENCE_END.split(text):
+        key = _NON_WORD.sub("", piece)
+        if key:
+            out.append(unicodedata.normalize("NFKC", key).lower())
+    return out
+
+
+def hash_keys(keys: Iterable[str]) -> set[int]:
+    # crc32 is stable across processes (signatures are stored by the catalog) and fast in C.
+    return {zlib.crc32(k.encode("utf-8")) for k in keys}
+
+
+def signature(hashes: Iterable[int], bins: int) -> list[int]:
+    ordered = sorted(hashes)
+    step = (1 << 32) // bins
+    out: list[int] = []
+    for b in range(bins):
+        i = bisect_left(ordered, b * step)
+        out.append(ordered[i] if i < len(ordered) and ordered[i] < (b + 1) * step else EMPTY)
+    return out
+
+
+def similarity(a: list[int], b: list[int]) -> float:
+    # Estimated Jaccard similarity of the sentence sets behind two signatures.
+    same = used = 0
+    for x, y in zip(a, b):
+        if x == EMPTY and y == EMPTY:
+            continue
+        used += 1
+        same += x == y
+    return same / used if used else 0.0
+
+
+def band_keys(sig: list[int], rows: int) -> list[tuple[int, ...]]:
+    # LSH bands: signatures sharing any band key are candidate pairs. With r rows per band and
+    # similarity s, a pair shares at least one of n/r bands with probability 1 - (1 - s^r)^(n/r).
+    # Bands with empty bins are left out (only short texts have them).
+    keys: list[tuple[int, ...]] = []
+    for i in range(0, len(sig) - rows + 1, rows):
+        band = sig[i : i + rows]
+        if EMPTY not in band:
+            keys.append((i // rows, *band))
+    return keys
+
+
+def signature_path(txt_path: str | Path) -> Path:
+    # Sidecar next to the Step1 txt: book/xxx.txt -> book/xxx.signature.json
+    return Path(txt_path).with_suffix(".signature.json")
+
+
+def book_signature(lines: Iterable[str]) -> tuple[list[int], int]:
+    hashes: set[int] = set()
+    for line in lines:
+        hashes.update(hash_keys(sentence_keys(line)))
+    return signature(hashes, BOOK_BINS), len(hashes)
+
+
+def write_signature(txt_path: str | Path, lines: Iterable[str]) -> Path:
+    sig, sentences = book_signature(lines)
+    path = signature_path(txt_path)
+    data = {"bins": BOOK_BINS, "sentences": sentences, "signature": sig}
+    path.write_text(json.dumps(data, separators=(",", ":")) + "\n", encoding="utf-8")
+    return path
+
+
+def load_signature(txt_path: str | Path) -> list[int] | None:
+    # None when the sidecar is missing, older than the txt or from a different BOOK_BINS.
+    path = signature_path(txt_path)
+    try:
+        if path.stat().st_mtime < Path(txt_path).stat().st_mtime:
+            return None
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    sig = data.get("signature")
+    if data.get("bins") != BOOK_BINS or not isinstance(sig, list) or len(sig) != BOOK_BINS:
+        return None
+    return [int(x) for x in sig]
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import codecs
 import html
+from collections.abc import Iterable
 from html.parser import HTMLParser
 
 
@@ -80,3 +82,15 @@ def html_to_text(html_bytes: bytes) -> str:
     parser.feed(text)
     parser.close()
     return parser.get_text()
+
+
+def html_chunks_to_text(chunks: Iterable[bytes]) -> str:
+    # Same text as html_to_text(b"".join(chunks)), decoding and parsing piece by piece so a large
+    # document is never held as bytes and as str at the same time.
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parser = HTMLTextExtractor()
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return parser.get_text()
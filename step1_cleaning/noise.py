@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+import unicodedata
+from array import array
+from dataclasses import dataclass
+from typing import Any
+
+from .chapters import chapter_ranges
+from .cleaning import Chapter, CleanResult, iter_sentences, join_sentences
+from .rules import Match
+
+
+_NON_WORD = re.compile(r"[\W_]+")
+_DIALOGUE_QUOTES = set("“”‘’「」『』\"")
+
+
+@dataclass(frozen=True)
+class NoiseConfig:
+    min_chapters: int = 5  # a sentence must repeat in at least this many chapters
+    min_chapter_ratio: float = 0.3  # ... and in at least this share of all chapters
+    min_chars: int = 3  # normalized length bounds; shorter/longer sentences are never noise
+    max_chars: int = 80
+    sketch_width: int = 1 << 16
+    sketch_depth: int = 4
+    top_k: int = 512  # heavy-hitter candidates kept in memory
+    bucket: str = "repeated"
+
+
+@dataclass(frozen=True)
+class NoiseCandidate:
+    key: str
+    text: str  # first occurrence, as it appeared in the book
+    chapters: int  # exact number of chapters containing it
+
+    def to_rule(self, index: int) -> dict[str, Any]:
+        # The key is normalized like normalize_key, the book text is not: each character also
+        # matches its full-width form (case via the "i" flag), and any spacing/punctuation may
+        # sit between characters ("w w w . x x . c o m").
+        body = r"[\W_]*".join(_char_class(ch) for ch in self.key)
+        return {
+            "name": f"auto_repeated_{index}",
+            "kind": "drop",
+            "pattern": rf"^[\W_]*{body}[\W_]*$",
+            "flags": "i",
+            "bucket": "watermark",
+            "example": self.text,
+            "chapters": self.chapters,
+        }
+
+
+def _char_class(ch: str) -> str:
+    # ASCII letters/digits and their full-width forms (U+FF01..U+FF5E) are NFKC-equivalent.
+    if "!" <= ch <= "~":
+        return f"[{re.escape(ch)}{chr(ord(ch) + 0xFEE0)}]"
+    return re.escape(ch)
+
+
+def normalize_key(sentence: str) -> str:
+    return _NON_WORD.sub("", unicodedata.normalize("NFKC", sentence).lower())
+
+
+def _hash64(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class CountMinSketch:
+    def __init__(self, width: int, depth: int):
+        if width <= 0 or depth <= 0:
+            raise ValueError("sketch width/depth must be positive")
+        self.width = width
+        self.depth = depth
+        self._rows = [array("I", bytes(4 * width)) for _ in range(depth)]
+
+    def _indexes(self, h: int) -> list[int]:
+        # Kirsch-Mitzenmacher double hashing: d indexes from one 64-bit hash.
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, h: int) -> int:
+        est = None
+        for row, idx in zip(self._rows, self._indexes(h)):
+            v = row[idx] + 1
+            row[idx] = v
+            est = v if est is None else min(est, v)
+        return est or 0
+
+    def estimate(self, h: int) -> int:
+        return min(row[idx] for row, idx in zip(self._rows, self._indexes(h)))
+
+
+def _is_candidate_sentence(sentence: str, key: str, config: NoiseConfig) -> bool:
+    if not (config.min_chars <= len(key) <= config.max_chars):
+        return False
+    # Dialogue repeats naturally ("“是。”"); watermarks and sign-offs are never quoted speech.
+    return not any(ch in _DIALOGUE_QUOTES for ch in sentence)
+
+
+def find_repeated_sentences(result: CleanResult, config: NoiseConfig | None = None) -> list[NoiseCandidate]:
+    config = config or NoiseConfig()
+    ranges = [(start, end) for start, end in chapter_ranges(result.chapters, len(result.lines)) if end > start]
+    threshold = max(config.min_chapters, math.ceil(config.min_chapter_ratio * len(ranges)))
+    if len(ranges) < threshold:
+        return []
+
+    # Pass 1: count chapter-distinct occurrences in a count-min sketch, keeping only the top_k
+    # heaviest hashes in memory.
+    sketch = CountMinSketch(config.sketch_width, config.sketch_depth)
+    heavy: dict[int, int] = {}
+    for start, end in ranges:
+        seen: set[int] = set()
+        for line in result.lines[start:end]:
+            for sentence in iter_sentences(line):
+                key = normalize_key(sentence)
+                if not _is_candidate_sentence(sentence, key, config):
+                    continue
+                h = _hash64(key)
+                if h in seen:
+                    continue
+                seen.add(h)
+                est = sketch.add(h)
+                if est < threshold and h not in heavy:
+                    continue
+                heavy[h] = est
+                if len(heavy) > config.top_k:
+                    del heavy[min(heavy, key=heavy.__getitem__)]
+    if not heavy:
+        return []
+
+    # Pass 2: exact chapter counts for the surviving candidates (the sketch only over-estimates).
+    exact: dict[int, int] = dict.fromkeys(heavy, 0)
+    examples: dict[int, tuple[str, str]] = {}
+    for start, end in ranges:
+        seen = set()
+        for line in result.lines[start:end]:
+            for sentence in iter_sentences(line):
+                key = normalize_key(sentence)
+                if not _is_candidate_sentence(sentence, key, config):
+                    continue
+                h = _hash64(key)
+                if h not in exact or h in seen:
+                    continue
+                seen.add(h)
+                exact[h] += 1
+                examples.setdefault(h, (key, sentence))
+
+    out = [
+        NoiseCandidate(key=examples[h][0], text=examples[h][1], chapters=n)
+        for h, n in exact.items()
+        if n >= threshold
+    ]
+    return sorted(out, key=lambda c: (-c.chapters, c.key))
+
+
+def remove_repeated_sentences(
+    result: CleanResult,
+    candidates: list[NoiseCandidate],
+    *,
+    bucket: str = "repeated",
+) -> CleanResult:
+    if not candidates:
+        return result
+    keys = {c.key for c in candidates}
+    chapter_starts = {c.start for c in result.chapters}
+    new_index: dict[int, int] = {}
+    lines: list[str] = []
+    extracted: list[Match] = list(result.extracted)
+
+    for i, line in enumerate(result.lines):
+        if i in chapter_starts:
+            new_index[i] = len(lines)
+        kept: list[str] = []
+        removed = False
+        for sentence in iter_sentences(line):
+            if normalize_key(sentence) in keys:
+                extracted.append(Match(rule_name="auto_repeated", bucket=bucket, text=sentence))
+                removed = True
+                continue
+            kept.append(sentence)
+        if not removed:
+            lines.append(line)
+            continue
+        rebuilt = join_sentences(kept)
+        if rebuilt:
+            lines.append(rebuilt)
+
+    chapters = [Chapter(title=c.title, start=new_index.get(c.start, len(lines))) for c in result.chapters]
+    return CleanResult(lines=lines, extracted=extracted, chapters=chapters)
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import zipfile
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+from .cleaning import AnalyzedParagraph, HeadingMatcher, analyze_text
+from .html_text import html_chunks_to_text
+from .rules import Rule
+
+# Per-process state of a cleaning worker, set once by _init_worker. Each worker opens the EPUB
+# itself, so only member names go to the workers and only analyzed paragraphs come back.
+_zipf: zipfile.ZipFile | None = None
+_rules: list[Rule] = []
+_headings: HeadingMatcher | None = None
+
+
+def _init_worker(epub_path: str, rules: list[Rule], headings: HeadingMatcher) -> None:
+    global _zipf, _rules, _headings
+    _zipf = zipfile.ZipFile(epub_path, "r")
+    _rules = rules
+    _headings = headings
+
+
+def _analyze_member(path: str) -> list[AnalyzedParagraph] | None:
+    assert _zipf is not None and _headings is not None
+    try:
+        data = _zipf.read(path)
+    except KeyError:
+        return None
+    return analyze_text(html_chunks_to_text((data,)), _rules, _headings)
+
+
+def iter_analyzed_documents(
+    epub_path: str | Path,
+    paths: Iterable[str],
+    rules: Iterable[Rule],
+    headings: HeadingMatcher,
+    *,
+    workers: int,
+) -> Iterator[list[AnalyzedParagraph]]:
+    # Spine documents are parsed, normalized and run through the rules in `workers` processes;
+    # results come back in spine order (missing members skipped) for LineAssembler.feed_analyzed,
+    # which replays the heading state and quote carry-over sequentially. At most 2 * workers
+    # documents are in flight, so a slow consumer does not pile up finished documents.
+    window = 2 * workers
+    pending: deque[Future[list[AnalyzedParagraph] | None]] = deque()
+    it = iter(paths)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(str(epub_path), list(rules), headings),
+    ) as pool:
+        try:
+            for path in it:
+                pending.append(pool.submit(_analyze_member, path))
+                if len(pending) >= window:
+                    break
+            while pending:
+                result = pending.popleft().result()
+                for path in it:
+                    pending.append(pool.submit(_analyze_member, path))
+                    break
+                if result is not None:
+                    yield result
+        finally:
+            for fut in pending:
+                fut.cancel()
@@ -2,33 +2,136 @@ from __future__ import annotations
 
 import zipfile
 from pathlib import Path
-from typing import Iterable
+from typing import TYPE_CHECKING, Iterable, Iterator
 
-from .cleaning import CleanResult, HeadingMatcher, clean_text_to_paragraph_lines
-from .epub import iter_text_documents
-from .html_text import html_to_text
+from metrics import REGISTRY
+
+from .chapters import Chapter, chapters_path, load_chapters, write_chapters  # noqa: F401 (re-exported)
+from .cleaning import CleanResult, HeadingMatcher, LineAssembler
+from .epub import PlannedDocument, iter_documents, iter_text_documents, plan_text_documents
+from .html_text import html_chunks_to_text
 from .rules import Rule
 
+if TYPE_CHECKING:
+    from .profiling import RuleProfiler
+
+
+_BOOKS = REGISTRY.counter("step1_books_total", "EPUBs cleaned")
+_DOCUMENTS = REGISTRY.counter("step1_documents_total", "Spine documents cleaned")
+_LINES = REGISTRY.counter("step1_lines_total", "Cleaned lines produced")
+_EXTRACTED = REGISTRY.counter("step1_extracted_total", "Sentences removed or extracted by rules")
+
+
+class CleanStream:
+    # Iterating yields cleaned lines while the EPUB is still being read; result() is available
+    # once iteration is finished. Documents are normalized one at a time, which produces the
+    # same paragraphs as normalizing the "\n\n"-joined book.
+    def __init__(
+        self,
+        epub_path: str | Path,
+        rules: Iterable[Rule] | None = None,
+        headings: HeadingMatcher | None = None,
+        *,
+        profiler: RuleProfiler | None = None,
+        read_workers: int = 2,
+        workers: int = 1,
+        use_nav: bool = True,
+    ):
+        # read_workers: threads inflating upcoming spine documents ahead of parsing (0: read each
+        # document when it is reached). workers > 1: documents are parsed and cleaned in that many
+        # processes and merged in spine order; the output is identical. The rule profiler needs
+        # to see every rule evaluation, so profiling always runs in-process. use_nav: skip spine
+        # documents the table of contents marks as non-chapter before reading them (see
+        # plan_text_documents); False parses every text document.
+        if rules is None:
+            raise ValueError("rules is required (pass loaded rules from config file)")
+        if headings is None:
+            raise ValueError("headings is required (pass loaded heading matcher from config file)")
+        self.epub_path = Path(epub_path)
+        self._assembler = LineAssembler(rules, headings, profiler=profiler)
+        self._lines: list[str] = []
+        self._done = False
+        self._read_workers = read_workers
+        self._workers = workers if profiler is None else 1
+        self._use_nav = use_nav
+
+    def __iter__(self) -> Iterator[str]:
+        if self._done:
+            raise RuntimeError("CleanStream can only be iterated once")
+        assembler = self._assembler
+        with zipfile.ZipFile(self.epub_path, "r") as zipf:
+            if self._use_nav:
+                plan = plan_text_documents(
+                    zipf, assembler.headings.is_strict_chapter_title, assembler.headings.is_any_heading
+                )
+            else:
+                plan = [PlannedDocument(href=href) for href in iter_text_documents(zipf)]
+            paths = [doc.href for doc in plan]
+            if self._workers > 1:
+                from .parallel import iter_analyzed_documents
+
+                analyzed = iter_analyzed_documents(
+                    self.epub_path,
+                    paths,
+                    assembler.rules,
+                    assembler.headings,
+                    workers=self._workers,
+                )
+                batches = (assembler.feed_analyzed(paragraphs) for paragraphs in analyzed)
+            else:
+                docs = iter_documents(zipf, paths, workers=self._read_workers)
+                batches = (assembler.feed(html_chunks_to_text(chunks)) for chunks in docs)
+            for doc, batch in zip(plan, batches):
+                if doc.after_skipped:
+                    assembler.end_chapter()
+                lines, extracted = len(self._lines), len(assembler.extracted)
+                for line in batch:
+                    self._lines.append(line)
+                    yield line
+                _DOCUMENTS.inc()
+                _LINES.inc(len(self._lines) - lines)
+                _EXTRACTED.inc(len(assembler.extracted) - extracted)
+        for line in assembler.close():
+            self._lines.append(line)
+            _LINES.inc()
+            yield line
+        _BOOKS.inc()
+        self._done = True
+
+    @property
+    def chapters(self) -> list[Chapter]:
+        # Grows while iterating: a chapter is listed before its first line is yielded.
+        return self._assembler.chapters
+
+    def result(self) -> CleanResult:
+        if not self._done:
+            raise RuntimeError("CleanStream.result() called before the stream was consumed")
+        return CleanResult(
+            lines=self._lines,
+            extracted=self._assembler.extracted,
+            chapters=self._assembler.chapters,
+        )
+
 
 def clean_epub_to_sentences(
     epub_path: str | Path,
     rules: Iterable[Rule] | None = None,
     headings: HeadingMatcher | None = None,
+    *,
+    profiler: RuleProfiler | None = None,
+    read_workers: int = 2,
+    workers: int = 1,
+    use_nav: bool = True,
 ) -> CleanResult:
-    epub_path = Path(epub_path)
-    if rules is None:
-        raise ValueError("rules is required (pass loaded rules from config file)")
-    if headings is None:
-        raise ValueError("headings is required (pass loaded heading matcher from config file)")
-    rules_list = list(rules)
-    texts: list[str] = []
-
-    with zipfile.ZipFile(epub_path, "r") as zipf:
-        for doc_path in iter_text_documents(zipf):
-            try:
-                doc_bytes = zipf.read(doc_path)
-            except KeyError:
-                continue
-            texts.append(html_to_text(doc_bytes))
-
-    return clean_text_to_paragraph_lines("\n\n".join(texts), rules_list, headings)
+    stream = CleanStream(
+        epub_path,
+        rules,
+        headings,
+        profiler=profiler,
+        read_workers=read_workers,
+        workers=workers,
+        use_nav=use_nav,
+    )
+    for _ in stream:
+        pass
+    return stream.result()
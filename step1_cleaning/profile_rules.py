@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from .config import load_clean_config
+from .pipeline import clean_epub_to_sentences
+from .profiling import RuleProfiler
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="python -m step1_cleaning.profile_rules",
+        description="Profile rules.json over a corpus of EPUBs: per-rule evaluations, hits, match time and risky patterns.",
+    )
+    p.add_argument("epubs", nargs="*", help="EPUB files (or directories containing .epub files)")
+    p.add_argument(
+        "-o",
+        "--out",
+        help="Output report JSON path. Default: print to stdout",
+    )
+    p.add_argument(
+        "--rules",
+        default=str(Path(__file__).resolve().parent / "rule" / "rules.json"),
+        help="Path to rules.json. Default: step1_cleaning/rule/rules.json",
+    )
+    return p
+
+
+def _expand_inputs(items: list[str]) -> list[Path]:
+    out: list[Path] = []
+    for item in items:
+        p = Path(item)
+        if p.is_dir():
+            out.extend(sorted(p.rglob("*.epub")))
+        else:
+            out.append(p)
+    return out
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    epubs = _expand_inputs(args.epubs)
+    if not epubs:
+        build_parser().error("at least one epub is required")
+
+    rules, headings = load_clean_config(args.rules)
+    profiler = RuleProfiler(rules)
+    for path in epubs:
+        clean_epub_to_sentences(path, rules=rules, headings=headings, profiler=profiler)
+
+    report = {"rules_file": str(args.rules), "books": [str(p) for p in epubs], **profiler.report()}
+    rendered = json.dumps(report, ensure_ascii=False, indent=2) + "\n"
+    if args.out:
+        Path(args.out).write_text(rendered, encoding="utf-8")
+    else:
+        sys.stdout.write(rendered)
+
+    for r in report["rules"]:
+        flags = []
+        if r["never_fired"]:
+            flags.append("never fired")
+        if r["risks"]:
+            flags.append("risky")
+        print(
+            f"{r['name']:<32} evals={r['evaluations']:<8} hits={r['hits']:<6} "
+            f"time={r['time_ms']:.1f}ms {' '.join(flags)}",
+            file=sys.stderr,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+try:  # Python 3.11+
+    import re._constants as _sre_c
+    import re._parser as _sre_parse
+except ImportError:  # pragma: no cover - older Python
+    import sre_constants as _sre_c  # type: ignore[no-redef]
+    import sre_parse as _sre_parse  # type: ignore[no-redef]
+
+from .rules import Match, Rule
+
+
+_MAXREPEAT = _sre_c.MAXREPEAT
+_REPEAT_OPS = {_sre_c.MAX_REPEAT, _sre_c.MIN_REPEAT}
+if hasattr(_sre_c, "POSSESSIVE_REPEAT"):
+    _POSSESSIVE_OPS = {_sre_c.POSSESSIVE_REPEAT}
+else:  # pragma: no cover
+    _POSSESSIVE_OPS = set()
+
+# Repeats with a max above this are treated as "unbounded" for risk purposes.
+_WIDE_REPEAT = 32
+
+
+@dataclass
+class RuleStats:
+    name: str
+    kind: str
+    bucket: str
+    pattern: str
+    flags: str
+    evaluations: int = 0
+    hits: int = 0
+    time_ns: int = 0
+
+
+class RuleProfiler:
+    def __init__(self, rules: Iterable[Rule]):
+        self.rules = list(rules)
+        self.stats = [
+            RuleStats(
+                name=r.name,
+                kind=r.kind,
+                bucket=r.bucket,
+                pattern=r.pattern.pattern,
+                flags=_flags_to_str(r.pattern.flags),
+            )
+            for r in self.rules
+        ]
+        self.texts = 0
+        self.texts_dropped = 0
+        self.wall_ns = 0
+
+    def apply(self, text: str) -> tuple[str | None, list[Match]]:
+        # Same semantics as rules.apply_rules, with per-rule timing.
+        matches: list[Match] = []
+        cur: str | None = text
+        clock = time.perf_counter_ns
+        started = clock()
+        for rule, st in zip(self.rules, self.stats):
+            if cur is None:
+                break
+            t0 = clock()
+            cur, m = rule.apply(cur)
+            st.time_ns += clock() - t0
+            st.evaluations += 1
+            if m is not None:
+                st.hits += 1
+                matches.append(m)
+        self.wall_ns += clock() - started
+        self.texts += 1
+        if cur is None:
+            self.texts_dropped += 1
+        return cur, matches
+
+    def report(self) -> dict[str, Any]:
+        rules_out: list[dict[str, Any]] = []
+        for idx, st in enumerate(self.stats):
+            rules_out.append(
+                {
+                    "index": idx,
+                    "name": st.name,
+                    "kind": st.kind,
+                    "bucket": st.bucket,
+                    "pattern": st.pattern,
+                    "flags": st.flags,
+                    "evaluations": st.evaluations,
+                    "hits": st.hits,
+                    "hit_rate": round(st.hits / st.evaluations, 6) if st.evaluations else 0.0,
+                    "time_ms": round(st.time_ns / 1e6, 3),
+                    "us_per_eval": round(st.time_ns / 1e3 / st.evaluations, 3) if st.evaluations else 0.0,
+                    "never_fired": st.evaluations > 0 and st.hits == 0,
+                    "risks": pattern_risks(self.rules[idx].pattern),
+                }
+            )
+
+        total_rule_ns = sum(st.time_ns for st in self.stats)
+        return {
+            "texts": self.texts,
+            "texts_dropped": self.texts_dropped,
+            "total_time_ms": round(self.wall_ns / 1e6, 3),
+            "rules_time_ms": round(total_rule_ns / 1e6, 3),
+            "rules": sorted(rules_out, key=lambda r: r["time_ms"], reverse=True),
+            "never_fired": [r["name"] for r in rules_out if r["never_fired"]],
+            "risky": [r["name"] for r in rules_out if r["risks"]],
+            "suggested_order": suggest_order(self.rules, self.stats),
+        }
+
+
+def suggest_order(rules: list[Rule], stats: list[RuleStats]) -> list[str]:
+    # Only drop/extract rules end evaluation early, so only runs of consecutive terminating
+    # rules are reordered (cheap + frequent first). replace rules keep their position because
+    # they change the text seen by later rules.
+    # Note: moving overlapping terminating rules changes which bucket a sentence is attributed to.
+    def gain(st: RuleStats) -> float:
+        if not st.evaluations:
+            return 0.0
+        cost = st.time_ns / st.evaluations + 1.0
+        return (st.hits / st.evaluations) / cost
+
+    out: list[str] = []
+    run: list[tuple[Rule, RuleStats]] = []
+    for rule, st in zip(rules, stats):
+        if rule.kind in ("drop", "extract"):
+            run.append((rule, st))
+            continue
+        out.extend(r.name for r, _ in sorted(run, key=lambda p: gain(p[1]), reverse=True))
+        run = []
+        out.append(rule.name)
+    out.extend(r.name for r, _ in sorted(run, key=lambda p: gain(p[1]), reverse=True))
+    return out
+
+
+def _flags_to_str(flags: int) -> str:
+    s = ""
+    if flags & re.IGNORECASE:
+        s += "i"
+    if flags & re.MULTILINE:
+        s += "m"
+    if flags & re.DOTALL:
+        s += "s"
+    return s
+
+
+def _is_unbounded(op: Any, av: Any) -> bool:
+    return op in _REPEAT_OPS and (av[1] == _MAXREPEAT or av[1] > _WIDE_REPEAT)
+
+
+def _children(op: Any, av: Any) -> list[list[tuple[Any, Any]]]:
+    if op in _REPEAT_OPS or op in _POSSESSIVE_OPS:
+        return [list(av[2])]
+    if op == _sre_c.SUBPATTERN:
+        return [list(av[3])]
+    if op == _sre_c.BRANCH:
+        return [list(b) for b in av[1]]
+    if op in (_sre_c.ASSERT, _sre_c.ASSERT_NOT):
+        return [list(av[1])]
+    if hasattr(_sre_c, "ATOMIC_GROUP") and op == _sre_c.ATOMIC_GROUP:
+        return [list(av)]
+    if op == _sre_c.GROUPREF_EXISTS:
+        return [list(b) for b in av[1:] if b is not None]
+    return []
+
+
+def _contains(items: list[tuple[Any, Any]], pred) -> bool:
+    for op, av in items:
+        if pred(op, av):
+            return True
+        if any(_contains(child, pred) for child in _children(op, av)):
+            return True
+    return False
+
+
+def _repeat_body(items: list[tuple[Any, Any]]) -> list[tuple[Any, Any]]:
+    # Unwrap single plain groups so (\s)+ and \s+ compare the same.
+    while len(items) == 1 and items[0][0] == _sre_c.SUBPATTERN:
+        items = list(items[0][1][3])
+    return items
+
+
+def _walk_risks(items: list[tuple[Any, Any]], risks: set[str]) -> None:
+    prev_unbounded: tuple[Any, Any] | None = None
+    for op, av in items:
+        if _is_unbounded(op, av):
+            body = list(av[2])
+            if _contains(body, _is_unbounded):
+                risks.add("nested unbounded quantifiers (e.g. (a+)+) can backtrack exponentially")
+            if _contains(body, lambda o, _a: o == _sre_c.BRANCH):
+                risks.add("quantified alternation: overlapping branches under * or + can backtrack exponentially")
+            if prev_unbounded is not None:
+                a = _repeat_body(list(prev_unbounded[2]))
+                b = _repeat_body(body)
+                if a == b or any(len(x) == 1 and x[0][0] == _sre_c.ANY for x in (a, b)):
+                    risks.add("adjacent unbounded quantifiers over overlapping input (e.g. \\s*\\s*) backtrack polynomially")
+            prev_unbounded = av
+        elif op == _sre_c.SUBPATTERN or op == _sre_c.AT:
+            pass  # transparent for adjacency purposes
+        else:
+            prev_unbounded = None
+        for child in _children(op, av):
+            _walk_risks(child, risks)
+
+
+def pattern_risks(pattern: re.Pattern[str]) -> list[str]:
+    try:
+        parsed = list(_sre_parse.parse(pattern.pattern, pattern.flags & ~re.UNICODE))
+    except Exception:  # noqa: BLE001
+        return []
+    risks: set[str] = set()
+    _walk_risks(parsed, risks)
+
+    first = _repeat_body(parsed[:1])
+    if first and _is_unbounded(*first[0]):
+        body = _repeat_body(list(first[0][1][2]))
+        if len(body) == 1 and body[0][0] == _sre_c.ANY:
+            risks.add("leading .* / .+ is retried at every start position by search(): quadratic on long text")
+
+    if pattern.flags & re.MULTILINE and not _contains(parsed, lambda o, _a: o == _sre_c.AT):
+        risks.add('flag "m" has no effect without ^ or $ (remove it)')
+    if pattern.flags & re.DOTALL and not _contains(parsed, lambda o, _a: o == _sre_c.ANY):
+        risks.add('flag "s" has no effect without . (remove it)')
+    return sorted(risks)
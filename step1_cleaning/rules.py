@@ -12,6 +12,7 @@ class Match:
     rule_name: str
     bucket: str
     text: str
+    detail: dict[str, Any] | None = None  # extra fields for the extracted JSONL row
 
 
 @dataclass(frozen=True)
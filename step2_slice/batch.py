@@ -0,0 +1,437 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from bisect import bisect_right
+from collections.abc import Container, Sequence
+from dataclasses import asdict
+from itertools import accumulate
+from pathlib import Path
+from typing import Any
+
+from step1_cleaning.chapters import load_chapters
+
+from .config import ProviderConfig, SliceConfig, load_provider_config, load_slice_config
+from .offline import plan_chunk_cuts, plan_cuts
+from .pipeline import SliceItem, _timestamp_dirname
+from .providers.base import parse_chat_response
+from .providers.http import HttpError
+from .segmenter import Cut, build_messages, parse_cuts, validate_cuts
+from .slicing import count_chars, estimate_tokens
+
+
+# Batch mode: every request of a book is written up front, so the text is split into segments
+# that do not depend on any reply (the sync pipeline places each chunk after the previous
+# chunk's last cut). Segments end at chapter starts or at offline (DP) slice boundaries and each
+# one is sliced on its own; its last line always closes a slice.
+MANIFEST_NAME = "batch.manifest.json"
+REQUESTS_NAME = "batch.requests.jsonl"
+RETRY_NAME = "batch.retry.jsonl"
+
+_CHAT_PATHS = {"volc_ark": "/api/v3/chat/completions", "openai_compatible": "/v1/chat/completions"}
+
+
+def _read_sentences(txt_path: Path) -> list[str]:
+    sentences = [line.strip() for line in txt_path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    if not sentences:
+        raise ValueError(f"Empty input: {txt_path}")
+    return sentences
+
+
+def _text_digest(sentences: Sequence[str]) -> str:
+    return hashlib.sha256("\n".join(sentences).encode("utf-8")).hexdigest()
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def plan_segments(
+    sentences: Sequence[str],
+    *,
+    chunk_input_tokens: int,
+    target_min: int,
+    target_max: int,
+    chapter_starts: Container[int] = (),
+) -> list[tuple[int, int]]:
+    # 0-based [start, end) line ranges, each within chunk_input_tokens (a single oversized line
+    # becomes its own segment). A segment ends at the last chapter start that keeps it at least
+    # half full, otherwise at the last planned slice boundary that fits, otherwise at the budget.
+    n = len(sentences)
+    prefix = list(accumulate((estimate_tokens(s) + 1 for s in sentences), initial=0))
+    planned = plan_cuts([count_chars(s) for s in sentences], target_min=target_min, target_max=target_max)
+    slice_ends = [e + 1 for e in planned]
+    chapters = sorted(i for i in range(1, n) if i in chapter_starts)
+
+    segments: list[tuple[int, int]] = []
+    start = 0
+    while start < n:
+        limit = max(bisect_right(prefix, prefix[start] + chunk_input_tokens) - 1, start + 1)
+        if limit >= n:
+            segments.append((start, n))
+            break
+        end = limit
+        k = bisect_right(chapters, limit) - 1
+        if k >= 0 and chapters[k] > start and (prefix[chapters[k]] - prefix[start]) * 2 >= chunk_input_tokens:
+            end = chapters[k]
+        else:
+            k = bisect_right(slice_ends, limit) - 1
+            if k >= 0 and slice_ends[k] > start:
+                end = slice_ends[k]
+        segments.append((start, end))
+        start = end
+    return segments
+
+
+def export_batch(
+    txt_path: str | Path,
+    *,
+    provider_name: str,
+    provider: ProviderConfig,
+    slice_config: SliceConfig,
+    out_dir: str | Path | None = None,
+) -> Path:
+    # Writes batch.requests.jsonl (one chat completion request per segment, in the provider's
+    # batch input format) and batch.manifest.json next to it; returns the manifest path.
+    txt_path = Path(txt_path)
+    sentences = _read_sentences(txt_path)
+    default_dir = Path("book") / f"{txt_path.stem}_slice" / f"batch_{_timestamp_dirname()}"
+    out_base = Path(out_dir) if out_dir else default_dir
+    out_base.mkdir(parents=True, exist_ok=True)
+
+    segments = plan_segments(
+        sentences,
+        chunk_input_tokens=slice_config.chunk_input_tokens,
+        target_min=slice_config.target_chars_min,
+        target_max=slice_config.target_chars_max,
+        chapter_starts={c.start for c in load_chapters(txt_path)},
+    )
+    url = _CHAT_PATHS.get(provider.type, "/v1/chat/completions")
+    seg_meta: list[dict[str, Any]] = []
+    lines_out: list[str] = []
+    for i, (start, end) in enumerate(segments, start=1):
+        custom_id = f"seg-{i:05d}"
+        body: dict[str, Any] = {
+            "model": provider.model,
+            "messages": build_messages(
+                start_line=start + 1,
+                lines=[(j + 1, sentences[j]) for j in range(start, end)],
+                target_chars_min=slice_config.target_chars_min,
+                target_chars_max=slice_config.target_chars_max,
+                cuts_only=slice_config.two_phase,
+            ),
+            "max_tokens": slice_config.completion_max_tokens,
+            "temperature": slice_config.temperature,
+        }
+        if slice_config.response_format:
+            body["response_format"] = {"type": slice_config.response_format}
+        lines_out.append(
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": url, "body": body}, ensure_ascii=False)
+        )
+        seg_meta.append({"custom_id": custom_id, "start_line": start + 1, "end_line": end})
+
+    requests_path = out_base / REQUESTS_NAME
+    _write_atomic(requests_path, "\n".join(lines_out) + "\n")
+    manifest = {
+        "source_txt": str(txt_path),
+        "text_sha256": _text_digest(sentences),
+        "line_count": len(sentences),
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "provider": provider_name,
+        "model": provider.model,
+        "slice_config": asdict(slice_config),
+        "requests_file": REQUESTS_NAME,
+        "segments": seg_meta,
+    }
+    manifest_path = out_base / MANIFEST_NAME
+    _write_atomic(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2) + "\n")
+    return manifest_path
+
+
+def _load_results(paths: Sequence[str | Path]) -> dict[str, dict[str, Any]]:
+    # custom_id -> result line; later files win, so a retry batch's results can be passed after
+    # the original ones.
+    out: dict[str, dict[str, Any]] = {}
+    for path in paths:
+        for line in Path(path).read_text(encoding="utf-8").splitlines():
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            cid = rec.get("custom_id")
+            if not cid:
+                continue
+            if cid in out and not rec.get("response") and out[cid].get("response"):
+                continue  # keep an earlier answer over a later failure
+            out[cid] = rec
+    return out
+
+
+def _result_content(rec: dict[str, Any]) -> tuple[str, str | None]:
+    # (message content, model) of one batch output line; raises ValueError for failed requests
+    # and MalformedResponseError for bodies without a message.
+    if rec.get("error"):
+        err = rec["error"]
+        raise ValueError(err.get("message") if isinstance(err, dict) and err.get("message") else str(err))
+    resp = rec.get("response") or {}
+    status = int(resp.get("status_code") or 200)
+    body = resp.get("body")
+    if status >= 400 or not isinstance(body, dict):
+        raise ValueError(f"batch request failed: status={status}")
+    result = parse_chat_response(json.dumps(body).encode("utf-8"), status=status)
+    return result.content, body.get("model")
+
+
+def _segment_cuts(
+    cuts: list[Cut],
+    *,
+    start_line: int,
+    end_line: int,
+    sentences: Sequence[str],
+    target_min: int,
+    target_max: int,
+) -> list[Cut]:
+    # The segment's last line always ends a slice. The prompt lets the model leave out a short
+    # tail; it becomes its own slice, or is merged into the previous one when under half a slice
+    # and the merged slice stays within target_max.
+    cuts = validate_cuts(cuts=cuts, min_line=start_line, max_line=end_line)
+    if cuts and cuts[-1].end_line == end_line:
+        return cuts
+    tail_start = cuts[-1].end_line if cuts else start_line - 1
+    tail = count_chars("\n".join(sentences[tail_start:end_line]))
+    if cuts and tail < target_min // 2:
+        prev_end = cuts[-2].end_line if len(cuts) > 1 else start_line - 1
+        if count_chars("\n".join(sentences[prev_end:end_line])) <= target_max:
+            last = cuts[-1]
+            return cuts[:-1] + [Cut(end_line=end_line, title=last.title, summary=last.summary)]
+    return cuts + [Cut(end_line=end_line)]
+
+
+def ingest_batch(
+    manifest_path: str | Path,
+    result_paths: Sequence[str | Path],
+    *,
+    out_dir: str | Path | None = None,
+) -> Path:
+    # Builds slices.json/run.json from the batch output file(s). Segments without a usable
+    # answer are cut offline when offline_fallback is set, otherwise they become error items
+    # and their request lines are copied to batch.retry.jsonl for resubmission.
+    manifest_path = Path(manifest_path)
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    base = manifest_path.parent
+    txt_path = Path(manifest["source_txt"])
+    sentences = _read_sentences(txt_path)
+    if _text_digest(sentences) != manifest["text_sha256"]:
+        raise ValueError(f"{txt_path} changed since the batch was exported")
+    slice_config = SliceConfig(**manifest["slice_config"])
+    results = _load_results(result_paths)
+
+    out_base = Path(out_dir) if out_dir else base
+    out_base.mkdir(parents=True, exist_ok=True)
+    out_json = out_base / "slices.json"
+
+    items: list[SliceItem] = []
+    models_used: set[str] = set()
+    json_repairs: dict[str, int] = {}
+    failed: list[str] = []
+    missing = 0
+    offline_segments = 0
+    first_error: dict[str, Any] | None = None
+    for seg in manifest["segments"]:
+        start_line = int(seg["start_line"])
+        end_line = int(seg["end_line"])
+        rec = results.get(seg["custom_id"])
+        cuts: list[Cut] = []
+        error: str | None = None
+        if rec is None:
+            missing += 1
+            error = f"no batch result for {seg['custom_id']}"
+        else:
+            try:
+                content, model = _result_content(rec)
+                cuts = _segment_cuts(
+                    parse_cuts(content, repairs=json_repairs),
+                    start_line=start_line,
+                    end_line=end_line,
+                    sentences=sentences,
+                    target_min=slice_config.target_chars_min,
+                    target_max=slice_config.target_chars_max,
+                )
+                if model:
+                    models_used.add(model)
+            except (ValueError, HttpError) as e:
+                error = str(e)
+
+        if error is not None:
+            failed.append(seg["custom_id"])
+            if slice_config.offline_fallback:
+                ends = plan_chunk_cuts(
+                    [count_chars(t) for t in sentences[start_line - 1 : end_line]],
+                    start_line=start_line,
+                    target_min=slice_config.target_chars_min,
+                    target_max=slice_config.target_chars_max,
+                    final=True,
+                )
+                cuts = [Cut(end_line=e) for e in ends]
+                offline_segments += 1
+            else:
+                items.append(
+                    SliceItem(
+                        slice_id=len(items) + 1,
+                        start_line=start_line,
+                        end_line=end_line,
+                        char_len=None,
+                        text=None,
+                        error=error,
+                    )
+                )
+                if first_error is None:
+                    first_error = {
+                        "message": error,
+                        "custom_id": seg["custom_id"],
+                        "start_line": start_line,
+                        "end_line": end_line,
+                    }
+                continue
+
+        cur = start_line
+        for cut in cuts:
+            text = "\n".join(sentences[cur - 1 : cut.end_line])
+            items.append(
+                SliceItem(
+                    slice_id=len(items) + 1,
+                    start_line=cur,
+                    end_line=cut.end_line,
+                    char_len=count_chars(text),
+                    text=text,
+                    title=cut.title,
+                    summary=cut.summary,
+                )
+            )
+            cur = cut.end_line + 1
+
+    payload = [{k: v for k, v in asdict(item).items() if v is not None} for item in items]
+    _write_atomic(out_json, json.dumps(payload, ensure_ascii=False, indent=2) + "\n")
+
+    retry_path = out_base / RETRY_NAME
+    if failed and not slice_config.offline_fallback:
+        wanted = set(failed)
+        requests = (base / manifest["requests_file"]).read_text(encoding="utf-8").splitlines()
+        retry = [line for line in requests if line.strip() and json.loads(line)["custom_id"] in wanted]
+        _write_atomic(retry_path, "\n".join(retry) + "\n")
+    else:
+        retry_path.unlink(missing_ok=True)
+
+    run_meta: dict[str, Any] = {
+        "source_txt": str(txt_path),
+        "source_text": str(txt_path),
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "slice_config": manifest["slice_config"],
+        "provider_order": [manifest["provider"]],
+        "dry_run": False,
+        "max_slices": None,
+        "output_format": "json",
+        "output_file": str(out_json),
+        "batch": {
+            "manifest": str(manifest_path),
+            "result_files": [str(p) for p in result_paths],
+            "segments": len(manifest["segments"]),
+            "missing": missing,
+            "failed": len(failed),
+        },
+        "slices_written": len(items),
+        "providers_used": [manifest["provider"]] if models_used else [],
+        "models_used": sorted(models_used),
+    }
+    if json_repairs:
+        run_meta["json_repairs"] = json_repairs
+    if slice_config.offline_fallback:
+        run_meta["offline_fallback_chunks"] = offline_segments
+    if first_error is not None:
+        run_meta["status"] = "error"
+        run_meta["error"] = first_error
+    else:
+        run_meta["status"] = "ok"
+    _write_atomic(out_base / "run.json", json.dumps(run_meta, ensure_ascii=False, indent=2) + "\n")
+    return out_json
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="python -m step2_slice.batch",
+        description="Slice books through a provider's asynchronous batch API (export requests, ingest results).",
+    )
+    sub = p.add_subparsers(dest="cmd")
+
+    exp = sub.add_parser("export", help="Write the batch request file and manifest for a Step1 txt.")
+    exp.add_argument("txt", help="Path to Step1 output .txt (one sentence per line)")
+    exp.add_argument("--out-dir", help="Output directory. Default: book/<stem>_slice/batch_<timestamp>/")
+    exp.add_argument("--provider", help="Provider from llm.json to target. Default: first of provider_order.")
+    exp.add_argument(
+        "--llm-config",
+        default=str(Path(__file__).resolve().parent / "config" / "llm.json"),
+        help="Path to llm.json (providers/base_url/api_key/model).",
+    )
+    exp.add_argument(
+        "--slice-config",
+        default=str(Path(__file__).resolve().parent / "config" / "slice.json"),
+        help="Path to slice.json (slice params, chunk tokens).",
+    )
+
+    ing = sub.add_parser("ingest", help="Assemble slices.json from the batch output file(s).")
+    ing.add_argument("manifest", help="batch.manifest.json, or the directory containing it")
+    ing.add_argument("results", nargs="+", help="Batch output .jsonl file(s); later files override earlier ones")
+    ing.add_argument("--out-dir", help="Output directory. Default: the manifest's directory.")
+    return p
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if not args.cmd:
+        build_parser().error("command is required (export | ingest)")
+
+    if args.cmd == "export":
+        llm_path = Path(args.llm_config)
+        slice_path = Path(args.slice_config)
+        if not llm_path.exists():
+            build_parser().error(f"llm config not found: {llm_path} (copy from llm.example.json)")
+        if not slice_path.exists():
+            build_parser().error(f"slice config not found: {slice_path} (copy from slice.example.json)")
+        providers = load_provider_config(llm_path)
+        slice_cfg = load_slice_config(slice_path)
+        name = args.provider or slice_cfg.provider_order[0]
+        if name not in providers:
+            build_parser().error(f"provider not found in llm config: {name}")
+        manifest = export_batch(
+            args.txt,
+            provider_name=name,
+            provider=providers[name],
+            slice_config=slice_cfg,
+            out_dir=args.out_dir,
+        )
+        print(manifest)
+        return 0
+
+    manifest = Path(args.manifest)
+    if manifest.is_dir():
+        manifest = manifest / MANIFEST_NAME
+    if not manifest.exists():
+        build_parser().error(f"manifest not found: {manifest}")
+    out_json = ingest_batch(manifest, args.results, out_dir=args.out_dir)
+    print(out_json)
+    meta = json.loads((out_json.parent / "run.json").read_text(encoding="utf-8"))
+    if meta["status"] != "ok":
+        failed = meta["batch"]["failed"]
+        print(f"slice error: {meta['error']['message']} ({failed} segment(s) failed)", file=sys.stderr)
+        print(f"resubmit: {out_json.parent / RETRY_NAME}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
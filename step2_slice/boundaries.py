@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import re
+from collections.abc import Container, Sequence
+from dataclasses import dataclass
+
+from .slicing import count_chars
+
+
+# A line made only of decoration, e.g. "***", "＊＊＊", "◇◇◇", "——", "……"
+_SCENE_BREAK_RE = re.compile(r"^[\s*＊◇◆○●☆★~～—\-=·#＃.。…]+$")
+# Paragraph openings that usually start a new scene after a jump in time or place.
+_TIME_SKIP_RE = re.compile(
+    r"^[“「『\"]?(?:"
+    r"第[二三四五六七八九十两几\d]+[天日]|次日|翌日|隔天|隔日|翌晨|当晚|当夜|入夜|深夜|清晨|傍晚|"
+    r"[一二三四五六七八九十两几数半多\d]+(?:个)?(?:天|日|月|年|周|星期|小时|时辰)(?:后|之后|以后|过去)|"
+    r"(?:几|数|半)(?:天|日|月|年)(?:后|之后)|不知过了多久|与此同时|另一边|另一方面|"
+    r"过了[^，。]{0,6}(?:天|日|月|年|会儿)"
+    r")"
+)
+_DIALOGUE_OPENERS = "“「『\""
+
+_W_CHAPTER = 5.0
+_W_SCENE_BREAK = 4.0
+_W_TIME_SKIP = 3.0
+_W_DIALOGUE_SWITCH = 1.0
+
+
+@dataclass(frozen=True)
+class Candidate:
+    end_idx: int  # 0-based inclusive last line of the slice
+    char_len: int
+    score: float
+
+
+def _is_dialogue(line: str) -> bool:
+    return line[:1] in _DIALOGUE_OPENERS
+
+
+def boundary_score(prev: str, nxt: str | None, *, chapter_start: bool = False) -> float:
+    # How good a place the gap between prev and nxt is for ending a slice.
+    if nxt is None:
+        return _W_CHAPTER  # end of the book
+    score = 0.0
+    if chapter_start:
+        score += _W_CHAPTER
+    if _SCENE_BREAK_RE.match(prev):
+        score += _W_SCENE_BREAK
+    elif _SCENE_BREAK_RE.match(nxt):
+        score += _W_SCENE_BREAK / 2  # the marker would open the next slice
+    if _TIME_SKIP_RE.match(nxt):
+        score += _W_TIME_SKIP
+    if _is_dialogue(prev) != _is_dialogue(nxt):
+        score += _W_DIALOGUE_SWITCH
+    return score
+
+
+def rank_candidates(
+    lines: Sequence[str],
+    *,
+    target_min: int,
+    target_max: int,
+    count: int,
+    offset: int = 0,
+    chapter_starts: Container[int] = (),
+) -> list[Candidate]:
+    # lines[0] is the first line of the slice; lines should reach one line past target_max chars
+    # (or the end of the book) so the last boundary in the band can be scored too.
+    # offset: index of lines[0] in the book, for chapter_starts (0-based line indices).
+    # Returns up to `count` best boundaries whose slice length falls in the target band, in line
+    # order; boundaries nearer the middle of the band win ties.
+    if not lines:
+        return []
+    target_mid = (target_min + target_max) // 2
+    spread = max(target_max - target_min, 1)
+    band: list[Candidate] = []
+    total = 0
+    last: Candidate | None = None
+    for k, line in enumerate(lines):
+        total += count_chars(line)
+        nxt = lines[k + 1] if k + 1 < len(lines) else None
+        score = boundary_score(line, nxt, chapter_start=(offset + k + 1) in chapter_starts)
+        score -= abs(total - target_mid) / spread
+        last = Candidate(end_idx=offset + k, char_len=total, score=score)
+        if total > target_max:
+            break
+        if total >= target_min:
+            band.append(last)
+    if not band:
+        # Nothing lands inside the band (very long paragraphs, or the book ends early):
+        # offer the single nearest boundary.
+        return [last] if last is not None else []
+    best = sorted(band, key=lambda c: (-c.score, c.end_idx))[:count]
+    return sorted(best, key=lambda c: c.end_idx)
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import Any
+
+from .providers.base import ChatResult, token_counts
+from .segmenter import Cut
+
+# Model cascade (slice.json "cascade_provider_order"): each chunk is first sent to the cheap
+# tier, whose cuts are checked locally; only chunks whose cuts fail the check go on to the
+# strong tier (provider_order). Most chunks are plain narration that a small model cuts fine.
+
+
+def check_cuts(
+    cuts: list[Cut],
+    char_lens: list[int],
+    *,
+    start_line: int,
+    target_min: int,
+    target_max: int,
+    min_coverage: float,
+    final: bool,
+    needed: int | None = None,
+) -> str | None:
+    # Why the cuts of a chunk (char_lens: chars per line, first line is start_line) are not good
+    # enough, or None. The last slice of the book may be short, and no cuts are right for a
+    # final chunk that fits in one slice; needed: only that many cuts are going to be used
+    # (max_slices).
+    if not cuts:
+        return None if final and sum(char_lens) <= target_max else "no_cuts"
+    end_line = start_line + len(char_lens) - 1
+    prev = start_line - 1
+    for c in cuts:
+        if c.end_line <= prev:
+            return "not_increasing"
+        if c.end_line > end_line:
+            return "outside_chunk"
+        prev = c.end_line
+    if needed is not None:
+        cuts = cuts[:needed]
+    pos = start_line
+    for c in cuts:
+        n = sum(char_lens[pos - start_line : c.end_line - start_line + 1])
+        if n > target_max or (n < target_min and not (final and c.end_line == end_line)):
+            return "length_out_of_range"
+        pos = c.end_line + 1
+    if (needed is not None and len(cuts) == needed) or (final and cuts[-1].end_line == end_line):
+        return None
+    if sum(char_lens[: cuts[-1].end_line - start_line + 1]) < min_coverage * sum(char_lens):
+        return "low_coverage"
+    return None
+
+
+def _tier() -> dict[str, Any]:
+    return {"chunks": 0, "answered": 0, "requests": 0, "latency_s": 0.0, "tokens": 0}
+
+
+class CascadeStats:
+    # run.json "cascade": per tier, chunks sent to it, chunks it answered (hit rate), requests,
+    # latency and tokens; the cheap tier's rejections by reason; and the token balance:
+    # strong_tokens_avoided = tokens of the chunks the cheap tier answered (the strong tier would
+    # have read the same prompt), cheap_tokens_wasted = cheap tokens spent on escalated chunks.
+    def __init__(self, cheap: Iterable[str]):
+        self._cheap = set(cheap)
+        self.tiers = {"cheap": _tier(), "strong": _tier()}
+        self.rejected: dict[str, int] = {}
+        self.strong_tokens_avoided = 0
+        self.cheap_tokens_wasted = 0
+        self._chunk_tokens = 0
+
+    def record_call(self, provider: str, result: ChatResult, *, elapsed_s: float) -> None:
+        tier = self.tiers["cheap" if provider in self._cheap else "strong"]
+        counts = token_counts(result)
+        tokens = counts.get("prompt_tokens", 0) + counts.get("completion_tokens", 0)
+        tier["requests"] += 1
+        tier["latency_s"] += elapsed_s
+        tier["tokens"] += tokens
+        if provider in self._cheap:
+            self._chunk_tokens += tokens
+
+    def reject(self, reason: str) -> None:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def cheap_done(self, *, accepted: bool) -> None:
+        self.tiers["cheap"]["chunks"] += 1
+        if accepted:
+            self.tiers["cheap"]["answered"] += 1
+            self.strong_tokens_avoided += self._chunk_tokens
+        else:
+            self.cheap_tokens_wasted += self._chunk_tokens
+        self._chunk_tokens = 0
+
+    def strong_done(self, *, answered: bool) -> None:
+        self.tiers["strong"]["chunks"] += 1
+        if answered:
+            self.tiers["strong"]["answered"] += 1
+
+    def to_json(self) -> dict[str, Any]:
+        out: dict[str, Any] = {}
+        for name, t in self.tiers.items():
+            out[name] = {
+                **t,
+                "latency_s": round(t["latency_s"], 3),
+                "hit_rate": round(t["answered"] / t["chunks"], 3) if t["chunks"] else None,
+                "avg_latency_s": round(t["latency_s"] / t["requests"], 3) if t["requests"] else None,
+            }
+        out["rejected"] = self.rejected
+        out["strong_tokens_avoided"] = self.strong_tokens_avoided
+        out["cheap_tokens_wasted"] = self.cheap_tokens_wasted
+        return out
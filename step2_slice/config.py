@@ -15,6 +15,13 @@ class ProviderConfig:
     model: str
     api_key: str | None = None
     api_key_env: str | None = None
+    # Shared quota, enforced by scheduler.ProviderPool for multi-book runs (None = unlimited).
+    max_concurrency: int | None = None
+    requests_per_minute: float | None = None
+    # Provider-side caching of the static prompt prefix (OpenAI prompt_cache_key, Ark context API).
+    prompt_cache: bool = False
+    # Append every request/reply with its timing to <record_dir>/*.jsonl (see replay.py).
+    record_dir: str | None = None
 
     def resolved_api_key(self) -> str:
         if self.api_key is not None:
@@ -38,6 +45,7 @@ class SliceConfig:
     retry_max: int = 5
     retry_backoff_s: float = 1.0
     timeout_s: float = 120.0
+    chunk_deadline_s: float | None = None  # max total time (retries and sleeps) per request
 
     target_chars_min: int = 5000
     target_chars_max: int = 6000
@@ -46,6 +54,27 @@ class SliceConfig:
     completion_max_tokens: int = 800
     temperature: float = 0.2
     response_format: str | None = None  # "json_object" (if supported)
+    stream: bool = False  # stream replies (SSE) and stop reading once the cuts array is complete
+    offline_fallback: bool = False  # cut a chunk offline (DP) when every provider fails on it
+
+    # Candidate mode: score boundaries locally and only ask the model to pick one of them,
+    # sending just the text around the target band instead of a whole chunk.
+    candidate_mode: bool = False
+    candidate_count: int = 6
+    candidate_context_lines: int = 3
+
+    # Two-phase mode: the serial pass asks only for cuts; titles/summaries are filled in
+    # afterwards by parallel, batched requests (summarize.py), optionally on cheaper providers.
+    two_phase: bool = False
+    summary_provider_order: list[str] | None = None  # default: provider_order
+    summary_concurrency: int = 4
+    summary_completion_max_tokens: int = 2000
+
+    # Model cascade: chunks go to these (cheaper) providers first; cuts that fail the local check
+    # (cascade.check_cuts) are escalated to provider_order.
+    cascade_provider_order: list[str] | None = None
+    cascade_retry_max: int = 1
+    cascade_min_coverage: float = 0.6  # share of the chunk's chars the cuts must cover
 
 
 def _load_json(path: str | Path) -> Any:
@@ -71,6 +100,22 @@ def load_provider_config(path: str | Path) -> dict[str, ProviderConfig]:
         model = str(entry.get("model") or "")
         if not typ or not base_url or not model:
             continue
+        max_concurrency = entry.get("max_concurrency")
+        if max_concurrency is not None:
+            max_concurrency = int(max_concurrency)
+            if max_concurrency <= 0:
+                raise ValueError(f"providers.{name}.max_concurrency must be positive")
+        requests_per_minute = entry.get("requests_per_minute")
+        if requests_per_minute is not None:
+            requests_per_minute = float(requests_per_minute)
+            if requests_per_minute <= 0:
+                raise ValueError(f"providers.{name}.requests_per_minute must be positive")
+        prompt_cache = entry.get("prompt_cache", False)
+        if not isinstance(prompt_cache, bool):
+            raise ValueError(f"providers.{name}.prompt_cache must be true or false")
+        record_dir = entry.get("record_dir")
+        if record_dir is not None and (not isinstance(record_dir, str) or not record_dir.strip()):
+            raise ValueError(f"providers.{name}.record_dir must be a directory path")
         out[name] = ProviderConfig(
             name=name,
             type=typ,
@@ -78,6 +123,10 @@ def load_provider_config(path: str | Path) -> dict[str, ProviderConfig]:
             model=model,
             api_key=entry.get("api_key"),
             api_key_env=entry.get("api_key_env"),
+            max_concurrency=max_concurrency,
+            requests_per_minute=requests_per_minute,
+            prompt_cache=prompt_cache,
+            record_dir=record_dir,
         )
 
     if not out:
@@ -101,6 +150,11 @@ def load_slice_config(path: str | Path) -> SliceConfig:
         raise ValueError("slice.retry_max must be positive")
     retry_backoff_s = float(data.get("retry_backoff_s", 1.0))
     timeout_s = float(data.get("timeout_s", 120.0))
+    chunk_deadline_s = data.get("chunk_deadline_s")
+    if chunk_deadline_s is not None:
+        chunk_deadline_s = float(chunk_deadline_s)
+        if chunk_deadline_s <= 0:
+            raise ValueError("slice.chunk_deadline_s must be positive or null")
 
     target_chars_min = int(data.get("target_chars_min", 5000))
     target_chars_max = int(data.get("target_chars_max", 6000))
@@ -117,16 +171,81 @@ def load_slice_config(path: str | Path) -> SliceConfig:
     response_format = data.get("response_format")
     if response_format is not None and response_format not in ("json_object",):
         raise ValueError('slice.response_format must be "json_object" or null')
+    stream = data.get("stream", False)
+    if not isinstance(stream, bool):
+        raise ValueError("slice.stream must be true or false")
+    offline_fallback = data.get("offline_fallback", False)
+    if not isinstance(offline_fallback, bool):
+        raise ValueError("slice.offline_fallback must be true or false")
+    candidate_mode = data.get("candidate_mode", False)
+    if not isinstance(candidate_mode, bool):
+        raise ValueError("slice.candidate_mode must be true or false")
+    candidate_count = int(data.get("candidate_count", 6))
+    if candidate_count <= 0:
+        raise ValueError("slice.candidate_count must be positive")
+    candidate_context_lines = int(data.get("candidate_context_lines", 3))
+    if candidate_context_lines < 0:
+        raise ValueError("slice.candidate_context_lines must be >= 0")
+
+    two_phase = data.get("two_phase", False)
+    if not isinstance(two_phase, bool):
+        raise ValueError("slice.two_phase must be true or false")
+    summary_provider_order = data.get("summary_provider_order")
+    if isinstance(summary_provider_order, str):
+        summary_provider_order = [summary_provider_order]
+    if summary_provider_order is not None and (
+        not isinstance(summary_provider_order, list)
+        or not summary_provider_order
+        or not all(isinstance(x, str) and x for x in summary_provider_order)
+    ):
+        raise ValueError("slice.summary_provider_order must be a non-empty string list or null")
+    summary_concurrency = int(data.get("summary_concurrency", 4))
+    if summary_concurrency <= 0:
+        raise ValueError("slice.summary_concurrency must be positive")
+    summary_completion_max_tokens = int(data.get("summary_completion_max_tokens", 2000))
+    if summary_completion_max_tokens <= 0:
+        raise ValueError("slice.summary_completion_max_tokens must be positive")
+
+    cascade_provider_order = data.get("cascade_provider_order")
+    if isinstance(cascade_provider_order, str):
+        cascade_provider_order = [cascade_provider_order]
+    if cascade_provider_order is not None and (
+        not isinstance(cascade_provider_order, list)
+        or not cascade_provider_order
+        or not all(isinstance(x, str) and x for x in cascade_provider_order)
+    ):
+        raise ValueError("slice.cascade_provider_order must be a non-empty string list or null")
+    if cascade_provider_order and set(cascade_provider_order) & set(provider_order):
+        raise ValueError("slice.cascade_provider_order and slice.provider_order must not share providers")
+    cascade_retry_max = int(data.get("cascade_retry_max", 1))
+    if cascade_retry_max <= 0:
+        raise ValueError("slice.cascade_retry_max must be positive")
+    cascade_min_coverage = float(data.get("cascade_min_coverage", 0.6))
+    if not 0 <= cascade_min_coverage <= 1:
+        raise ValueError("slice.cascade_min_coverage must be in [0, 1]")
 
     return SliceConfig(
         provider_order=list(provider_order),
         retry_max=retry_max,
         retry_backoff_s=retry_backoff_s,
         timeout_s=timeout_s,
+        chunk_deadline_s=chunk_deadline_s,
         target_chars_min=target_chars_min,
         target_chars_max=target_chars_max,
         chunk_input_tokens=chunk_input_tokens,
         completion_max_tokens=completion_max_tokens,
         temperature=temperature,
         response_format=response_format,
+        stream=stream,
+        offline_fallback=offline_fallback,
+        candidate_mode=candidate_mode,
+        candidate_count=candidate_count,
+        candidate_context_lines=candidate_context_lines,
+        two_phase=two_phase,
+        summary_provider_order=list(summary_provider_order) if summary_provider_order else None,
+        summary_concurrency=summary_concurrency,
+        summary_completion_max_tokens=summary_completion_max_tokens,
+        cascade_provider_order=list(cascade_provider_order) if cascade_provider_order else None,
+        cascade_retry_max=cascade_retry_max,
+        cascade_min_coverage=cascade_min_coverage,
     )
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import argparse
+import json
+import queue
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import metrics
+from step1_cleaning.chapters import write_chapters
+from step1_cleaning.fingerprint import write_signature
+from step1_cleaning.config import load_clean_config
+from step1_cleaning.pipeline import CleanStream
+
+from .config import ProviderConfig, SliceConfig, load_provider_config, load_slice_config
+from .pipeline import SliceRunError, slice_lines_to_json
+from .providers.base import ChatProvider
+from .slice import ProgressBar
+
+
+_DONE = object()
+_BATCH_LINES = 256
+
+
+class _BackgroundLines:
+    # Runs Step1 cleaning in a producer thread so HTML parsing/rule matching (CPU) overlaps with
+    # the LLM round trips (network) of the consumer. Every line is also written to txt_path,
+    # which is only renamed into place once the whole book has been cleaned.
+    def __init__(self, stream: CleanStream, txt_path: Path):
+        self.stream = stream
+        self.txt_path = txt_path
+        self._q: queue.Queue[Any] = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"clean:{txt_path.stem}", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        tmp = self.txt_path.with_name(self.txt_path.name + ".part")
+        try:
+            self.txt_path.parent.mkdir(parents=True, exist_ok=True)
+            batch: list[str] = []
+            with tmp.open("w", encoding="utf-8") as f:
+                for line in self.stream:
+                    f.write(line + "\n")
+                    batch.append(line)
+                    if len(batch) >= _BATCH_LINES:
+                        self._q.put(batch)
+                        batch = []
+            if batch:
+                self._q.put(batch)
+            tmp.replace(self.txt_path)
+            write_chapters(self.txt_path, self.stream.chapters)
+            write_signature(self.txt_path, self.stream.result().lines)
+            self._q.put(_DONE)
+        except BaseException as e:  # noqa: BLE001
+            self._q.put(e)
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            item = self._q.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield from item
+
+    def join(self) -> None:
+        # Slicing may stop early (--max-slices / error); the txt artifact is still completed.
+        self._thread.join()
+        while True:
+            try:
+                item = self._q.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(item, BaseException):
+                raise item
+
+
+class _ChapterStarts:
+    # Live view of the chapter starts found so far by the cleaning thread (a chapter is recorded
+    # before its first line is produced, so every line the slicer has seen is covered).
+    def __init__(self, stream: CleanStream):
+        self._stream = stream
+        self._seen = 0
+        self._starts: set[int] = set()
+
+    def __contains__(self, idx: object) -> bool:
+        chapters = self._stream.chapters
+        while self._seen < len(chapters):
+            self._starts.add(chapters[self._seen].start)
+            self._seen += 1
+        return idx in self._starts
+
+
+def slice_epub(
+    stream: CleanStream,
+    *,
+    txt_path: Path,
+    providers: dict[str, ProviderConfig],
+    slice_config: SliceConfig,
+    out_dir: str | Path | None = None,
+    max_slices: int | None = None,
+    dry_run: bool = False,
+    progress_cb: Callable[[int, int, int], None] | None = None,
+    clients: dict[str, ChatProvider] | None = None,
+) -> Path:
+    # Slices the lines of `stream` while it is still being cleaned; txt_path (and its chapters
+    # sidecar) is complete when this returns or raises. stream.result() is available afterwards.
+    lines = _BackgroundLines(stream, txt_path)
+    try:
+        return slice_lines_to_json(
+            lines,
+            source_txt=txt_path,
+            providers=providers,
+            slice_config=slice_config,
+            out_dir=out_dir,
+            max_slices=max_slices,
+            dry_run=dry_run,
+            progress_cb=progress_cb,
+            extra_meta={"source_epub": str(stream.epub_path)},
+            clients=clients,
+            chapter_starts=_ChapterStarts(stream),
+        )
+    finally:
+        lines.join()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="python -m step2_slice.from_epub",
+        description=(
+            "Clean EPUB(s) and slice them in one pass: cleaned lines stream straight into the slicer "
+            "(book/<stem>.txt is still written as a side artifact)."
+        ),
+    )
+    p.add_argument("epubs", nargs="*", help="Path(s) to .epub file")
+    p.add_argument(
+        "--txt-dir",
+        default="book",
+        help="Directory for the Step1 txt artifact (<stem>.txt). Default: book/",
+    )
+    p.add_argument(
+        "--extracted-out",
+        help="Optional output JSONL path to store extracted noise (single EPUB only)",
+    )
+    p.add_argument(
+        "--rules",
+        default=str(Path(__file__).resolve().parents[1] / "step1_cleaning" / "rule" / "rules.json"),
+        help="Path to Step1 rules.json.",
+    )
+    p.add_argument(
+        "--max-slices",
+        type=int,
+        default=0,
+        help="Max number of slices to generate per book (0 means no limit).",
+    )
+    p.add_argument(
+        "--out-dir",
+        help="Output directory (single EPUB only). Default: book/<stem>_slice/<timestamp>/",
+    )
+    p.add_argument(
+        "--llm-config",
+        default=str(Path(__file__).resolve().parent / "config" / "llm.json"),
+        help="Path to llm.json (providers/base_url/api_key/model).",
+    )
+    p.add_argument(
+        "--slice-config",
+        default=str(Path(__file__).resolve().parent / "config" / "slice.json"),
+        help="Path to slice.json (slice params, retry, chunk tokens).",
+    )
+    p.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Do not call LLM; use deterministic slicing (for offline sanity check).",
+    )
+    metrics.add_arguments(p)
+    return p
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if not args.epubs:
+        build_parser().error("at least one epub is required")
+    if args.max_slices < 0:
+        build_parser().error("--max-slices must be >= 0")
+    if len(args.epubs) > 1 and (args.out_dir or args.extracted_out):
+        build_parser().error("--out-dir/--extracted-out only apply to a single EPUB")
+
+    llm_path = Path(args.llm_config)
+    slice_path = Path(args.slice_config)
+    if not llm_path.exists():
+        build_parser().error(f"llm config not found: {llm_path} (copy from llm.example.json)")
+    if not slice_path.exists():
+        build_parser().error(f"slice config not found: {slice_path} (copy from slice.example.json)")
+
+    rules, headings = load_clean_config(args.rules)
+    providers = load_provider_config(llm_path)
+    slice_cfg = load_slice_config(slice_path)
+    max_slices = args.max_slices or None
+
+    exit_code = 0
+    exporters = metrics.start(args)
+    try:
+        for epub in args.epubs:
+            epub_path = Path(epub)
+            txt_path = Path(args.txt_dir) / (epub_path.stem + ".txt")
+            stream = CleanStream(epub_path, rules=rules, headings=headings)
+
+            progress = ProgressBar(max_slices=max_slices, total_lines=None)
+
+            def progress_cb(slices_written: int, cur_line: int, total: int) -> None:
+                progress.update(slices_written=slices_written, cur_line=cur_line, total_lines=total)
+
+            try:
+                out_path = slice_epub(
+                    stream,
+                    txt_path=txt_path,
+                    providers=providers,
+                    slice_config=slice_cfg,
+                    out_dir=args.out_dir,
+                    max_slices=max_slices,
+                    dry_run=bool(args.dry_run),
+                    progress_cb=progress_cb,
+                )
+            except SliceRunError as e:
+                out_path = e.out_path
+                exit_code = 2
+            finally:
+                progress.finish()
+
+            if args.extracted_out:
+                with Path(args.extracted_out).open("w", encoding="utf-8") as f:
+                    for m in stream.result().extracted:
+                        f.write(
+                            json.dumps({"bucket": m.bucket, "rule": m.rule_name, "text": m.text}, ensure_ascii=False)
+                            + "\n"
+                        )
+            print(out_path)
+            sys.stdout.flush()
+    finally:
+        exporters.close()
+    return exit_code
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
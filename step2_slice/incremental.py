@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from .config import SliceConfig
+
+# Incremental re-slicing of a book that grew (a serialized novel gaining chapters).
+#
+# Every run records in run.json a rolling hash of the input at the end of each slice:
+#   "prefix_hashes": [[end_line, sha256(lines 1..end_line)[:16]], ...], "input_lines": n
+# A later run over the new txt recomputes the rolling hash and keeps the longest run of
+# previous slices whose checkpoints still match. The slice that ended at the old end of the
+# book is not reused: it only ended there because the text did.
+
+
+class PrefixHasher:
+    def __init__(self) -> None:
+        self._h = hashlib.sha256()
+        self.checkpoints: list[list[Any]] = []
+
+    def add(self, lines: list[str], *, end_line: int) -> str:
+        for line in lines:
+            self._h.update(line.encode("utf-8"))
+            self._h.update(b"\n")
+        digest = self._h.copy().hexdigest()[:16]
+        self.checkpoints.append([end_line, digest])
+        return digest
+
+
+def find_previous_run(runs_dir: Path, *, exclude: Path | None = None) -> Path | None:
+    # Newest run directory (timestamped names sort chronologically) that recorded prefix hashes.
+    if not runs_dir.is_dir():
+        return None
+    for d in sorted((p for p in runs_dir.iterdir() if p.is_dir()), reverse=True):
+        if exclude is not None and d.resolve() == exclude.resolve():
+            continue
+        try:
+            meta = json.loads((d / "run.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if meta.get("prefix_hashes"):
+            return d
+    return None
+
+
+def reusable_slices(
+    run_dir: Path,
+    *,
+    has_line: Callable[[int], bool],
+    get_lines: Callable[[int, int], list[str]],
+    slice_config: SliceConfig,
+    dry_run: bool,
+) -> tuple[list[dict[str, Any]], str | None]:
+    # Slices of a previous run (slices.json items) that can be copied as-is to the start of the
+    # new run, or ([], reason) when none can. has_line(i) / get_lines(a, b) read the new input
+    # (0-based index, half-open range).
+    try:
+        meta = json.loads((run_dir / "run.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        return [], f"unreadable run.json: {e}"
+    checkpoints = meta.get("prefix_hashes") or []
+    if not checkpoints:
+        return [], "previous run has no prefix_hashes"
+    if bool(meta.get("dry_run")) != dry_run:
+        return [], "previous run used a different mode (--dry-run)"
+    prev_cfg = meta.get("slice_config") or {}
+    if (prev_cfg.get("target_chars_min"), prev_cfg.get("target_chars_max")) != (
+        slice_config.target_chars_min,
+        slice_config.target_chars_max,
+    ):
+        return [], "target_chars_min/max changed"
+
+    old_lines = meta.get("input_lines")
+    hasher = PrefixHasher()
+    pos = 0
+    stable = 0  # number of leading checkpoints that still match
+    for end_line, digest in checkpoints:
+        if end_line == old_lines or not has_line(end_line - 1):
+            break
+        if hasher.add(get_lines(pos, end_line), end_line=end_line) != digest:
+            break
+        pos = end_line
+        stable += 1
+    if not stable:
+        return [], "no common prefix"
+
+    last_end = checkpoints[stable - 1][0]
+    try:
+        items = json.loads((run_dir / "slices.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        return [], f"unreadable slices.json: {e}"
+    out: list[dict[str, Any]] = []
+    expected_start = 1
+    for item in items:
+        if item.get("error") or item.get("start_line") != expected_start or item["end_line"] > last_end:
+            break
+        out.append(item)
+        expected_start = item["end_line"] + 1
+    if not out or out[-1]["end_line"] != last_end:
+        return [], "slices.json does not match run.json"
+    return out, None
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import json
+import shutil
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable
+
+from catalog import Catalog, SimilarBook
+from step1_cleaning.fingerprint import band_keys, book_signature, load_signature, similarity
+
+from .config import ProviderConfig, SliceConfig
+from .pipeline import _timestamp_dirname
+from .scheduler import BookJob, BookOutcome, run_batch
+
+# Near-duplicate books in a batch (the same novel from several sources, with different noise).
+#
+# Before a book is sliced its whole-book signature (Step1 sidecar, see
+# step1_cleaning/fingerprint.py) is looked up in the catalog's band index. When an already
+# sliced book is similar enough the job is skipped, or the slices of that book's latest run are
+# copied to the job's output directory. Books of the same batch are checked against each other
+# too: the later copy waits for the first one and is only sliced if that one fails.
+
+POLICIES = ("skip", "reuse")
+_BAND_ROWS = 4
+
+
+def txt_signature(txt: Path) -> list[int]:
+    sig = load_signature(txt)
+    if sig is not None:
+        return sig
+    with txt.open("r", encoding="utf-8") as f:
+        sig, _ = book_signature(s for s in (line.strip() for line in f) if s)
+    return sig
+
+
+def _usable_run(match: SimilarBook) -> bool:
+    # Only complete, successful runs: a --max-slices run covers the start of the book, a failed
+    # one ends with an error item.
+    if not match.run_dir:
+        return False
+    try:
+        meta = json.loads((Path(match.run_dir) / "run.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    if meta.get("status", "ok") != "ok" or meta.get("max_slices"):
+        return False
+    return (Path(match.run_dir) / "slices.json").exists()
+
+
+def find_sliced_duplicate(catalog: Catalog, txt: Path, sig: list[int], *, threshold: float) -> SimilarBook | None:
+    for match in catalog.similar_books(sig, threshold=threshold, exclude=txt.stem):
+        if _usable_run(match):
+            return match
+    return None
+
+
+def reuse_run(job: BookJob, match: SimilarBook) -> Path:
+    # The copied slices keep the line numbers and source_txt of the book they were cut from;
+    # run.json records where they came from.
+    src = Path(str(match.run_dir))
+    out_base = job.out_dir or (Path("book") / f"{job.txt.stem}_slice" / _timestamp_dirname())
+    out_base.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(src / "slices.json", out_base / "slices.json")
+    meta = json.loads((src / "run.json").read_text(encoding="utf-8"))
+    meta["reused_from"] = {
+        "book": match.stem,
+        "run_dir": str(src),
+        "similarity": round(match.similarity, 3),
+        "txt": str(job.txt),
+    }
+    meta["created_at"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    (out_base / "run.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    return out_base / "slices.json"
+
+
+def _merge_stats(a: dict[str, Any], b: dict[str, Any]) -> dict[str, Any]:
+    out = dict(a)
+    for name, s in b.items():
+        if name not in out:
+            out[name] = s
+            continue
+        n = out[name]["requests"] + s["requests"]
+        wait = out[name]["avg_wait_s"] * out[name]["requests"] + s["avg_wait_s"] * s["requests"]
+        out[name] = {"requests": n, "avg_wait_s": round(wait / n, 3) if n else 0.0}
+    return out
+
+
+def run_batch_deduplicated(
+    jobs: list[BookJob],
+    *,
+    catalog_path: str | Path,
+    policy: str,
+    threshold: float,
+    providers: dict[str, ProviderConfig],
+    slice_config: SliceConfig,
+    max_books: int = 4,
+    dry_run: bool = False,
+    on_done: Callable[[BookOutcome], None] | None = None,
+) -> tuple[list[BookOutcome], dict[str, Any]]:
+    # run_batch with the catalog check in front. Every catalog access stays on this thread (one
+    # SQLite connection); books sliced successfully are added to the catalog after each pass.
+    if policy not in POLICIES:
+        raise ValueError(f"unknown near-duplicate policy: {policy}")
+    outcomes: list[BookOutcome] = []
+
+    def settle(job: BookJob, match: SimilarBook) -> None:
+        started = time.monotonic()
+        detail = f"near-duplicate of {match.stem} ({match.similarity:.2f})"
+        if policy == "reuse":
+            outcome = BookOutcome(job=job, status="reused", out_path=reuse_run(job, match), error=detail)
+        else:
+            outcome = BookOutcome(job=job, status="skipped", error=detail)
+        outcome.elapsed_s = round(time.monotonic() - started, 3)
+        outcomes.append(outcome)
+        if on_done:
+            on_done(outcome)
+
+    def register(results: list[BookOutcome]) -> None:
+        for o in results:
+            if o.status == "ok" and o.out_path is not None and not dry_run:
+                catalog.ingest_txt(o.job.txt)
+                catalog.ingest_slice_run(o.out_path.parent)
+
+    with Catalog(catalog_path) as catalog:
+        ordered = sorted(jobs, key=lambda j: -j.priority)  # stable: manifest order within a priority
+        sigs: dict[int, list[int]] = {}
+        first: list[BookJob] = []
+        deferred: list[BookJob] = []
+        bands: dict[tuple[int, ...], list[BookJob]] = defaultdict(list)
+        for job in ordered:
+            try:
+                sig = sigs[id(job)] = txt_signature(job.txt)
+            except (OSError, ValueError) as e:
+                # Reported like run_batch reports a book it cannot read; the others go on.
+                outcome = BookOutcome(job=job, status="error", error=f"{type(e).__name__}: {e}")
+                outcomes.append(outcome)
+                if on_done:
+                    on_done(outcome)
+                continue
+            match = find_sliced_duplicate(catalog, job.txt, sig, threshold=threshold)
+            if match is not None:
+                settle(job, match)
+                continue
+            keys = band_keys(sig, _BAND_ROWS)
+            candidates = {id(j): j for key in keys for j in bands[key]}
+            if any(similarity(sig, sigs[i]) >= threshold for i in candidates):
+                deferred.append(job)
+                continue
+            first.append(job)
+            for key in keys:
+                bands[key].append(job)
+
+        results, stats = run_batch(
+            first,
+            providers=providers,
+            slice_config=slice_config,
+            max_books=max_books,
+            dry_run=dry_run,
+            on_done=on_done,
+        ) if first else ([], {})
+        outcomes.extend(results)
+        register(results)
+
+        # Copies whose first copy failed (or was a dry run) are sliced after all.
+        rest: list[BookJob] = []
+        for job in deferred:
+            match = find_sliced_duplicate(catalog, job.txt, sigs[id(job)], threshold=threshold)
+            if match is not None:
+                settle(job, match)
+            else:
+                rest.append(job)
+        if rest:
+            results, more = run_batch(
+                rest,
+                providers=providers,
+                slice_config=slice_config,
+                max_books=max_books,
+                dry_run=dry_run,
+                on_done=on_done,
+            )
+            outcomes.extend(results)
+            register(results)
+            stats = _merge_stats(stats, more)
+    return outcomes, stats
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from itertools import accumulate
+from typing import Sequence
+
+
+def plan_cuts(lengths: Sequence[int], *, target_min: int, target_max: int, final: bool = True) -> list[int]:
+    # Optimal segmentation of lines with the given char counts: returns the 0-based inclusive end
+    # index of every slice (the last one is always len(lengths) - 1) such that the summed
+    # (range penalty, mid deviation) over all slices is minimal. final=False: the lines continue
+    # past the end, so the text after the last slice is left over at no cost; the plan ends at
+    # the farthest line reachable with the smallest range penalty.
+    #
+    # Costs are compared like the LLM cut application scores a cut: distance to the target range
+    # first, then distance to its middle.
+    # best[j] is the cost of cutting lines[:j]. Only slices between target_min / 2 and
+    # 1.5 * target_max chars are considered (except for the final slice, or when nothing in that
+    # band fits), so for each j just the window of start positions i with prefix[j] - prefix[i]
+    # in the band is scanned; both window edges only move forward as j grows (two pointers),
+    # which keeps the whole pass near-linear.
+    n = len(lengths)
+    if n == 0:
+        return []
+    if target_min <= 0 or target_max < target_min:
+        raise ValueError("target_min/max invalid")
+    target_mid = (target_min + target_max) // 2
+    max_len = target_max * 3 // 2
+    min_len = target_min // 2
+    prefix = list(accumulate(lengths, initial=0))
+
+    inf = (10**18, 10**18)
+    best: list[tuple[int, int]] = [(0, 0)] + [inf] * n
+    back = [0] * (n + 1)
+    lo = 0  # smallest start with length <= max_len (a single line is always allowed)
+    hi = 0  # one past the largest start with length >= min_len
+    for j in range(1, n + 1):
+        pj = prefix[j]
+        while lo < j - 1 and pj - prefix[lo] > max_len:
+            lo += 1
+        while hi < j and pj - prefix[hi] >= min_len:
+            hi += 1
+        starts = range(lo, hi) if lo < hi and (j < n or not final) else range(lo, j)
+        for _ in range(2):
+            cand = inf
+            arg = j - 1
+            for i in starts:
+                bi = best[i]
+                if bi[0] > cand[0]:
+                    continue  # penalties only add up
+                length = pj - prefix[i]
+                if length < target_min:
+                    penalty = target_min - length
+                elif length > target_max:
+                    penalty = length - target_max
+                else:
+                    penalty = 0
+                dev = length - target_mid
+                c = (bi[0] + penalty, bi[1] + (dev if dev >= 0 else -dev))
+                if c < cand:
+                    cand = c
+                    arg = i
+            if cand != inf:
+                break
+            starts = range(lo, j)
+        best[j] = cand
+        back[j] = arg
+
+    ends: list[int] = []
+    j = n if final else min(range(1, n + 1), key=lambda k: (best[k][0], -k))
+    while j > 0:
+        ends.append(j - 1)
+        j = back[j]
+    ends.reverse()
+    return ends
+
+
+def plan_chunk_cuts(
+    lengths: Sequence[int],
+    *,
+    start_line: int,
+    target_min: int,
+    target_max: int,
+    final: bool,
+) -> list[int]:
+    # Cut points (1-based end_line, like the model's "cuts") for one chunk. Unless the chunk ends
+    # the book, the text after the last cut is left for the next chunk, mirroring the prompt's
+    # "only return complete slices" rule, and does not bend the cuts before it.
+    ends = plan_cuts(lengths, target_min=target_min, target_max=target_max, final=final)
+    return [start_line + e for e in ends]
@@ -3,17 +3,38 @@ from __future__ import annotations
 import json
 import sys
 import time
-from collections.abc import Callable
-from dataclasses import asdict, dataclass
+from collections.abc import Callable, Container, Iterable, Iterator
+from dataclasses import asdict, dataclass, replace
 from pathlib import Path
 from typing import Any
 
+from metrics import REGISTRY
+from step1_cleaning.chapters import load_chapters
+
+from .boundaries import Candidate, rank_candidates
+from .cascade import CascadeStats, check_cuts
 from .config import ProviderConfig, SliceConfig
-from .providers.base import ChatProvider
-from .providers.openai_compatible import OpenAICompatibleProvider
-from .providers.volc_ark import VolcArkProvider
-from .segmenter import Cut, build_messages, parse_cuts, validate_cuts
+from .incremental import PrefixHasher, reusable_slices
+from .offline import plan_chunk_cuts, plan_cuts
+from .providers import build_provider
+from .providers.base import ChatProvider, StreamStop, add_usage
+from .retry import request_with_retries
+from .segmenter import (
+    Cut,
+    CutStreamParser,
+    build_choice_messages,
+    build_messages,
+    parse_choice,
+    parse_cuts,
+    validate_cuts,
+)
 from .slicing import count_chars, estimate_tokens
+from .summarize import summarize_run
+
+
+_BOOKS = REGISTRY.counter("step2_books_total", "Books sliced, by outcome", ["status"])
+_SLICES = REGISTRY.counter("step2_slices_total", "Slices written (status=error: error items)", ["status"])
+_LINES = REGISTRY.counter("step2_lines_total", "Input lines covered by written slices")
 
 
 @dataclass(frozen=True)
@@ -34,32 +55,57 @@ class SliceRunError(RuntimeError):
         self.out_path = out_path
 
 
-def _timestamp_dirname() -> str:
-    return time.strftime("%Y%m%d_%H%M%S", time.localtime())
+class _LineBuffer:
+    # List-like view over a (possibly still growing) line iterator. has(i) pulls lines on demand,
+    # so slicing can start as soon as the first chunk worth of lines exists.
+    def __init__(self, lines: Iterable[str]):
+        if isinstance(lines, list):
+            self._items = lines
+            self._it: Iterator[str] | None = None
+        else:
+            self._items = []
+            self._it = iter(lines)
+
+    @property
+    def exhausted(self) -> bool:
+        return self._it is None
+
+    def has(self, idx: int) -> bool:
+        while idx >= len(self._items) and self._it is not None:
+            try:
+                line = next(self._it)
+            except StopIteration:
+                self._it = None
+                break
+            line = line.strip()
+            if line:
+                self._items.append(line)
+        return idx < len(self._items)
 
+    def load_all(self) -> None:
+        while self._it is not None:
+            self.has(len(self._items))
 
-def _build_provider(cfg: ProviderConfig) -> ChatProvider:
-    api_key = cfg.resolved_api_key()
-    if cfg.type == "volc_ark":
-        return VolcArkProvider(base_url=cfg.base_url, api_key=api_key)
-    if cfg.type == "openai_compatible":
-        return OpenAICompatibleProvider(base_url=cfg.base_url, api_key=api_key)
-    raise ValueError(f"Unknown provider type: {cfg.type}")
+    def __len__(self) -> int:
+        return len(self._items)
 
+    def __getitem__(self, key: Any) -> Any:
+        return self._items[key]
 
-def _sleep_backoff(attempt: int, *, base: float) -> None:
-    time.sleep(base * (2**attempt))
+
+def _timestamp_dirname() -> str:
+    return time.strftime("%Y%m%d_%H%M%S", time.localtime())
 
 
 def _choose_chunk_end(
-    sentences: list[str],
+    sentences: _LineBuffer,
     *,
     start_idx: int,
     chunk_input_tokens: int,
 ) -> int:
     tokens = 0
     end_idx = start_idx
-    while end_idx < len(sentences):
+    while sentences.has(end_idx):
         s = sentences[end_idx]
         add = estimate_tokens(s) + 1  # newline-ish overhead
         if end_idx > start_idx and tokens + add > chunk_input_tokens:
@@ -69,30 +115,65 @@ def _choose_chunk_end(
     return max(end_idx, start_idx + 1)
 
 
-def _heuristic_cut_end(
-    sentences: list[str],
+def _candidate_window(sentences: _LineBuffer, *, start_idx: int, target_max: int) -> list[str]:
+    # Lines from start_idx until target_max chars are passed, plus the line after that one.
+    out: list[str] = []
+    total = 0
+    idx = start_idx
+    while sentences.has(idx):
+        out.append(sentences[idx])
+        total += count_chars(sentences[idx])
+        idx += 1
+        if total > target_max:
+            if sentences.has(idx):
+                out.append(sentences[idx])
+            break
+    return out
+
+
+def _cuts_settled(
+    cuts: list[Cut],
+    sentences: _LineBuffer,
     *,
     start_idx: int,
+    slices: int,
     target_min: int,
     target_max: int,
-) -> int:
-    total = 0
-    end_idx = start_idx
-    best: int | None = None
-    best_over = 10**18
-    while end_idx < len(sentences):
-        total += count_chars(sentences[end_idx])
-        if total >= target_min:
-            over = abs(total - ((target_min + target_max) // 2))
-            if total <= target_max and over < best_over:
-                best = end_idx
-                best_over = over
-            if total > target_max:
+) -> bool:
+    # True when the cut application loop would already pick the same `slices` cuts whatever
+    # the model still sends. A slice's length only grows with end_line, so once a cut overshoots
+    # target_max no later cut can score better (end_lines arrive in increasing order, as the
+    # prompt requires).
+    target_mid = (target_min + target_max) // 2
+    pos = start_idx
+    for _ in range(slices):
+        length = 0
+        idx = pos
+        best: tuple[int, int, int] | None = None
+        overshot = False
+        for cut in cuts:
+            end_idx = cut.end_line - 1
+            if end_idx < pos:
+                continue
+            while idx <= end_idx:
+                length += count_chars(sentences[idx])
+                idx += 1
+            if length < target_min:
+                penalty = target_min - length
+            elif length > target_max:
+                penalty = length - target_max
+            else:
+                penalty = 0
+            score = (penalty, abs(length - target_mid), end_idx)
+            if best is None or score < best:
+                best = score
+            if length > target_max:
+                overshot = True
                 break
-        end_idx += 1
-    if best is not None:
-        return best
-    return min(end_idx, len(sentences) - 1)
+        if not overshot or best is None:
+            return False
+        pos = best[2] + 1
+    return True
 
 
 def slice_txt_to_json(
@@ -104,11 +185,54 @@ def slice_txt_to_json(
     max_slices: int | None = None,
     dry_run: bool = False,
     progress_cb: Callable[[int, int, int], None] | None = None,
+    clients: dict[str, ChatProvider] | None = None,
+    reuse_from: str | Path | None = None,
 ) -> Path:
     txt_path = Path(txt_path)
     sentences = [line.strip() for line in txt_path.read_text(encoding="utf-8").splitlines() if line.strip()]
     if not sentences:
         raise ValueError(f"Empty input: {txt_path}")
+    return slice_lines_to_json(
+        sentences,
+        source_txt=txt_path,
+        providers=providers,
+        slice_config=slice_config,
+        out_dir=out_dir,
+        max_slices=max_slices,
+        dry_run=dry_run,
+        progress_cb=progress_cb,
+        clients=clients,
+        chapter_starts={c.start for c in load_chapters(txt_path)},
+        reuse_from=reuse_from,
+    )
+
+
+def slice_lines_to_json(
+    lines: Iterable[str],
+    *,
+    source_txt: str | Path,
+    providers: dict[str, ProviderConfig],
+    slice_config: SliceConfig,
+    out_dir: str | Path | None = None,
+    max_slices: int | None = None,
+    dry_run: bool = False,
+    progress_cb: Callable[[int, int, int], None] | None = None,
+    extra_meta: dict[str, Any] | None = None,
+    clients: dict[str, ChatProvider] | None = None,
+    chapter_starts: Container[int] | None = None,
+    reuse_from: str | Path | None = None,
+) -> Path:
+    # lines may be a lazy iterator (e.g. Step1 output still being produced); progress_cb then
+    # receives the number of lines seen so far as its total.
+    # clients: pre-built provider clients by name (e.g. shared, rate-limited ones from
+    # scheduler.ProviderPool); providers missing from it are built from their config.
+    # chapter_starts: 0-based indices of lines that open a chapter (Step1 chapters sidecar).
+    # reuse_from: a previous run directory of the same book; its slices over the unchanged
+    # beginning of the text are copied instead of sliced again (see incremental.py).
+    txt_path = Path(source_txt)
+    sentences = _LineBuffer(lines)
+    if not sentences.has(0):
+        raise ValueError(f"Empty input: {txt_path}")
     if max_slices is not None and max_slices <= 0:
         raise ValueError("max_slices must be positive or None")
 
@@ -121,6 +245,7 @@ def slice_txt_to_json(
     run_meta: dict[str, Any] = {
         "source_txt": str(txt_path),
         "source_text": str(txt_path),
+        **(extra_meta or {}),
         "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
         "slice_config": asdict(slice_config),
         "provider_order": slice_config.provider_order,
@@ -138,21 +263,23 @@ def slice_txt_to_json(
 
     write_run_json()
 
-    if dry_run:
-        provider_clients: dict[str, tuple[ChatProvider, ProviderConfig]] = {}
-    else:
+    def clients_for(names: list[str]) -> dict[str, tuple[ChatProvider, ProviderConfig]]:
         ordered_cfgs: list[tuple[str, ProviderConfig]] = []
-        for name in slice_config.provider_order:
+        for name in names:
             cfg = providers.get(name)
             if cfg is None:
                 raise ValueError(f"provider not found in llm config: {name}")
             ordered_cfgs.append((name, cfg))
-        provider_clients = {name: (_build_provider(cfg), cfg) for name, cfg in ordered_cfgs}
+        return {name: ((clients or {}).get(name) or build_provider(cfg), cfg) for name, cfg in ordered_cfgs}
 
-    def iter_provider_order() -> list[str]:
-        if not provider_clients:
-            raise ValueError("No providers available (check slice.provider_order and llm config)")
-        return list(provider_clients.keys())
+    provider_clients = {} if dry_run else clients_for(slice_config.provider_order)
+    # The cascade applies to cut requests (candidate mode already sends little text per request).
+    cascade_clients: dict[str, tuple[ChatProvider, ProviderConfig]] = {}
+    cascade: CascadeStats | None = None
+    if not dry_run and slice_config.cascade_provider_order and not slice_config.candidate_mode:
+        cascade_clients = clients_for(slice_config.cascade_provider_order)
+        cascade = CascadeStats(cascade_clients)
+        cascade_config = replace(slice_config, retry_max=slice_config.cascade_retry_max)
 
     slice_id = 1
     cur = 0
@@ -161,11 +288,18 @@ def slice_txt_to_json(
     providers_used: set[str] = set()
     models_used: set[str] = set()
     slices_written = 0
+    stream_stats = {"stopped_early": 0}
+    offline_chunks = 0
+    candidate_stats = {"llm_calls": 0, "local": 0}
+    error_counts: dict[str, int] = {}
+    json_repairs: dict[str, int] = {}  # replies that were only usable after repair, by kind
+    usage_totals: dict[str, Any] = {}
+    prefix = PrefixHasher()
     with out_json.open("w", encoding="utf-8") as f:
         f.write("[\n")
         first_item = True
 
-        def write_item(item: SliceItem) -> None:
+        def write_item(item: SliceItem, *, reused: bool = False) -> None:
             nonlocal first_item
             payload = {k: v for k, v in asdict(item).items() if v is not None}
             rendered = json.dumps(payload, ensure_ascii=False, indent=2)
@@ -175,18 +309,62 @@ def slice_txt_to_json(
             else:
                 f.write(",\n")
             f.write(rendered)
+            if not item.error:
+                prefix.add(sentences[item.start_line - 1 : item.end_line], end_line=item.end_line)
+            _SLICES.inc(status="error" if item.error else ("reused" if reused else "ok"))
+            _LINES.inc(item.end_line - item.start_line + 1)
+
+        if reuse_from is not None:
+            reused, reason = reusable_slices(
+                Path(reuse_from),
+                has_line=sentences.has,
+                get_lines=lambda a, b: sentences[a:b],
+                slice_config=slice_config,
+                dry_run=dry_run,
+            )
+            if max_slices is not None:
+                reused = reused[:max_slices]
+            for data in reused:
+                write_item(
+                    SliceItem(
+                        slice_id=slice_id,
+                        start_line=data["start_line"],
+                        end_line=data["end_line"],
+                        char_len=data.get("char_len"),
+                        text=data.get("text"),
+                        title=data.get("title"),
+                        summary=data.get("summary"),
+                    ),
+                    reused=True,
+                )
+                slice_id += 1
+                slices_written += 1
+                cur = data["end_line"]
+            run_meta["incremental"] = {
+                "from": str(reuse_from),
+                "reused_slices": len(reused),
+                "reused_lines": cur,
+                **({"reason": reason} if reason else {}),
+            }
+            if progress_cb and reused:
+                progress_cb(slices_written, cur, len(sentences))
 
         stop = False
-        while cur < len(sentences) and not stop:
+        dry_plan: Iterator[int] | None = None
+        while sentences.has(cur) and not stop:
             if max_slices is not None and slice_id > max_slices:
                 break
             if dry_run:
-                end_idx = _heuristic_cut_end(
-                    sentences,
-                    start_idx=cur,
-                    target_min=slice_config.target_chars_min,
-                    target_max=slice_config.target_chars_max,
-                )
+                if dry_plan is None:
+                    # Offline segmentation plans the whole book at once, so it needs every line.
+                    sentences.load_all()
+                    planned = plan_cuts(
+                        [count_chars(t) for t in sentences[cur:]],
+                        target_min=slice_config.target_chars_min,
+                        target_max=slice_config.target_chars_max,
+                    )
+                    dry_plan = iter([cur + e for e in planned])
+                end_idx = next(dry_plan)
                 text = "\n".join(sentences[cur : end_idx + 1])
                 item = SliceItem(
                     slice_id=slice_id,
@@ -203,6 +381,117 @@ def slice_txt_to_json(
                     progress_cb(slices_written, cur, len(sentences))
                 continue
 
+            if slice_config.candidate_mode:
+                window = _candidate_window(sentences, start_idx=cur, target_max=slice_config.target_chars_max)
+                window_end = cur + len(window)
+                candidates = rank_candidates(
+                    window,
+                    target_min=slice_config.target_chars_min,
+                    target_max=slice_config.target_chars_max,
+                    count=slice_config.candidate_count,
+                    offset=cur,
+                    chapter_starts=chapter_starts or (),
+                )
+                chosen: int | None = None
+                last_error = None
+                last_provider = last_model = None
+                if not sentences.has(window_end) and count_chars("\n".join(window)) <= slice_config.target_chars_max:
+                    chosen = window_end - 1  # the rest of the book fits in one slice
+                    candidate_stats["local"] += 1
+                elif len(candidates) == 1:
+                    chosen = candidates[0].end_idx
+                    candidate_stats["local"] += 1
+                else:
+                    ctx = slice_config.candidate_context_lines
+                    first_end = candidates[0].end_idx
+                    last_end = candidates[-1].end_idx
+                    messages = build_choice_messages(
+                        head=[(i + 1, sentences[i]) for i in range(cur, min(cur + ctx, first_end + 1))],
+                        band=[
+                            (i + 1, sentences[i])
+                            for i in range(max(cur, first_end - ctx), min(window_end, last_end + ctx + 1))
+                        ],
+                        candidates=[c.end_idx + 1 for c in candidates],
+                        target_chars_min=slice_config.target_chars_min,
+                        target_chars_max=slice_config.target_chars_max,
+                    )
+                    response_format = {"type": slice_config.response_format} if slice_config.response_format else None
+                    candidate_stats["llm_calls"] += 1
+
+                    def call_choice(
+                        client: ChatProvider, pcfg: ProviderConfig, msgs: list[dict[str, str]]
+                    ) -> Candidate:
+                        t0 = time.monotonic()
+                        result = client.chat_completions(
+                            model=pcfg.model,
+                            messages=msgs,
+                            max_tokens=slice_config.completion_max_tokens,
+                            temperature=slice_config.temperature,
+                            response_format=response_format,
+                            timeout_s=slice_config.timeout_s,
+                        )
+                        add_usage(usage_totals, result, elapsed_s=time.monotonic() - t0)
+                        return candidates[parse_choice(result.content, len(candidates), repairs=json_repairs) - 1]
+
+                    outcome = request_with_retries(
+                        provider_clients,
+                        messages,
+                        call_choice,
+                        slice_config=slice_config,
+                        error_counts=error_counts,
+                    )
+                    last_error = outcome.error
+                    last_provider = outcome.error_provider
+                    last_model = outcome.error_model
+                    if outcome.value is not None:
+                        chosen = outcome.value.end_idx
+                        providers_used.add(outcome.provider)
+                        models_used.add(outcome.model)
+                    if chosen is None and slice_config.offline_fallback:
+                        # Every provider failed: take the best locally scored boundary.
+                        chosen = min(candidates, key=lambda c: (-c.score, c.end_idx)).end_idx
+                        offline_chunks += 1
+                        last_error = None
+
+                if chosen is None:
+                    item = SliceItem(
+                        slice_id=slice_id,
+                        start_line=cur + 1,
+                        end_line=window_end,
+                        char_len=None,
+                        text=None,
+                        error=str(last_error) if last_error is not None else "LLM returned no valid choice",
+                    )
+                    write_item(item)
+                    slices_written += 1
+                    run_error = item.error
+                    run_error_ctx = {
+                        "provider": last_provider,
+                        "model": last_model,
+                        "start_line": item.start_line,
+                        "end_line": item.end_line,
+                    }
+                    if progress_cb:
+                        progress_cb(slices_written, cur, len(sentences))
+                    stop = True
+                    continue
+
+                text = "\n".join(sentences[cur : chosen + 1])
+                item = SliceItem(
+                    slice_id=slice_id,
+                    start_line=cur + 1,
+                    end_line=chosen + 1,
+                    char_len=count_chars(text),
+                    text=text,
+                )
+                write_item(item)
+                slice_id += 1
+                slices_written += 1
+                cur = chosen + 1
+                if progress_cb:
+                    progress_cb(slices_written, cur, len(sentences))
+                continue
+
             chunk_end = _choose_chunk_end(sentences, start_idx=cur, chunk_input_tokens=slice_config.chunk_input_tokens)
             lines = [(i + 1, sentences[i]) for i in range(cur, chunk_end)]
             messages = build_messages(
@@ -210,47 +499,124 @@ def slice_txt_to_json(
                 lines=lines,
                 target_chars_min=slice_config.target_chars_min,
                 target_chars_max=slice_config.target_chars_max,
+                cuts_only=slice_config.two_phase,
             )
             response_format = {"type": slice_config.response_format} if slice_config.response_format else None
 
-            cuts: list[Cut] = []
-            last_error: Exception | None = None
-            last_provider: str | None = None
-            last_model: str | None = None
-            used_provider: str | None = None
-            used_model: str | None = None
-
-            for provider_name in iter_provider_order():
-                client, pcfg = provider_clients[provider_name]
-                for attempt in range(slice_config.retry_max):
-                    try:
-                        result = client.chat_completions(
-                            model=pcfg.model,
-                            messages=messages,
-                            max_tokens=slice_config.completion_max_tokens,
-                            temperature=slice_config.temperature,
-                            response_format=response_format,
-                            timeout_s=slice_config.timeout_s,
-                        )
-                        parsed = parse_cuts(result.content)
-                        cuts = validate_cuts(cuts=parsed, min_line=cur + 1, max_line=chunk_end)
-                        used_provider = provider_name
-                        used_model = pcfg.model
-                        last_error = None
-                        break
-                    except Exception as e:  # noqa: BLE001
-                        last_provider = provider_name
-                        last_model = pcfg.model
-                        last_error = e
-                        if attempt < slice_config.retry_max - 1:
-                            _sleep_backoff(attempt, base=slice_config.retry_backoff_s)
-                if cuts:
-                    break
+            remaining = max_slices - slice_id + 1 if max_slices is not None else None
+            chunk_chars = [count_chars(t) for t in sentences[cur:chunk_end]] if cascade is not None else []
+
+            def call_cuts(client: ChatProvider, pcfg: ProviderConfig, msgs: list[dict[str, str]]) -> list[Cut]:
+                parser = CutStreamParser() if slice_config.stream else None
+                on_delta = None
+                if parser is not None:
+
+                    def on_delta(piece: str) -> None:
+                        # Stop reading as soon as the cuts array is closed (or the cuts needed
+                        # for the remaining max_slices are settled); a malformed reply raises
+                        # here and aborts the request.
+                        new = parser.feed(piece)
+                        if parser.done:
+                            raise StreamStop
+                        if new and remaining is not None and parser.ascending:
+                            settled = _cuts_settled(
+                                validate_cuts(cuts=parser.cuts(), min_line=cur + 1, max_line=chunk_end),
+                                sentences,
+                                start_idx=cur,
+                                slices=remaining,
+                                target_min=slice_config.target_chars_min,
+                                target_max=slice_config.target_chars_max,
+                            )
+                            if settled:
+                                raise StreamStop
+
+                t0 = time.monotonic()
+                result = client.chat_completions(
+                    model=pcfg.model,
+                    messages=msgs,
+                    max_tokens=slice_config.completion_max_tokens,
+                    temperature=slice_config.temperature,
+                    response_format=response_format,
+                    timeout_s=slice_config.timeout_s,
+                    on_delta=on_delta,
+                )
+                elapsed = time.monotonic() - t0
+                add_usage(usage_totals, result, elapsed_s=elapsed)
+                if cascade is not None:
+                    cascade.record_call(pcfg.name, result, elapsed_s=elapsed)
+                if parser is not None and result.raw.get("stopped_early"):
+                    stream_stats["stopped_early"] += 1
+                    parsed = parser.cuts()
+                else:
+                    parsed = parse_cuts(result.content, repairs=json_repairs)
+                if cascade is not None and pcfg.name in cascade_clients:
+                    reason = check_cuts(
+                        parsed,
+                        chunk_chars,
+                        start_line=cur + 1,
+                        target_min=slice_config.target_chars_min,
+                        target_max=slice_config.target_chars_max,
+                        min_coverage=slice_config.cascade_min_coverage,
+                        final=not sentences.has(chunk_end),
+                        needed=remaining,
+                    )
+                    if reason is not None:
+                        # A valid reply, just not good enough: escalate without retrying.
+                        cascade.reject(reason)
+                        return []
+                    if not parsed:
+                        # The rest of the book is one slice (what the empty reply means anyway).
+                        return [Cut(end_line=chunk_end)]
+                return validate_cuts(cuts=parsed, min_line=cur + 1, max_line=chunk_end)
+
+            outcome = None
+            if cascade is not None:
+                outcome = request_with_retries(
+                    cascade_clients,
+                    messages,
+                    call_cuts,
+                    slice_config=cascade_config,
+                    error_counts=error_counts,
+                )
+                cascade.cheap_done(accepted=bool(outcome.value))
+                if not outcome.value:
+                    outcome = None
+            if outcome is None:
+                outcome = request_with_retries(
+                    provider_clients,
+                    messages,
+                    call_cuts,
+                    slice_config=slice_config,
+                    error_counts=error_counts,
+                )
+                if cascade is not None:
+                    # No cuts for the book's last chunk is an answer: the rest becomes one slice.
+                    final = not sentences.has(chunk_end)
+                    cascade.strong_done(answered=bool(outcome.value) or (final and outcome.error is None))
+            cuts: list[Cut] = outcome.value or []
+            last_error = outcome.error
+            last_provider = outcome.error_provider
+            last_model = outcome.error_model
+            used_provider = outcome.provider
+            used_model = outcome.model
+
+            if not cuts and last_error is not None and slice_config.offline_fallback:
+                # Every provider failed for this chunk: cut it offline instead of ending the run.
+                ends = plan_chunk_cuts(
+                    [count_chars(t) for t in sentences[cur:chunk_end]],
+                    start_line=cur + 1,
+                    target_min=slice_config.target_chars_min,
+                    target_max=slice_config.target_chars_max,
+                    final=not sentences.has(chunk_end),
+                )
+                cuts = [Cut(end_line=e) for e in ends]
+                offline_chunks += 1
+                last_error = None
 
             if not cuts:
                 # If we're at the end of the book and the model returns no cuts, emit the remaining
                 # text as the final slice (range is only a target, not a strict constraint).
-                if last_error is None and chunk_end == len(sentences):
+                if last_error is None and not sentences.has(chunk_end):
                     text = "\n".join(sentences[cur:chunk_end])
                     item = SliceItem(
                         slice_id=slice_id,
@@ -374,8 +740,25 @@ def slice_txt_to_json(
         f.write("\n]\n")
 
     run_meta["slices_written"] = slices_written
+    # Only known when the whole input was read (a run cut short by max_slices may not get there).
+    run_meta["input_lines"] = len(sentences) if sentences.exhausted else None
+    run_meta["prefix_hashes"] = prefix.checkpoints
     run_meta["providers_used"] = sorted([p for p in providers_used if p])
     run_meta["models_used"] = sorted([m for m in models_used if m])
+    if error_counts:
+        run_meta["request_errors"] = error_counts
+    if json_repairs:
+        run_meta["json_repairs"] = json_repairs
+    if usage_totals:
+        run_meta["usage"] = usage_totals
+    if slice_config.offline_fallback and not dry_run:
+        run_meta["offline_fallback_chunks"] = offline_chunks
+    if slice_config.candidate_mode and not dry_run:
+        run_meta["candidate_mode"] = candidate_stats
+    if slice_config.stream and not dry_run:
+        run_meta["stream"] = stream_stats
+    if cascade is not None:
+        run_meta["cascade"] = cascade.to_json()
     if run_error:
         run_meta["status"] = "error"
         run_meta["error"] = {"message": run_error, **(run_error_ctx or {})}
@@ -383,6 +766,11 @@ def slice_txt_to_json(
         run_meta["status"] = "ok"
     write_run_json()
 
+    if slice_config.two_phase and not dry_run and slices_written:
+        # Second phase: titles/summaries for the finished slices (updates slices.json/run.json;
+        # slices it could not fill are left for `python -m step2_slice.summarize`).
+        summarize_run(out_base, providers=providers, slice_config=slice_config, clients=clients)
+
     if run_error:
         # Also surface the error in terminal output (stderr), while keeping output JSON written.
         if progress_cb:
@@ -394,8 +782,10 @@ def slice_txt_to_json(
             print(f"slice error: {run_error}", file=sys.stderr)
         print(f"output: {out_json}", file=sys.stderr)
         print(f"run: {meta_path}", file=sys.stderr)
+        _BOOKS.inc(status="error")
         raise SliceRunError(out_path=out_json, message=run_error)
 
+    _BOOKS.inc(status="ok")
     if progress_cb:
         progress_cb(slices_written, len(sentences), len(sentences))
     return out_json
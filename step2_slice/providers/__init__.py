@@ -1,2 +1,29 @@
 from __future__ import annotations
 
+from typing import TYPE_CHECKING
+
+from .base import ChatProvider
+
+if TYPE_CHECKING:
+    from ..config import ProviderConfig
+
+
+def build_provider(cfg: ProviderConfig) -> ChatProvider:
+    # Provider modules are imported only for the types that are actually configured.
+    api_key = cfg.resolved_api_key()
+    provider: ChatProvider
+    if cfg.type == "volc_ark":
+        from .volc_ark import VolcArkProvider
+
+        provider = VolcArkProvider(base_url=cfg.base_url, api_key=api_key, prompt_cache=cfg.prompt_cache)
+    elif cfg.type == "openai_compatible":
+        from .openai_compatible import OpenAICompatibleProvider
+
+        provider = OpenAICompatibleProvider(base_url=cfg.base_url, api_key=api_key, prompt_cache=cfg.prompt_cache)
+    else:
+        raise ValueError(f"Unknown provider type: {cfg.type}")
+    if cfg.record_dir:
+        from .record import RecordingProvider
+
+        provider = RecordingProvider(provider, name=cfg.name, record_dir=cfg.record_dir)
+    return provider
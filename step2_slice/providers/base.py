@@ -1,7 +1,13 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import time
+from collections.abc import Callable
 from dataclasses import dataclass
-from typing import Any, Iterable, Mapping
+from typing import Any, Iterable, Iterator, Mapping
+
+from .http import MalformedResponseError
 
 
 Message = Mapping[str, Any]
@@ -14,6 +20,12 @@ class ChatResult:
     usage: dict[str, Any] | None = None
 
 
+class StreamStop(Exception):
+    # Raised from an on_delta callback to stop reading a streamed response early (the content
+    # received so far is returned as the result).
+    pass
+
+
 class ChatProvider:
     def chat_completions(
         self,
@@ -24,6 +36,101 @@ class ChatProvider:
         temperature: float,
         response_format: dict[str, Any] | None,
         timeout_s: float,
+        on_delta: Callable[[str], None] | None = None,
     ) -> ChatResult:
+        # on_delta: when given, the response is streamed (SSE) and on_delta receives each content
+        # piece as it arrives; it may raise StreamStop to end early, or any other exception to abort.
         raise NotImplementedError
 
+
+def parse_chat_response(body: bytes, *, status: int) -> ChatResult:
+    try:
+        data = json.loads(body.decode("utf-8"))
+    except Exception as e:  # noqa: BLE001
+        raise MalformedResponseError("Invalid JSON response", status=status, body=body) from e
+
+    choices = data.get("choices") or []
+    if not choices:
+        raise MalformedResponseError("Missing choices in response", status=status, body=body)
+    message = choices[0].get("message") or {}
+    content = message.get("content")
+    if not isinstance(content, str):
+        raise MalformedResponseError("Missing message.content in response", status=status, body=body)
+    usage = data.get("usage") if isinstance(data.get("usage"), dict) else None
+    return ChatResult(content=content, raw=data, usage=usage)
+
+
+def collect_chat_stream(events: Iterator[str], on_delta: Callable[[str], None]) -> ChatResult:
+    parts: list[str] = []
+    usage: dict[str, Any] | None = None
+    n_events = 0
+    stopped_early = False
+    first_token_s: float | None = None
+    t0 = time.monotonic()  # the request is only sent on the first next()
+    try:
+        for event in events:
+            n_events += 1
+            try:
+                data = json.loads(event)
+            except ValueError as e:
+                raise MalformedResponseError("Invalid JSON in stream event", body=event.encode("utf-8")) from e
+            if isinstance(data.get("usage"), dict):
+                usage = data["usage"]
+            for choice in data.get("choices") or []:
+                delta = choice.get("delta") or {}
+                piece = delta.get("content")
+                if isinstance(piece, str) and piece:
+                    if first_token_s is None:
+                        first_token_s = time.monotonic() - t0
+                    parts.append(piece)
+                    on_delta(piece)
+    except StreamStop:
+        stopped_early = True
+    finally:
+        close = getattr(events, "close", None)
+        if close is not None:
+            close()
+    return ChatResult(
+        content="".join(parts),
+        raw={"stream": True, "events": n_events, "stopped_early": stopped_early, "first_token_s": first_token_s},
+        usage=usage,
+    )
+
+
+def prefix_key(messages: Iterable[Message]) -> str:
+    # Names the static prefix a request shares with others (its leading system messages), for
+    # the providers' prompt/context caching.
+    h = hashlib.sha256()
+    for m in messages:
+        if m.get("role") != "system":
+            break
+        h.update(json.dumps(m, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+def token_counts(result: ChatResult) -> dict[str, int]:
+    # prompt_tokens / completion_tokens / cached_tokens (prompt tokens served from the
+    # provider's prefix cache), for the ones the provider reported.
+    usage = result.usage or {}
+    details = usage.get("prompt_tokens_details")
+    cached = details.get("cached_tokens") if isinstance(details, dict) else None
+    out: dict[str, int] = {}
+    for key, value in (
+        ("prompt_tokens", usage.get("prompt_tokens")),
+        ("completion_tokens", usage.get("completion_tokens")),
+        ("cached_tokens", cached),
+    ):
+        if isinstance(value, int):
+            out[key] = value
+    return out
+
+
+def add_usage(totals: dict[str, Any], result: ChatResult, *, elapsed_s: float) -> None:
+    # Accumulates token counts and wall time of answered requests into a run.json "usage" dict.
+    totals["requests"] = totals.get("requests", 0) + 1
+    for key, value in token_counts(result).items():
+        totals[key] = totals.get(key, 0) + value
+    totals["latency_s"] = round(totals.get("latency_s", 0.0) + elapsed_s, 3)
+    first = result.raw.get("first_token_s")  # streamed replies only
+    if first is not None:
+        totals["first_token_s"] = round(totals.get("first_token_s", 0.0) + first, 3)
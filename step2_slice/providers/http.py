@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 import json
-import socket
-import urllib.error
-import urllib.request
+import time
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Iterator
+
+# urllib.request (and http.client/email behind it) is imported on the first request, not at
+# import time: it is the largest part of the CLI start-up cost and --help/--dry-run never need it.
 
 
 @dataclass(frozen=True)
@@ -16,12 +17,88 @@ class HttpResponse:
 
 
 class HttpError(RuntimeError):
+    # Base class; raised as is for other 4xx responses (bad request, unknown model, ...).
     def __init__(self, message: str, *, status: int | None = None, body: bytes | None = None):
         super().__init__(message)
         self.status = status
         self.body = body
 
 
+class AuthError(HttpError):
+    # 401/403: retrying with the same key will not help.
+    pass
+
+
+class RateLimitError(HttpError):
+    def __init__(
+        self,
+        message: str,
+        *,
+        status: int | None = 429,
+        body: bytes | None = None,
+        retry_after: float | None = None,
+    ):
+        super().__init__(message, status=status, body=body)
+        self.retry_after = retry_after  # seconds, from the Retry-After header
+
+
+class ServerError(HttpError):
+    # 5xx
+    pass
+
+
+class RequestTimeoutError(HttpError):
+    pass
+
+
+class NetworkError(HttpError):
+    # Connection refused/reset, DNS failure, ...
+    pass
+
+
+class MalformedResponseError(HttpError):
+    # 2xx, but the body is not the expected chat completion JSON.
+    pass
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _status_error(url: str, e: Any) -> HttpError:
+    # e: urllib.error.HTTPError
+    body = e.read() if hasattr(e, "read") else b""
+    code = int(e.code)
+    message = f"HTTP {code} for {url}"
+    if code in (401, 403):
+        return AuthError(message, status=code, body=body)
+    if code == 429:
+        retry_after = _parse_retry_after(e.headers.get("Retry-After") if e.headers else None)
+        return RateLimitError(message, status=code, body=body, retry_after=retry_after)
+    if code >= 500:
+        return ServerError(message, status=code, body=body)
+    return HttpError(message, status=code, body=body)
+
+
+def _transport_error(url: str, e: OSError) -> HttpError:
+    reason = getattr(e, "reason", e)
+    if isinstance(e, TimeoutError) or isinstance(reason, TimeoutError):
+        return RequestTimeoutError(f"Timeout for {url}: {reason}")
+    return NetworkError(f"Network error for {url}: {reason}")
+
+
 def post_json(
     url: str,
     *,
@@ -29,6 +106,9 @@ def post_json(
     payload: dict[str, Any],
     timeout_s: float,
 ) -> HttpResponse:
+    import urllib.error
+    import urllib.request
+
     data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
     req = urllib.request.Request(url, data=data, method="POST")
     req.add_header("Content-Type", "application/json")
@@ -43,8 +123,55 @@ def post_json(
                 body=body,
             )
     except urllib.error.HTTPError as e:
-        body = e.read() if hasattr(e, "read") else b""
-        raise HttpError(f"HTTP {e.code} for {url}", status=int(e.code), body=body) from e
-    except (urllib.error.URLError, socket.timeout) as e:
-        raise HttpError(f"Network error for {url}: {e}") from e
+        raise _status_error(url, e) from e
+    except OSError as e:  # URLError, socket.timeout, connection resets
+        raise _transport_error(url, e) from e
+
+
+def post_json_stream(
+    url: str,
+    *,
+    headers: dict[str, str],
+    payload: dict[str, Any],
+    timeout_s: float,
+) -> Iterator[str]:
+    # Yields the data of each server-sent event as it arrives (without the "data:" prefix),
+    # stopping at "[DONE]". Closing the generator early closes the connection.
+    import urllib.error
+    import urllib.request
+
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    req = urllib.request.Request(url, data=data, method="POST")
+    req.add_header("Content-Type", "application/json")
+    req.add_header("Accept", "text/event-stream")
+    for k, v in headers.items():
+        req.add_header(k, v)
+    try:
+        resp = urllib.request.urlopen(req, timeout=timeout_s)
+    except urllib.error.HTTPError as e:
+        raise _status_error(url, e) from e
+    except OSError as e:  # URLError, socket.timeout, connection resets
+        raise _transport_error(url, e) from e
 
+    with resp:
+        event: list[str] = []
+        while True:
+            try:
+                raw = resp.readline()
+            except OSError as e:
+                raise _transport_error(url, e) from e
+            if not raw:
+                break
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            if line.startswith("data:"):
+                event.append(line[5:].lstrip())
+                continue
+            if line or not event:
+                continue  # comments / other fields / keep-alive blank lines
+            value = "\n".join(event)
+            event = []
+            if value == "[DONE]":
+                return
+            yield value
+        if event and "\n".join(event) != "[DONE]":
+            yield "\n".join(event)
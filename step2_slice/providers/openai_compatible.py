@@ -1,17 +1,18 @@
 from __future__ import annotations
 
-import json
+from collections.abc import Callable
 from typing import Any, Iterable
 from urllib.parse import urljoin
 
-from .base import ChatProvider, ChatResult, Message
-from .http import HttpError, post_json
+from .base import ChatProvider, ChatResult, Message, collect_chat_stream, parse_chat_response, prefix_key
+from .http import post_json, post_json_stream
 
 
 class OpenAICompatibleProvider(ChatProvider):
-    def __init__(self, *, base_url: str, api_key: str):
+    def __init__(self, *, base_url: str, api_key: str, prompt_cache: bool = False):
         self._base_url = base_url.rstrip("/") + "/"
         self._api_key = api_key
+        self._prompt_cache = prompt_cache
 
     def chat_completions(
         self,
@@ -22,34 +23,27 @@ class OpenAICompatibleProvider(ChatProvider):
         temperature: float,
         response_format: dict[str, Any] | None,
         timeout_s: float,
+        on_delta: Callable[[str], None] | None = None,
     ) -> ChatResult:
         url = urljoin(self._base_url, "v1/chat/completions")
+        messages = list(messages)
         payload: dict[str, Any] = {
             "model": model,
-            "messages": list(messages),
+            "messages": messages,
             "max_tokens": max_tokens,
             "temperature": temperature,
         }
+        if self._prompt_cache:
+            # Prefix caching itself is automatic; the key routes requests that share a prefix
+            # to the same cache.
+            payload["prompt_cache_key"] = prefix_key(messages)
         if response_format is not None:
             payload["response_format"] = response_format
-        resp = post_json(
-            url,
-            headers={"Authorization": f"Bearer {self._api_key}"},
-            payload=payload,
-            timeout_s=timeout_s,
-        )
-        try:
-            data = json.loads(resp.body.decode("utf-8"))
-        except Exception as e:  # noqa: BLE001
-            raise HttpError("Invalid JSON response", status=resp.status, body=resp.body) from e
-
-        choices = data.get("choices") or []
-        if not choices:
-            raise HttpError("Missing choices in response", status=resp.status, body=resp.body)
-        message = choices[0].get("message") or {}
-        content = message.get("content")
-        if not isinstance(content, str):
-            raise HttpError("Missing message.content in response", status=resp.status, body=resp.body)
-        usage = data.get("usage") if isinstance(data.get("usage"), dict) else None
-        return ChatResult(content=content, raw=data, usage=usage)
-
+        headers = {"Authorization": f"Bearer {self._api_key}"}
+        if on_delta is not None:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+            events = post_json_stream(url, headers=headers, payload=payload, timeout_s=timeout_s)
+            return collect_chat_stream(events, on_delta)
+        resp = post_json(url, headers=headers, payload=payload, timeout_s=timeout_s)
+        return parse_chat_response(resp.body, status=resp.status)
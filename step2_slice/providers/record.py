@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, Iterable
+
+from .base import ChatProvider, ChatResult, Message
+from .http import HttpError
+
+# Traffic archive for load testing (replay.py): one JSON line per chat_completions call, with
+# the request, the reply or error, and its timing.
+#
+#   {"t": start (unix s), "provider", "model", "key", "stream", "request": {...},
+#    "elapsed_s", "first_token_s", "deltas": [[s since start, piece], ...] (streamed only),
+#    "response": {"content", "usage", "stopped_early"} | "error": {"type", "status", "retry_after",
+#    "message", "body"}}
+
+_MAX_ERROR_BODY = 64 * 1024
+
+
+def request_key(messages: Iterable[Message]) -> str:
+    # Identifies a request across runs. System messages are left out: Ark context caching sends
+    # them separately, and the replay server must match both forms of the same request.
+    rest = [m for m in messages if m.get("role") != "system"]
+    return hashlib.sha256(json.dumps(rest, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+
+class _Archive:
+    # One append-only file per process and directory, shared by every recording provider.
+    _lock = threading.Lock()
+    _open: dict[Path, _Archive] = {}
+
+    def __init__(self, directory: Path):
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d_%H%M%S', time.localtime())}-{os.getpid()}.jsonl"
+        self.path = directory / name
+        self._f = self.path.open("a", encoding="utf-8")
+        self._write_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, directory: str | Path) -> _Archive:
+        key = Path(directory).resolve()
+        with cls._lock:
+            archive = cls._open.get(key)
+            if archive is None:
+                archive = cls._open[key] = cls(key)
+            return archive
+
+    def write(self, record: dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._write_lock:
+            self._f.write(line)
+            self._f.flush()
+
+
+class RecordingProvider(ChatProvider):
+    def __init__(self, inner: ChatProvider, *, name: str, record_dir: str | Path):
+        self._inner = inner
+        self._name = name
+        self._archive = _Archive.get(record_dir)
+
+    def chat_completions(
+        self,
+        *,
+        model: str,
+        messages: Iterable[Message],
+        max_tokens: int,
+        temperature: float,
+        response_format: dict[str, Any] | None,
+        timeout_s: float,
+        on_delta: Callable[[str], None] | None = None,
+    ) -> ChatResult:
+        messages = list(messages)
+        record: dict[str, Any] = {
+            "t": round(time.time(), 3),
+            "provider": self._name,
+            "model": model,
+            "key": request_key(messages),
+            "stream": on_delta is not None,
+            "request": {
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "response_format": response_format,
+                "timeout_s": timeout_s,
+            },
+        }
+        t0 = time.monotonic()
+        deltas: list[list[Any]] = []
+        recorded_delta = None
+        if on_delta is not None:
+            outer = on_delta
+
+            def recorded_delta(piece: str) -> None:
+                deltas.append([round(time.monotonic() - t0, 4), piece])
+                outer(piece)
+
+        try:
+            result = self._inner.chat_completions(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                response_format=response_format,
+                timeout_s=timeout_s,
+                on_delta=recorded_delta,
+            )
+        except Exception as e:
+            record["elapsed_s"] = round(time.monotonic() - t0, 4)
+            if on_delta is not None:
+                record["deltas"] = deltas
+            body = e.body if isinstance(e, HttpError) else None
+            record["error"] = {
+                "type": type(e).__name__,
+                "status": e.status if isinstance(e, HttpError) else None,
+                "retry_after": getattr(e, "retry_after", None),
+                "message": str(e),
+                "body": body[:_MAX_ERROR_BODY].decode("utf-8", errors="replace") if body else None,
+            }
+            self._archive.write(record)
+            raise
+        record["elapsed_s"] = round(time.monotonic() - t0, 4)
+        record["first_token_s"] = result.raw.get("first_token_s")
+        if on_delta is not None:
+            record["deltas"] = deltas
+        record["response"] = {
+            "content": result.content,
+            "usage": result.usage,
+            "stopped_early": bool(result.raw.get("stopped_early")),
+        }
+        self._archive.write(record)
+        return result
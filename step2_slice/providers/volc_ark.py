@@ -1,17 +1,55 @@
 from __future__ import annotations
 
 import json
+import threading
+import time
+from collections.abc import Callable
 from typing import Any, Iterable
 from urllib.parse import urljoin
 
-from .base import ChatProvider, ChatResult, Message
-from .http import HttpError, post_json
+from .base import ChatProvider, ChatResult, Message, collect_chat_stream, parse_chat_response, prefix_key
+from .http import HttpError, MalformedResponseError, post_json, post_json_stream
+
+
+# Context caching (prompt_cache): the leading system messages are stored once as a
+# "common_prefix" context and later requests only send the rest of the conversation.
+_CONTEXT_TTL_S = 3600
+_CONTEXT_MARGIN_S = 60  # stop using a context a little before the server drops it
 
 
 class VolcArkProvider(ChatProvider):
-    def __init__(self, *, base_url: str, api_key: str):
+    def __init__(self, *, base_url: str, api_key: str, prompt_cache: bool = False):
         self._base_url = base_url.rstrip("/") + "/"
         self._api_key = api_key
+        self._prompt_cache = prompt_cache
+        self._contexts: dict[tuple[str, str], tuple[str, float]] = {}  # -> (context id, expires at)
+        self._lock = threading.Lock()
+
+    def _context_id(self, model: str, prefix: list[Message], timeout_s: float) -> str | None:
+        key = (model, prefix_key(prefix))
+        now = time.monotonic()
+        with self._lock:
+            hit = self._contexts.get(key)
+        if hit is not None and hit[1] > now:
+            return hit[0]
+        url = urljoin(self._base_url, "api/v3/context/create")
+        payload = {"model": model, "mode": "common_prefix", "messages": prefix, "ttl": _CONTEXT_TTL_S}
+        headers = {"Authorization": f"Bearer {self._api_key}"}
+        try:
+            resp = post_json(url, headers=headers, payload=payload, timeout_s=timeout_s)
+            context_id = json.loads(resp.body.decode("utf-8"))["id"]
+        except (ValueError, KeyError, TypeError, MalformedResponseError):
+            context_id = None
+        except HttpError as e:
+            if type(e) is not HttpError:
+                raise  # auth, rate limit, 5xx, network: handled like a failed chat request
+            context_id = None  # 4xx: endpoint or prefix not eligible for context caching
+        if context_id is None:
+            self._prompt_cache = False
+            return None
+        with self._lock:
+            self._contexts[key] = (context_id, now + _CONTEXT_TTL_S - _CONTEXT_MARGIN_S)
+        return context_id
 
     def chat_completions(
         self,
@@ -22,35 +60,52 @@ class VolcArkProvider(ChatProvider):
         temperature: float,
         response_format: dict[str, Any] | None,
         timeout_s: float,
+        on_delta: Callable[[str], None] | None = None,
     ) -> ChatResult:
+        messages = list(messages)
+        n_prefix = 0
+        while n_prefix < len(messages) and messages[n_prefix].get("role") == "system":
+            n_prefix += 1
+        context_id = None
+        if self._prompt_cache and 0 < n_prefix < len(messages):
+            context_id = self._context_id(model, messages[:n_prefix], timeout_s)
+
         url = urljoin(self._base_url, "api/v3/chat/completions")
         payload: dict[str, Any] = {
             "model": model,
-            "messages": list(messages),
+            "messages": messages,
             "max_tokens": max_tokens,
             "temperature": temperature,
-            "stream": False,
+            "stream": on_delta is not None,
         }
         if response_format is not None:
             payload["response_format"] = response_format
-        resp = post_json(
-            url,
-            headers={"Authorization": f"Bearer {self._api_key}"},
-            payload=payload,
-            timeout_s=timeout_s,
-        )
-        try:
-            data = json.loads(resp.body.decode("utf-8"))
-        except Exception as e:  # noqa: BLE001
-            raise HttpError("Invalid JSON response", status=resp.status, body=resp.body) from e
-
-        choices = data.get("choices") or []
-        if not choices:
-            raise HttpError("Missing choices in response", status=resp.status, body=resp.body)
-        message = choices[0].get("message") or {}
-        content = message.get("content")
-        if not isinstance(content, str):
-            raise HttpError("Missing message.content in response", status=resp.status, body=resp.body)
-        usage = data.get("usage") if isinstance(data.get("usage"), dict) else None
-        return ChatResult(content=content, raw=data, usage=usage)
+        if on_delta is not None:
+            payload["stream_options"] = {"include_usage": True}
+        if context_id is not None:
+            cached_payload = {**payload, "context_id": context_id, "messages": messages[n_prefix:]}
+            try:
+                return self._send(
+                    urljoin(self._base_url, "api/v3/context/chat/completions"), cached_payload, timeout_s, on_delta
+                )
+            except HttpError as e:
+                if type(e) is not HttpError:
+                    raise
+                # 4xx on the context endpoint (contexts are renewed before their TTL, so this is
+                # not plain expiry): stop using context caching and send the full request.
+                self._prompt_cache = False
+        return self._send(url, payload, timeout_s, on_delta)
 
+    def _send(
+        self,
+        url: str,
+        payload: dict[str, Any],
+        timeout_s: float,
+        on_delta: Callable[[str], None] | None,
+    ) -> ChatResult:
+        headers = {"Authorization": f"Bearer {self._api_key}"}
+        if on_delta is not None:
+            events = post_json_stream(url, headers=headers, payload=payload, timeout_s=timeout_s)
+            return collect_chat_stream(events, on_delta)
+        resp = post_json(url, headers=headers, payload=payload, timeout_s=timeout_s)
+        return parse_chat_response(resp.body, status=resp.status)
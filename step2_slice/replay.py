@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import signal
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+from .providers.record import request_key
+
+# Stand-in provider that plays back traffic recorded with `record_dir` (providers/record.py):
+# each request gets a recorded reply with its original latency, streaming cadence and errors
+# (429 with Retry-After, 5xx, timeouts, dropped connections, malformed bodies). Serves both the
+# OpenAI (v1/...) and Ark (api/v3/...) chat paths, so llm.json only needs its base_url changed.
+#
+# A request is matched to recordings of the same request (same non-system messages); repeated
+# requests get the recorded attempts in order (e.g. 429, 429, 200), then the last one again.
+# Requests that were never recorded get the next recording in time order: timing and errors
+# stay realistic, the content usually does not fit the request.
+
+
+class ReplayArchive:
+    def __init__(self, paths: list[Path]):
+        files: list[Path] = []
+        for p in paths:
+            files.extend(sorted(p.glob("*.jsonl")) if p.is_dir() else [p])
+        records: list[dict[str, Any]] = []
+        for f in files:
+            for line in f.read_text(encoding="utf-8").splitlines():
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue  # torn last line
+        if not records:
+            raise ValueError("no recordings found")
+        records.sort(key=lambda r: r.get("t", 0))
+        self.records = records
+        self._by_key: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        for r in records:
+            self._by_key[r["key"]].append(r)
+        self._served: dict[str, int] = defaultdict(int)
+        self._cycle = itertools.cycle(records)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "matched": 0, "unmatched": 0}
+
+    def pick(self, key: str, *, unmatched: str) -> dict[str, Any] | None:
+        with self._lock:
+            self.stats["requests"] += 1
+            attempts = self._by_key.get(key)
+            if attempts:
+                self.stats["matched"] += 1
+                i = min(self._served[key], len(attempts) - 1)
+                self._served[key] += 1
+                return attempts[i]
+            self.stats["unmatched"] += 1
+            return next(self._cycle) if unmatched == "cycle" else None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _Server
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def _send(self, status: int, body: bytes, headers: dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path == "/stats":
+            self._send(200, json.dumps(self.server.archive.stats).encode("utf-8"))
+            return
+        self._send(404, b"{}")
+
+    def do_POST(self) -> None:  # noqa: N802
+        n = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(n) or b"{}")
+        except ValueError:
+            self._send(400, b'{"error": "invalid JSON"}')
+            return
+        if self.path.endswith("/context/create"):
+            # Ark context caching: the prefix is not needed to replay, any id will do.
+            ctx = f"ctx-replay-{next(self.server.ids)}"
+            self._send(200, json.dumps({"id": ctx, "mode": body.get("mode"), "ttl": body.get("ttl")}).encode())
+            return
+        if not self.path.endswith("/chat/completions"):
+            self._send(404, b"{}")
+            return
+        record = self.server.archive.pick(request_key(body.get("messages") or []), unmatched=self.server.unmatched)
+        if record is None:
+            self._send(404, b'{"error": "no recording for this request"}')
+            return
+        try:
+            self._play(record, stream=bool(body.get("stream")))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (its timeout, or it stopped reading a stream early)
+
+    def _sleep_until(self, t0: float, offset_s: float) -> None:
+        delay = t0 + offset_s / self.server.speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _play(self, record: dict[str, Any], *, stream: bool) -> None:
+        t0 = time.monotonic()
+        elapsed = float(record.get("elapsed_s") or 0.0)
+        error = record.get("error")
+        deltas = record.get("deltas") or []
+        if error and error.get("type") in ("NetworkError", "RequestTimeoutError"):
+            if error["type"] == "RequestTimeoutError":
+                # A stall: hold the connection for the real (unscaled) time, so the client's own
+                # timeout fires as it did when recording.
+                time.sleep(elapsed + 1.0)
+            else:
+                self._sleep_until(t0, elapsed)
+            self.close_connection = True
+            self.connection.close()
+            return
+        if error and error.get("status"):
+            self._sleep_until(t0, elapsed)
+            headers = {}
+            if error.get("retry_after") is not None:
+                headers["Retry-After"] = str(error["retry_after"])
+            self._send(int(error["status"]), (error.get("body") or "{}").encode("utf-8"), headers)
+            return
+        bad_event = None
+        if error and error.get("type") == "MalformedResponseError":
+            if not stream:
+                self._sleep_until(t0, elapsed)
+                self._send(200, (error.get("body") or "").encode("utf-8"))
+                return
+            # An unparsable stream event: the stream up to it, then the event itself.
+            bad_event = error.get("body") or ""
+
+        # A reply. Errors raised by the client itself while reading a stream (it aborted) are
+        # played back as the part of the stream it had received.
+        response = record.get("response") or {}
+        content = response.get("content")
+        if content is None:
+            content = "".join(piece for _, piece in deltas)
+        usage = response.get("usage")
+        if not stream:
+            self._sleep_until(t0, elapsed)
+            payload = {"choices": [{"message": {"role": "assistant", "content": content}}], "usage": usage}
+            self._send(200, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(data: str) -> None:
+            chunk = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(b"%x\r\n" % len(chunk) + chunk + b"\r\n")
+            self.wfile.flush()
+
+        if not deltas and bad_event is None:
+            deltas = [[record.get("first_token_s") or elapsed, content]]
+        for offset, piece in deltas:
+            self._sleep_until(t0, float(offset))
+            event(json.dumps({"choices": [{"delta": {"content": piece}}]}, ensure_ascii=False))
+        self._sleep_until(t0, elapsed)
+        if bad_event is not None:
+            event(bad_event)
+        if usage:
+            event(json.dumps({"choices": [], "usage": usage}))
+        event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], archive: ReplayArchive, *, speed: float, unmatched: str):
+        super().__init__(address, _Handler)
+        self.archive = archive
+        self.speed = speed
+        self.unmatched = unmatched
+        self.ids = itertools.count(1)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="python -m step2_slice.replay",
+        description=(
+            "Play back recorded provider traffic (llm.json record_dir) with its original latency and errors, "
+            "as a local stand-in for load tests."
+        ),
+    )
+    p.add_argument("archive", nargs="*", help="record_dir directories or recorded .jsonl files")
+    p.add_argument("--host", default="127.0.0.1", help="Bind address (default 127.0.0.1)")
+    p.add_argument("--port", type=int, default=18080, help="Port (default 18080)")
+    p.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Play latencies this many times faster (default 1.0 = recorded timing; timeouts are not scaled)",
+    )
+    p.add_argument(
+        "--unmatched",
+        choices=("cycle", "error"),
+        default="cycle",
+        help="Requests never recorded: next recording in time order (cycle, default) or HTTP 404 (error)",
+    )
+    return p
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if not args.archive:
+        build_parser().error("at least one archive is required")
+    if args.speed <= 0:
+        build_parser().error("--speed must be positive")
+    for a in args.archive:
+        if not Path(a).exists():
+            build_parser().error(f"archive not found: {a}")
+    try:
+        archive = ReplayArchive([Path(a) for a in args.archive])
+    except ValueError as e:
+        build_parser().error(str(e))
+
+    server = _Server((args.host, args.port), archive, speed=args.speed, unmatched=args.unmatched)
+    print(
+        f"replaying {len(archive.records)} recordings on http://{args.host}:{server.server_address[1]}",
+        file=sys.stderr,
+    )
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(archive.stats), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import random
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from metrics import REGISTRY
+
+from .config import ProviderConfig, SliceConfig
+from .providers.base import ChatProvider, ChatResult, Message, token_counts
+from .providers.http import (
+    AuthError,
+    HttpError,
+    MalformedResponseError,
+    NetworkError,
+    RateLimitError,
+    RequestTimeoutError,
+    ServerError,
+)
+from .segmenter import InvalidCutsError, build_correction_messages
+
+
+_MAX_BACKOFF_S = 60.0
+
+_REQUESTS = REGISTRY.counter("step2_requests_total", "LLM requests sent", ["provider"])
+_REQUEST_SECONDS = REGISTRY.histogram(
+    "step2_request_seconds", "LLM request latency (until the last byte of the reply)", ["provider"]
+)
+_ERRORS = REGISTRY.counter("step2_request_errors_total", "Failed LLM requests by error class", ["provider", "kind"])
+_RETRIES = REGISTRY.counter("step2_retries_total", "LLM requests retried on the same provider", ["provider"])
+_TOKENS = REGISTRY.counter("step2_tokens_total", "Tokens reported by the provider", ["provider", "type"])
+_CACHE_HITS = REGISTRY.counter(
+    "step2_cache_hits_total", "Replies with part of the prompt served from the provider's prefix cache", ["provider"]
+)
+
+
+class _Metered(ChatProvider):
+    # Records requests, latency and token usage per provider around another client; with a
+    # deadline (time.monotonic()), no request waits past it.
+    def __init__(self, inner: ChatProvider, name: str, *, deadline: float | None = None):
+        self._inner = inner
+        self._name = name
+        self._deadline = deadline
+
+    def chat_completions(
+        self,
+        *,
+        model: str,
+        messages: Iterable[Message],
+        max_tokens: int,
+        temperature: float,
+        response_format: dict[str, Any] | None,
+        timeout_s: float,
+        on_delta: Callable[[str], None] | None = None,
+    ) -> ChatResult:
+        t0 = time.monotonic()
+        if self._deadline is not None:
+            timeout_s = max(min(timeout_s, self._deadline - t0), 0.0)
+        try:
+            result = self._inner.chat_completions(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                response_format=response_format,
+                timeout_s=timeout_s,
+                on_delta=on_delta,
+            )
+        finally:
+            _REQUESTS.inc(provider=self._name)
+            _REQUEST_SECONDS.observe(time.monotonic() - t0, provider=self._name)
+        tokens = token_counts(result)
+        for key, value in tokens.items():
+            _TOKENS.inc(value, provider=self._name, type=key.removesuffix("_tokens"))
+        if tokens.get("cached_tokens"):
+            _CACHE_HITS.inc(provider=self._name)
+        return result
+
+
+@dataclass(frozen=True)
+class RetryDecision:
+    retry: bool  # False: give up on this provider and fail over to the next one
+    delay_s: float = 0.0
+    reprompt: bool = False  # retry with a correction message appended
+
+
+def classify_error(e: BaseException) -> str:
+    if isinstance(e, AuthError):
+        return "auth"
+    if isinstance(e, RateLimitError):
+        return "rate_limit"
+    if isinstance(e, ServerError):
+        return "server"
+    if isinstance(e, RequestTimeoutError):
+        return "timeout"
+    if isinstance(e, NetworkError):
+        return "network"
+    if isinstance(e, MalformedResponseError):
+        return "malformed_response"
+    if isinstance(e, InvalidCutsError):
+        return "invalid_cuts"
+    if isinstance(e, HttpError):
+        return "client"
+    return "other"
+
+
+def backoff_s(attempt: int, *, base: float, rng: random.Random | None = None) -> float:
+    # Exponential backoff with "equal jitter": half fixed, half random, so concurrent books that
+    # failed together do not retry in lockstep.
+    ceiling = min(_MAX_BACKOFF_S, base * (2**attempt))
+    return ceiling / 2 + (rng or random).uniform(0, ceiling / 2)
+
+
+def retry_decision(e: BaseException, attempt: int, *, base: float) -> RetryDecision:
+    kind = classify_error(e)
+    if kind in ("auth", "client"):
+        # Same key / same request -> same answer.
+        return RetryDecision(retry=False)
+    if kind == "rate_limit":
+        retry_after = getattr(e, "retry_after", None)
+        delay = min(retry_after, _MAX_BACKOFF_S) if retry_after is not None else backoff_s(attempt, base=base)
+        return RetryDecision(retry=True, delay_s=delay)
+    if kind == "invalid_cuts":
+        # The provider works; the same prompt would likely reproduce the bad output, so ask
+        # again right away with the reply and what was wrong with it.
+        return RetryDecision(retry=True, reprompt=True)
+    return RetryDecision(retry=True, delay_s=backoff_s(attempt, base=base))
+
+
+@dataclass
+class Attempts:
+    value: Any = None
+    provider: str | None = None  # last provider that answered
+    model: str | None = None
+    error: Exception | None = None
+    error_provider: str | None = None
+    error_model: str | None = None
+
+
+def request_with_retries(
+    provider_clients: dict[str, tuple[ChatProvider, ProviderConfig]],
+    messages: list[dict[str, str]],
+    call: Callable[[ChatProvider, ProviderConfig, list[dict[str, str]]], Any],
+    *,
+    slice_config: SliceConfig,
+    error_counts: dict[str, int],
+) -> Attempts:
+    # Tries the providers in order. call() sends the request and returns the parsed value; a
+    # falsy value (a valid reply without usable cuts) moves on to the next provider. How a
+    # failure is retried depends on its class (see retry_decision); chunk_deadline_s bounds
+    # the total time spent on one request, backoff sleeps and request timeouts included.
+    if not provider_clients:
+        raise ValueError("No providers available (check slice.provider_order and llm config)")
+    out = Attempts()
+    deadline = time.monotonic() + slice_config.chunk_deadline_s if slice_config.chunk_deadline_s else None
+    for name, (client, pcfg) in provider_clients.items():
+        client = _Metered(client, name, deadline=deadline)
+        attempt_messages = messages
+        for attempt in range(slice_config.retry_max):
+            try:
+                value = call(client, pcfg, attempt_messages)
+            except Exception as e:  # noqa: BLE001
+                out.error = e
+                out.error_provider = name
+                out.error_model = pcfg.model
+                kind = classify_error(e)
+                error_counts[kind] = error_counts.get(kind, 0) + 1
+                _ERRORS.inc(provider=name, kind=kind)
+                decision = retry_decision(e, attempt, base=slice_config.retry_backoff_s)
+                if not decision.retry or attempt == slice_config.retry_max - 1:
+                    break
+                if decision.reprompt:
+                    attempt_messages = build_correction_messages(
+                        messages, content=getattr(e, "content", None), error=str(e)
+                    )
+                delay = decision.delay_s
+                if deadline is not None:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    delay = min(delay, left)
+                if delay > 0:
+                    time.sleep(delay)
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                _RETRIES.inc(provider=name)
+                continue
+            out.error = None
+            out.provider = name
+            out.model = pcfg.model
+            if value:
+                out.value = value
+                return out
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            if out.error is not None:
+                out.error = TimeoutError(
+                    f"chunk deadline of {slice_config.chunk_deadline_s}s exceeded; last error: {out.error}"
+                )
+            return out
+    return out
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import itertools
+import json
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from .config import ProviderConfig, SliceConfig
+from .pipeline import SliceRunError, build_provider, slice_txt_to_json
+from .providers.base import ChatProvider, ChatResult, Message
+from .providers.http import RateLimitError
+
+
+@dataclass(frozen=True)
+class BookJob:
+    txt: Path
+    priority: int = 0  # higher runs first
+    max_slices: int | None = None
+    out_dir: Path | None = None
+
+
+@dataclass
+class BookOutcome:
+    job: BookJob
+    status: str  # ok | error
+    out_path: Path | None = None
+    error: str | None = None
+    elapsed_s: float = 0.0
+
+
+@dataclass(frozen=True)
+class _Ticket:
+    book: str
+    priority: int
+    seq: int
+
+
+@dataclass
+class _Lane:
+    max_concurrency: int | None
+    interval_s: float  # 0 = no rate limit
+    in_flight: int = 0
+    next_at: float = 0.0
+    waiting: list[_Ticket] = field(default_factory=list)
+    requests: int = 0
+    wait_s: float = 0.0
+
+
+class ProviderPool:
+    # One client per provider shared by every book of a batch. Each provider ("lane") enforces
+    # max_concurrency and requests_per_minute from llm.json; when a slot opens it goes to the
+    # waiting request with the highest book priority, then to the book that has been served the
+    # fewest requests so far, so one long book cannot starve the others.
+    def __init__(self, providers: dict[str, ProviderConfig], names: Iterable[str]):
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._granted: dict[str, int] = defaultdict(int)
+        self.clients: dict[str, ChatProvider] = {}
+        self._lanes: dict[str, _Lane] = {}
+        for name in names:
+            cfg = providers.get(name)
+            if cfg is None:
+                raise ValueError(f"provider not found in llm config: {name}")
+            self.clients[name] = build_provider(cfg)
+            rpm = cfg.requests_per_minute
+            self._lanes[name] = _Lane(
+                max_concurrency=cfg.max_concurrency,
+                interval_s=60.0 / rpm if rpm else 0.0,
+            )
+
+    def _pick(self, lane: _Lane) -> _Ticket:
+        return min(lane.waiting, key=lambda t: (-t.priority, self._granted[t.book], t.seq))
+
+    def acquire(self, provider: str, *, book: str, priority: int = 0) -> None:
+        lane = self._lanes[provider]
+        ticket = _Ticket(book=book, priority=priority, seq=next(self._seq))
+        started = time.monotonic()
+        with self._cond:
+            lane.waiting.append(ticket)
+            while True:
+                now = time.monotonic()
+                free = lane.max_concurrency is None or lane.in_flight < lane.max_concurrency
+                if free and now >= lane.next_at and self._pick(lane) is ticket:
+                    break
+                timeout = lane.next_at - now if free and lane.next_at > now else None
+                self._cond.wait(timeout)
+            lane.waiting.remove(ticket)
+            lane.in_flight += 1
+            lane.requests += 1
+            lane.wait_s += now - started
+            if lane.interval_s:
+                lane.next_at = max(now, lane.next_at) + lane.interval_s
+            self._granted[book] += 1
+            if lane.waiting and (lane.max_concurrency is None or lane.in_flight < lane.max_concurrency):
+                # The next waiter in line may be asleep without a timeout (the lane was free but
+                # this ticket came first); wake it for the slot that is still open.
+                self._cond.notify_all()
+
+    def release(self, provider: str) -> None:
+        with self._cond:
+            self._lanes[provider].in_flight -= 1
+            self._cond.notify_all()
+
+    def cooldown(self, provider: str, seconds: float) -> None:
+        # Shared backoff: a rate-limit response pauses the provider for every book.
+        with self._cond:
+            lane = self._lanes[provider]
+            lane.next_at = max(lane.next_at, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def bind(self, book: str, *, priority: int = 0) -> dict[str, ChatProvider]:
+        return {name: _PooledProvider(self, name, book=book, priority=priority) for name in self.clients}
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            return {
+                name: {
+                    "requests": lane.requests,
+                    "avg_wait_s": round(lane.wait_s / lane.requests, 3) if lane.requests else 0.0,
+                }
+                for name, lane in self._lanes.items()
+            }
+
+
+class _PooledProvider(ChatProvider):
+    def __init__(self, pool: ProviderPool, name: str, *, book: str, priority: int):
+        self._pool = pool
+        self._name = name
+        self._book = book
+        self._priority = priority
+
+    def chat_completions(
+        self,
+        *,
+        model: str,
+        messages: Iterable[Message],
+        max_tokens: int,
+        temperature: float,
+        response_format: dict[str, Any] | None,
+        timeout_s: float,
+        on_delta: Callable[[str], None] | None = None,
+    ) -> ChatResult:
+        self._pool.acquire(self._name, book=self._book, priority=self._priority)
+        try:
+            return self._pool.clients[self._name].chat_completions(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                response_format=response_format,
+                timeout_s=timeout_s,
+                on_delta=on_delta,
+            )
+        except RateLimitError as e:
+            self._pool.cooldown(self._name, e.retry_after if e.retry_after is not None else 1.0)
+            raise
+        finally:
+            self._pool.release(self._name)
+
+
+def pool_providers(slice_config: SliceConfig) -> list[str]:
+    # Providers a slicing run sends requests to: the cascade's cheap tier, then provider_order.
+    return [*(slice_config.cascade_provider_order or []), *slice_config.provider_order]
+
+
+def load_manifest(path: str | Path) -> list[BookJob]:
+    # Either a JSON list of {"txt", "priority", "max_slices", "out_dir"} objects, or plain text
+    # with one txt path per line ("#" comments allowed).
+    path = Path(path)
+    raw = path.read_text(encoding="utf-8")
+    base = path.parent
+    jobs: list[BookJob] = []
+    if raw.lstrip().startswith("["):
+        data = json.loads(raw)
+        for entry in data:
+            if isinstance(entry, str):
+                entry = {"txt": entry}
+            if not isinstance(entry, dict) or not entry.get("txt"):
+                raise ValueError(f"invalid manifest entry: {entry!r}")
+            max_slices = entry.get("max_slices")
+            out_dir = entry.get("out_dir")
+            jobs.append(
+                BookJob(
+                    txt=base / str(entry["txt"]),
+                    priority=int(entry.get("priority", 0)),
+                    max_slices=int(max_slices) if max_slices else None,
+                    out_dir=base / str(out_dir) if out_dir else None,
+                )
+            )
+        return jobs
+    for line in raw.splitlines():
+        s = line.strip()
+        if s and not s.startswith("#"):
+            jobs.append(BookJob(txt=base / s))
+    return jobs
+
+
+def run_batch(
+    jobs: list[BookJob],
+    *,
+    providers: dict[str, ProviderConfig],
+    slice_config: SliceConfig,
+    max_books: int = 4,
+    dry_run: bool = False,
+    on_done: Callable[[BookOutcome], None] | None = None,
+) -> tuple[list[BookOutcome], dict[str, Any]]:
+    if max_books <= 0:
+        raise ValueError("max_books must be positive")
+    pool = None if dry_run else ProviderPool(providers, pool_providers(slice_config))
+    # Books are started in priority order; the pool also prioritizes their chunk requests.
+    ordered = sorted(enumerate(jobs), key=lambda p: (-p[1].priority, p[0]))
+    outcomes: list[BookOutcome | None] = [None] * len(jobs)
+
+    def run_one(idx: int, job: BookJob) -> None:
+        started = time.monotonic()
+        key = f"{idx}:{job.txt}"
+        try:
+            out = slice_txt_to_json(
+                job.txt,
+                providers=providers,
+                slice_config=slice_config,
+                out_dir=job.out_dir,
+                max_slices=job.max_slices,
+                dry_run=dry_run,
+                clients=pool.bind(key, priority=job.priority) if pool else None,
+            )
+            outcome = BookOutcome(job=job, status="ok", out_path=out)
+        except SliceRunError as e:
+            outcome = BookOutcome(job=job, status="error", out_path=e.out_path, error=str(e))
+        except Exception as e:  # noqa: BLE001
+            outcome = BookOutcome(job=job, status="error", error=f"{type(e).__name__}: {e}")
+        outcome.elapsed_s = round(time.monotonic() - started, 3)
+        outcomes[idx] = outcome
+        if on_done:
+            on_done(outcome)
+
+    with ThreadPoolExecutor(max_workers=max_books, thread_name_prefix="book") as ex:
+        for idx, job in ordered:
+            ex.submit(run_one, idx, job)
+
+    return [o for o in outcomes if o is not None], (pool.stats() if pool else {})
@@ -15,36 +15,49 @@ class Cut:
     summary: str | None = None
 
 
-_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+class InvalidCutsError(ValueError):
+    # The model answered, but the reply cannot be used (not JSON, no "cuts", bad choice, ...).
+    def __init__(self, message: str, *, content: str | None = None):
+        super().__init__(message)
+        self.content = content
+
 
 _PROMPT_PATH = Path(__file__).resolve().parent / "prompt.md"
 
 
+_SECTION_RE = re.compile(r"^##\s+(\w+)\s*$")
+
+
 @lru_cache(maxsize=1)
-def _load_prompt_sections() -> tuple[str, str]:
+def _load_prompt_sections() -> dict[str, str]:
+    # Every "## <name>" heading in prompt.md starts a section; text before the first one is
+    # documentation.
     if not _PROMPT_PATH.exists():
         raise FileNotFoundError(f"prompt file not found: {_PROMPT_PATH}")
 
-    system_lines: list[str] = []
-    user_lines: list[str] = []
-    current: str | None = None
+    sections: dict[str, list[str]] = {}
+    current: list[str] | None = None
     for raw in _PROMPT_PATH.read_text(encoding="utf-8").splitlines():
         line = raw.rstrip("\n")
-        if line.strip() == "## system":
-            current = "system"
+        m = _SECTION_RE.match(line.strip())
+        if m:
+            current = sections.setdefault(m.group(1), [])
             continue
-        if line.strip() == "## user":
-            current = "user"
-            continue
-        if current == "system":
-            system_lines.append(line)
-        elif current == "user":
-            user_lines.append(line)
+        if current is not None:
+            current.append(line)
 
-    system = "\n".join(system_lines).strip()
-    user = "\n".join(user_lines).strip()
-    if not system or not user:
+    out = {name: "\n".join(lines).strip() for name, lines in sections.items()}
+    if not out.get("system") or not out.get("user"):
         raise ValueError(f"prompt.md must contain both '## system' and '## user' sections: {_PROMPT_PATH}")
+    return out
+
+
+def _prompt_pair(system_key: str, user_key: str) -> tuple[str, str]:
+    sections = _load_prompt_sections()
+    system = sections.get(system_key)
+    user = sections.get(user_key)
+    if not system or not user:
+        raise ValueError(f"prompt.md must contain '## {system_key}' and '## {user_key}' sections: {_PROMPT_PATH}")
     return system, user
 
 
@@ -62,7 +75,85 @@ def _render_user_prompt(
     )
 
 
-def _extract_json_object(text: str) -> dict[str, Any]:
+_FENCE_RE = re.compile(r"^```[A-Za-z0-9_-]*[ \t]*\n?|\n?```\s*$")
+
+
+def _count_repair(repairs: dict[str, int] | None, kind: str) -> None:
+    if repairs is not None:
+        repairs[kind] = repairs.get(kind, 0) + 1
+
+
+def _scan_objects(s: str) -> tuple[list[tuple[int, int]], int | None]:
+    # One linear pass: spans of the balanced top-level {...} objects, plus the start of a final
+    # object that never closes (truncated output). Quotes only count inside an object, so prose
+    # around the JSON cannot derail the scan.
+    spans: list[tuple[int, int]] = []
+    depth = 0
+    start = -1
+    in_string = False
+    escape = False
+    for i, ch in enumerate(s):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif depth == 0:
+            continue
+        elif ch == '"':
+            in_string = True
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                spans.append((start, i + 1))
+    return spans, (start if depth > 0 else None)
+
+
+def _strip_trailing_commas(s: str) -> str:
+    # Drops "," before "}" or "]" outside strings: {"a": 1,} -> {"a": 1}
+    out: list[str] = []
+    in_string = False
+    escape = False
+    i = 0
+    n = len(s)
+    while i < n:
+        ch = s[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == ",":
+            j = i + 1
+            while j < n and s[j].isspace():
+                j += 1
+            if j < n and s[j] in "}]":
+                i += 1
+                continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _extract_json_object(
+    text: str,
+    *,
+    key: str | None = None,
+    repairs: dict[str, int] | None = None,
+) -> dict[str, Any]:
+    # Tolerant extraction for common model quirks: code fences, prose around the JSON, trailing
+    # commas, several objects (the first one holding `key` wins). Repairs that were needed are
+    # counted into `repairs`.
     s = text.strip()
     if not s:
         raise ValueError("empty model response")
@@ -73,13 +164,56 @@ def _extract_json_object(text: str) -> dict[str, Any]:
     except Exception:  # noqa: BLE001
         pass
 
-    m = _JSON_OBJECT_RE.search(s)
-    if not m:
+    body = _FENCE_RE.sub("", s)
+    fenced = body != s
+    spans, _ = _scan_objects(body)
+    if not spans:
         raise ValueError("no json object found in model response")
-    value = json.loads(m.group(0))
-    if not isinstance(value, dict):
-        raise ValueError("model response json is not an object")
-    return value
+
+    chosen: dict[str, Any] | None = None
+    chosen_span = spans[0]
+    comma_fixed = False
+    for a, b in spans:
+        chunk = body[a:b]
+        fixed = False
+        try:
+            value = json.loads(chunk)
+        except ValueError:
+            try:
+                value = json.loads(_strip_trailing_commas(chunk))
+            except ValueError:
+                continue
+            fixed = True
+        if not isinstance(value, dict):
+            continue
+        if chosen is None or (key is not None and key not in chosen and key in value):
+            chosen = value
+            chosen_span = (a, b)
+            comma_fixed = fixed
+        if key is None or key in chosen:
+            break
+    if chosen is None:
+        raise ValueError("no valid json object found in model response")
+
+    if fenced:
+        _count_repair(repairs, "code_fence")
+    if comma_fixed:
+        _count_repair(repairs, "trailing_comma")
+    if len(spans) > 1:
+        _count_repair(repairs, "multiple_objects")
+    if body[: chosen_span[0]].strip() or body[chosen_span[1] :].strip():
+        _count_repair(repairs, "surrounding_text")
+    return chosen
+
+
+def _recover_truncated_cuts(text: str) -> list[Any]:
+    # Output cut off at completion_max_tokens: keep the cuts entries that were completed.
+    parser = CutStreamParser()
+    try:
+        parser.feed(text)
+    except InvalidCutsError:
+        pass
+    return parser.entries
 
 
 def build_messages(
@@ -88,8 +222,10 @@ def build_messages(
     lines: list[tuple[int, str]],
     target_chars_min: int,
     target_chars_max: int,
+    cuts_only: bool = False,
 ) -> list[dict[str, str]]:
-    system, user_template = _load_prompt_sections()
+    # cuts_only: ask for end_line only (two-phase mode fills titles/summaries afterwards).
+    system, user_template = _prompt_pair("system", "cut_user" if cuts_only else "user")
     user = _render_user_prompt(
         user_template,
         start_line=start_line,
@@ -103,14 +239,136 @@ def build_messages(
     ]
 
 
-def parse_cuts(text: str) -> list[Cut]:
-    obj = _extract_json_object(text)
+def build_choice_messages(
+    *,
+    head: list[tuple[int, str]],
+    band: list[tuple[int, str]],
+    candidates: list[int],
+    target_chars_min: int,
+    target_chars_max: int,
+) -> list[dict[str, str]]:
+    # head: the first lines of the slice (context); band: the lines around the candidate cuts.
+    # candidates: 1-based end_line of each candidate, in order; "[候选 k]" is put after that line.
+    system, user_template = _prompt_pair("choice_system", "choice_user")
+    user = _render_user_prompt(
+        user_template,
+        start_line=head[0][0] if head else band[0][0],
+        target_chars_min=target_chars_min,
+        target_chars_max=target_chars_max,
+    ).replace("{{candidate_count}}", str(len(candidates)))
+    marks = {end_line: k for k, end_line in enumerate(candidates, start=1)}
+    body: list[str] = [f"{i}\t{t}" for i, t in head]
+    if head and band and band[0][0] > head[-1][0] + 1:
+        body.append("……")
+    for i, t in band:
+        if head and i <= head[-1][0]:
+            continue
+        body.append(f"{i}\t{t}")
+        if i in marks:
+            body.append(f"[候选 {marks[i]}]")
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user.rstrip() + "\n" + "\n".join(body)},
+    ]
+
+
+def build_correction_messages(
+    messages: list[dict[str, str]],
+    *,
+    content: str | None,
+    error: str,
+) -> list[dict[str, str]]:
+    # Re-prompt after an unusable reply: the original request, the bad reply, and what was wrong.
+    template = _load_prompt_sections().get("correction")
+    if not template:
+        raise ValueError(f"prompt.md must contain a '## correction' section: {_PROMPT_PATH}")
+    out = list(messages)
+    if content:
+        out.append({"role": "assistant", "content": content})
+    out.append({"role": "user", "content": template.replace("{{error}}", error)})
+    return out
+
+
+def build_summary_messages(items: list[tuple[int, str]]) -> list[dict[str, str]]:
+    # items: (slice_id, text) of the slices to title/summarize in one request.
+    system, user = _prompt_pair("summary_system", "summary_user")
+    body = "\n".join(f'<slice id="{sid}">\n{text}\n</slice>' for sid, text in items)
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user.rstrip() + "\n" + body},
+    ]
+
+
+def parse_summaries(
+    text: str,
+    ids: Iterable[int],
+    *,
+    repairs: dict[str, int] | None = None,
+) -> dict[int, tuple[str | None, str | None]]:
+    # slice_id -> (title, summary) for the requested ids found in the reply.
+    try:
+        obj = _extract_json_object(text, key="slices", repairs=repairs)
+    except ValueError as e:
+        raise InvalidCutsError(str(e), content=text) from e
+    entries = obj.get("slices")
+    if not isinstance(entries, list):
+        raise InvalidCutsError('missing required list field "slices"', content=text)
+    wanted = set(ids)
+    out: dict[int, tuple[str | None, str | None]] = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        sid = entry.get("id")
+        if isinstance(sid, str) and sid.strip().isdigit():
+            sid = int(sid.strip())
+        if not isinstance(sid, int) or sid not in wanted:
+            continue
+        title = entry.get("title")
+        summary = entry.get("summary")
+        out[sid] = (
+            title.strip() if isinstance(title, str) and title.strip() else None,
+            summary.strip() if isinstance(summary, str) and summary.strip() else None,
+        )
+    if not out:
+        raise InvalidCutsError("reply contains none of the requested slices", content=text)
+    return out
+
+
+def parse_choice(text: str, count: int, *, repairs: dict[str, int] | None = None) -> int:
+    # Returns the 1-based candidate number picked by the model.
+    try:
+        obj = _extract_json_object(text, key="choice", repairs=repairs)
+    except ValueError as e:
+        raise InvalidCutsError(str(e), content=text) from e
+    choice = obj.get("choice")
+    if isinstance(choice, str) and choice.strip().isdigit():
+        choice = int(choice.strip())
+    if not isinstance(choice, int) or isinstance(choice, bool):
+        raise InvalidCutsError('missing required integer field "choice"', content=text)
+    if not 1 <= choice <= count:
+        raise InvalidCutsError(f"choice out of range: {choice} (1..{count})", content=text)
+    return choice
+
+
+def parse_cuts(text: str, *, repairs: dict[str, int] | None = None) -> list[Cut]:
+    try:
+        obj = _extract_json_object(text, key="cuts", repairs=repairs)
+    except ValueError as e:
+        entries = _recover_truncated_cuts(text)
+        if not entries:
+            raise InvalidCutsError(str(e), content=text) from e
+        _count_repair(repairs, "truncated")
+        obj = {"cuts": entries}
     raw_cuts = obj.get("cuts")
     if raw_cuts is None:
-        raise ValueError('missing required field "cuts"')
+        raise InvalidCutsError('missing required field "cuts"', content=text)
     if not isinstance(raw_cuts, list):
-        raise ValueError('"cuts" must be a list')
+        raise InvalidCutsError('"cuts" must be a list', content=text)
+
+    return _cuts_from_entries(raw_cuts)
 
+
+def _cuts_from_entries(raw_cuts: Iterable[Any]) -> list[Cut]:
     cuts: list[Cut] = []
     for entry in raw_cuts:
         if not isinstance(entry, dict):
@@ -140,6 +398,88 @@ def parse_cuts(text: str) -> list[Cut]:
     return deduped
 
 
+_CUTS_ARRAY_RE = re.compile(r'"cuts"\s*:\s*\[')
+# A streamed reply that has not opened {"cuts": [ after this many characters is not going to.
+_STREAM_PREAMBLE_MAX = 400
+
+
+class CutStreamParser:
+    # Incremental parser for streamed replies: feed() the content deltas as they arrive and every
+    # element of the "cuts" array is decoded as soon as its closing brace is seen. `done` turns
+    # true once the array is closed, so the caller can stop reading the stream there.
+    # feed() raises InvalidCutsError when the reply is clearly not the expected JSON.
+    def __init__(self) -> None:
+        self._buf = ""
+        self._pos = 0  # next char to scan inside the array
+        self._in_array = False
+        self._depth = 0  # nesting depth relative to the cuts array
+        self._in_string = False
+        self._escape = False
+        self._elem_start = -1
+        self.entries: list[Any] = []
+        self.done = False
+
+    def feed(self, delta: str) -> int:
+        # Returns the number of new array elements decoded from this delta.
+        if self.done:
+            return 0
+        self._buf += delta
+        if not self._in_array:
+            m = _CUTS_ARRAY_RE.search(self._buf)
+            if not m:
+                if len(self._buf.strip()) > _STREAM_PREAMBLE_MAX:
+                    raise InvalidCutsError('model response does not contain a "cuts" array', content=self._buf)
+                return 0
+            self._in_array = True
+            self._pos = m.end()
+        before = len(self.entries)
+        self._scan()
+        return len(self.entries) - before
+
+    def _scan(self) -> None:
+        buf = self._buf
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0:
+                    self._elem_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    if ch == "]":
+                        self.done = True
+                        self._pos = i + 1
+                        return
+                    raise InvalidCutsError("unbalanced braces in streamed cuts", content=buf)
+                self._depth -= 1
+                if self._depth == 0:
+                    chunk = buf[self._elem_start : i + 1]
+                    try:
+                        self.entries.append(json.loads(chunk))
+                    except ValueError as e:
+                        raise InvalidCutsError(f"malformed cut entry: {chunk[:80]!r}", content=buf) from e
+            i += 1
+        self._pos = i
+
+    @property
+    def ascending(self) -> bool:
+        ends = [e.get("end_line") for e in self.entries if isinstance(e, dict)]
+        return all(isinstance(a, int) and isinstance(b, int) and a < b for a, b in zip(ends, ends[1:]))
+
+    def cuts(self) -> list[Cut]:
+        return _cuts_from_entries(self.entries)
+
+
 def validate_cuts(
     *,
     cuts: Iterable[Cut],
@@ -0,0 +1,412 @@
+from __future__ import annotations
+
+import argparse
+import json
+import signal
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+from metrics import REGISTRY
+
+from .config import ProviderConfig, SliceConfig, load_provider_config, load_slice_config
+from .workqueue import Heartbeat, WorkQueue, default_worker_id
+
+# Long-running local slicing service: rules, prompt, configs and the provider pool (clients,
+# per-provider rate limits, prompt-cache contexts) are loaded once and shared by every job.
+# Jobs live in a WorkQueue under <state-dir>/queue, so queued and interrupted jobs survive a
+# restart (an interrupted job is re-queued once its lease expires).
+
+_KINDS = {".txt": "txt", ".epub": "epub"}
+
+
+@dataclass(frozen=True)
+class _Warm:
+    # Everything a job needs that is expensive to build; replaced as a whole on reload, so a
+    # running job keeps the snapshot it started with.
+    providers: dict[str, ProviderConfig]
+    slice_config: SliceConfig
+    rules: list[Any]
+    headings: Any
+    pool: Any  # scheduler.ProviderPool, None in dry-run mode
+    loaded_at: str
+
+
+class SliceService:
+    def __init__(
+        self,
+        state_dir: str | Path,
+        *,
+        llm_config: str | Path,
+        slice_config: str | Path,
+        rules: str | Path,
+        txt_dir: str | Path = "book",
+        max_jobs: int = 2,
+        lease_ttl_s: float = 60.0,
+        max_attempts: int = 3,
+        poll_s: float = 1.0,
+        dry_run: bool = False,
+    ):
+        if max_jobs <= 0:
+            raise ValueError("max_jobs must be positive")
+        self.queue = WorkQueue(Path(state_dir) / "queue", lease_ttl_s=lease_ttl_s, max_attempts=max_attempts)
+        self.llm_config = Path(llm_config)
+        self.slice_config = Path(slice_config)
+        self.rules = Path(rules)
+        self.txt_dir = Path(txt_dir)
+        self.max_jobs = max_jobs
+        self.poll_s = poll_s
+        self.dry_run = dry_run
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._running: dict[str, dict[str, Any]] = {}
+        self._threads: list[threading.Thread] = []
+        self._warm = self._load(None)
+
+    def _load(self, previous: _Warm | None) -> _Warm:
+        from step1_cleaning.config import load_clean_config
+
+        from . import segmenter
+        from .scheduler import ProviderPool, pool_providers
+
+        providers = load_provider_config(self.llm_config)
+        slice_cfg = load_slice_config(self.slice_config)
+        rules, headings = load_clean_config(self.rules)
+        # Parse prompt.md outside the cache first, so a broken edit leaves the old prompt in use.
+        segmenter._load_prompt_sections.__wrapped__()
+        segmenter._load_prompt_sections.cache_clear()
+        segmenter._load_prompt_sections()
+
+        pool = None
+        if not self.dry_run:
+            reuse = (
+                previous is not None
+                and previous.pool is not None
+                and previous.providers == providers
+                and pool_providers(previous.slice_config) == pool_providers(slice_cfg)
+            )
+            pool = previous.pool if reuse else ProviderPool(providers, pool_providers(slice_cfg))
+        return _Warm(
+            providers=providers,
+            slice_config=slice_cfg,
+            rules=rules,
+            headings=headings,
+            pool=pool,
+            loaded_at=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        )
+
+    def reload(self) -> dict[str, Any]:
+        # Raises (ValueError, OSError, ...) and keeps the current configuration if any file is
+        # invalid.
+        with self._lock:
+            warm = self._load(self._warm)
+            pool_kept = warm.pool is not None and warm.pool is self._warm.pool
+            self._warm = warm
+        return {"loaded_at": warm.loaded_at, "provider_pool": "kept" if pool_kept else "rebuilt"}
+
+    def submit(self, path: str | Path, *, priority: int = 0, max_slices: int | None = None) -> str:
+        path = Path(path)
+        kind = _KINDS.get(path.suffix.lower())
+        if kind is None:
+            raise ValueError(f"expected a .txt or .epub file: {path}")
+        if not path.is_file():
+            raise ValueError(f"file not found: {path}")
+        if max_slices is not None and max_slices <= 0:
+            raise ValueError("max_slices must be positive")
+        key = self.queue.enqueue(path, priority=priority, max_slices=max_slices, kind=kind)
+        self._wake.set()
+        return key
+
+    def job(self, key: str) -> dict[str, Any] | None:
+        found = self.queue.find(key)
+        if found is None:
+            return None
+        state, job = found
+        with self._lock:
+            running = self._running.get(key)
+        out = {"state": "running" if state == "claimed" else state, **job}
+        if running is not None:
+            out["progress"] = dict(running)
+        return out
+
+    def status(self) -> dict[str, Any]:
+        with self._lock:
+            warm = self._warm
+            running = {key: dict(v) for key, v in self._running.items()}
+        return {
+            "queue": self.queue.counts(),
+            "running": running,
+            "max_jobs": self.max_jobs,
+            "config_loaded_at": warm.loaded_at,
+            "providers": warm.pool.stats() if warm.pool is not None else {},
+        }
+
+    def start(self) -> None:
+        for i in range(self.max_jobs):
+            worker_id = f"{default_worker_id()}-{i}"
+            t = threading.Thread(target=self._work, args=(worker_id,), name=f"job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self) -> None:
+        # Stops claiming; jobs still running are abandoned and re-queued after their lease expires.
+        self._stop.set()
+        self._wake.set()
+
+    def _work(self, worker_id: str) -> None:
+        while not self._stop.is_set():
+            claim = self.queue.claim(worker_id)
+            if claim is None:
+                self._wake.wait(self.poll_s)
+                self._wake.clear()
+                continue
+            with self._lock:
+                warm = self._warm
+                self._running[claim.key] = {"path": claim.job["txt"], "slices": 0, "lines": 0}
+            started = time.monotonic()
+            with Heartbeat(self.queue, claim) as hb:
+                try:
+                    out_dir, error = self._run(claim.key, claim.job, warm), None
+                except Exception as e:  # noqa: BLE001
+                    out_dir, error = getattr(e, "out_path", None), f"{type(e).__name__}: {e}"
+            with self._lock:
+                self._running.pop(claim.key, None)
+            if hb.lost:
+                continue
+            result = {
+                "worker": worker_id,
+                "status": "error" if error else "ok",
+                "out_dir": str(Path(out_dir).parent) if out_dir else None,
+                "elapsed_s": round(time.monotonic() - started, 3),
+                "finished_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+            }
+            if error:
+                self.queue.release(claim, error)
+            else:
+                self.queue.complete(claim, result)
+
+    def _run(self, key: str, job: dict[str, Any], warm: _Warm) -> Path:
+        from .pipeline import slice_txt_to_json
+
+        path = self.queue.resolve_txt(job)
+        max_slices = int(job["max_slices"]) if job.get("max_slices") else None
+        clients = warm.pool.bind(key, priority=int(job.get("priority", 0))) if warm.pool is not None else None
+
+        def progress_cb(slices_written: int, cur_line: int, total: int) -> None:
+            with self._lock:
+                if key in self._running:
+                    self._running[key].update(slices=slices_written, lines=cur_line)
+
+        if job.get("kind", "txt") == "epub":
+            from step1_cleaning.pipeline import CleanStream
+
+            from .from_epub import slice_epub
+
+            txt_path = self.txt_dir / (path.stem + ".txt")
+            return slice_epub(
+                CleanStream(path, rules=warm.rules, headings=warm.headings),
+                txt_path=txt_path,
+                providers=warm.providers,
+                slice_config=warm.slice_config,
+                out_dir=_out_dir(txt_path, key),
+                max_slices=max_slices,
+                dry_run=self.dry_run,
+                progress_cb=progress_cb,
+                clients=clients,
+            )
+        return slice_txt_to_json(
+            path,
+            providers=warm.providers,
+            slice_config=warm.slice_config,
+            out_dir=_out_dir(path, key),
+            max_slices=max_slices,
+            dry_run=self.dry_run,
+            progress_cb=progress_cb,
+            clients=clients,
+        )
+
+
+def _out_dir(txt: Path, key: str) -> Path:
+    # Like the CLI's <stem>_slice/<timestamp>, plus the job key's random tail so two jobs for the
+    # same book started in the same second do not share a directory.
+    return txt.parent / f"{txt.stem}_slice" / f"{time.strftime('%Y%m%d_%H%M%S', time.localtime())}_{key[-8:]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # GET  /status          queue counts, running jobs, provider pool stats
+    # GET  /jobs/<key>      one job (state: pending | running | done | failed)
+    # POST /jobs            {"path": ".txt or .epub", "priority": 0, "max_slices": 0} -> {"key"}
+    # POST /reload          re-read llm.json, slice.json, rules.json and prompt.md
+    # GET  /metrics         Prometheus text format (see metrics/)
+    server: _Server
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def _reply(self, status: int, data: Any) -> None:
+        body = (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> dict[str, Any]:
+        n = int(self.headers.get("Content-Length") or 0)
+        if not n:
+            return {}
+        data = json.loads(self.rfile.read(n).decode("utf-8"))
+        if not isinstance(data, dict):
+            raise ValueError("request body must be a JSON object")
+        return data
+
+    def do_GET(self) -> None:  # noqa: N802
+        service = self.server.service
+        if self.path == "/status":
+            self._reply(200, service.status())
+            return
+        if self.path == "/metrics":
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path.startswith("/jobs/"):
+            job = service.job(self.path[len("/jobs/") :])
+            if job is None:
+                self._reply(404, {"error": "unknown job"})
+            else:
+                self._reply(200, job)
+            return
+        self._reply(404, {"error": f"not found: {self.path}"})
+
+    def do_POST(self) -> None:  # noqa: N802
+        service = self.server.service
+        try:
+            body = self._body()
+            if self.path == "/jobs":
+                if not body.get("path"):
+                    raise ValueError("path is required")
+                key = service.submit(
+                    body["path"],
+                    priority=int(body.get("priority", 0)),
+                    max_slices=int(body["max_slices"]) if body.get("max_slices") else None,
+                )
+                self._reply(202, {"key": key})
+                return
+            if self.path == "/reload":
+                self._reply(200, service.reload())
+                return
+        except (ValueError, TypeError, OSError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+        self._reply(404, {"error": f"not found: {self.path}"})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], service: SliceService):
+        super().__init__(address, _Handler)
+        self.service = service
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="python -m step2_slice.service",
+        description=(
+            "Local slicing service: keeps rules, prompt and provider clients loaded and runs .txt/.epub jobs "
+            "from a persistent queue (HTTP API on localhost)."
+        ),
+    )
+    p.add_argument("--state-dir", default="service_state", help="Queue directory (default: service_state/)")
+    p.add_argument("--host", default="127.0.0.1", help="Bind address (default 127.0.0.1)")
+    p.add_argument("--port", type=int, default=8765, help="Port (default 8765)")
+    p.add_argument("--max-jobs", type=int, default=2, help="Books sliced at the same time (default 2)")
+    p.add_argument(
+        "--lease-ttl-s",
+        type=float,
+        default=60.0,
+        help="A job left claimed by a stopped service is re-queued after this long (default 60).",
+    )
+    p.add_argument("--max-attempts", type=int, default=3, help="Attempts per job before it fails (default 3).")
+    p.add_argument("--txt-dir", default="book", help="Directory for the Step1 txt of .epub jobs. Default: book/")
+    p.add_argument(
+        "--rules",
+        default=str(Path(__file__).resolve().parents[1] / "step1_cleaning" / "rule" / "rules.json"),
+        help="Path to Step1 rules.json.",
+    )
+    p.add_argument(
+        "--llm-config",
+        default=str(Path(__file__).resolve().parent / "config" / "llm.json"),
+        help="Path to llm.json (providers/base_url/api_key/model).",
+    )
+    p.add_argument(
+        "--slice-config",
+        default=str(Path(__file__).resolve().parent / "config" / "slice.json"),
+        help="Path to slice.json (slice params, retry, chunk tokens).",
+    )
+    p.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Do not call LLM; use deterministic slicing (for offline sanity check).",
+    )
+    return p
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.max_jobs <= 0:
+        build_parser().error("--max-jobs must be positive")
+    llm_path = Path(args.llm_config)
+    slice_path = Path(args.slice_config)
+    if not llm_path.exists():
+        build_parser().error(f"llm config not found: {llm_path} (copy from llm.example.json)")
+    if not slice_path.exists():
+        build_parser().error(f"slice config not found: {slice_path} (copy from slice.example.json)")
+
+    service = SliceService(
+        args.state_dir,
+        llm_config=llm_path,
+        slice_config=slice_path,
+        rules=args.rules,
+        txt_dir=args.txt_dir,
+        max_jobs=args.max_jobs,
+        lease_ttl_s=args.lease_ttl_s,
+        max_attempts=args.max_attempts,
+        dry_run=bool(args.dry_run),
+    )
+    server = _Server((args.host, args.port), service)
+
+    def on_hup(signum: int, frame: Any) -> None:
+        try:
+            print(f"reloaded: {json.dumps(service.reload())}", file=sys.stderr)
+        except Exception as e:  # noqa: BLE001
+            print(f"reload failed, keeping the previous configuration: {e}", file=sys.stderr)
+
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, on_hup)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+
+    service.start()
+    print(f"listening on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,8 +5,9 @@ import sys
 from dataclasses import dataclass
 from pathlib import Path
 
+import metrics
+
 from .config import load_provider_config, load_slice_config
-from .pipeline import SliceRunError, slice_txt_to_json
 
 
 @dataclass
@@ -89,6 +90,17 @@ def build_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Do not call LLM; use deterministic slicing (for offline sanity check).",
     )
+    p.add_argument(
+        "--incremental",
+        nargs="?",
+        const="",
+        metavar="RUN_DIR",
+        help=(
+            "Reuse the slices of a previous run over the unchanged beginning of the txt and only slice the rest "
+            "(default RUN_DIR: newest run next to the output directory)."
+        ),
+    )
+    metrics.add_arguments(p)
     return p
 
 
@@ -106,8 +118,25 @@ def main(argv: list[str] | None = None) -> int:
     if not slice_path.exists():
         build_parser().error(f"slice config not found: {slice_path} (copy from slice.example.json)")
 
+    # Imported here so --help and argument errors return without loading the pipeline.
+    from .pipeline import SliceRunError, slice_txt_to_json
+
     providers = load_provider_config(llm_path)
     slice_cfg = load_slice_config(slice_path)
+    reuse_from = None
+    if args.incremental is not None:
+        from .incremental import find_previous_run
+
+        if args.incremental:
+            reuse_from = Path(args.incremental)
+            if not (reuse_from / "run.json").exists():
+                build_parser().error(f"run.json not found in {reuse_from}")
+        else:
+            runs_dir = Path(args.out_dir).parent if args.out_dir else Path("book") / f"{Path(args.txt).stem}_slice"
+            reuse_from = find_previous_run(runs_dir, exclude=Path(args.out_dir) if args.out_dir else None)
+            if reuse_from is None:
+                print(f"incremental: no previous run in {runs_dir}, slicing the whole book", file=sys.stderr)
+
     max_slices = args.max_slices or None
     total_lines = None if max_slices is not None else _count_non_empty_lines(args.txt)
     progress = ProgressBar(max_slices=max_slices, total_lines=total_lines)
@@ -116,6 +145,7 @@ def main(argv: list[str] | None = None) -> int:
     def progress_cb(slices_written: int, cur_line: int, total: int) -> None:
         progress.update(slices_written=slices_written, cur_line=cur_line, total_lines=total)
 
+    exporters = metrics.start(args)
     try:
         out_path = slice_txt_to_json(
             args.txt,
@@ -125,6 +155,7 @@ def main(argv: list[str] | None = None) -> int:
             max_slices=max_slices,
             dry_run=bool(args.dry_run),
             progress_cb=progress_cb,
+            reuse_from=reuse_from,
         )
     except SliceRunError as e:
         # Keep stdout machine-friendly (print output path), and stderr human-friendly.
@@ -132,6 +163,7 @@ def main(argv: list[str] | None = None) -> int:
         return 2
     finally:
         progress.finish()
+        exporters.close()
 
     print(out_path)
     return 0
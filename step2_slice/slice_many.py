@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import threading
+from pathlib import Path
+
+import metrics
+from catalog import DEFAULT_DB_PATH
+
+from .config import load_provider_config, load_slice_config
+from .near_duplicates import POLICIES as NEAR_DUPLICATE_POLICIES
+from .near_duplicates import run_batch_deduplicated
+from .scheduler import BookOutcome, load_manifest, run_batch
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="python -m step2_slice.slice_many",
+        description=(
+            "Slice many Step1 txt files in one process, sharing one rate-limited provider pool "
+            "(max_concurrency / requests_per_minute in llm.json)."
+        ),
+    )
+    p.add_argument(
+        "manifest",
+        nargs="?",
+        help='Manifest: text file with one txt path per line, or JSON list of {"txt", "priority", "max_slices", "out_dir"}',
+    )
+    p.add_argument(
+        "--max-books",
+        type=int,
+        default=4,
+        help="Max books in flight at once (default 4). Requests are still gated by the provider pool.",
+    )
+    p.add_argument(
+        "--llm-config",
+        default=str(Path(__file__).resolve().parent / "config" / "llm.json"),
+        help="Path to llm.json (providers/base_url/api_key/model).",
+    )
+    p.add_argument(
+        "--slice-config",
+        default=str(Path(__file__).resolve().parent / "config" / "slice.json"),
+        help="Path to slice.json (slice params, retry, chunk tokens).",
+    )
+    p.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Do not call LLM; use deterministic slicing (for offline sanity check).",
+    )
+    p.add_argument(
+        "--catalog",
+        nargs="?",
+        const=str(DEFAULT_DB_PATH),
+        metavar="DB",
+        help=(
+            "Look every book up in the catalog's near-duplicate index before slicing it, and add the books "
+            f"sliced by this batch to it (default DB: {DEFAULT_DB_PATH})"
+        ),
+    )
+    p.add_argument(
+        "--near-duplicates",
+        choices=NEAR_DUPLICATE_POLICIES,
+        default="reuse",
+        help="--catalog: skip near-duplicates of an already sliced book, or copy its slices (default reuse)",
+    )
+    p.add_argument(
+        "--near-duplicate-threshold",
+        type=float,
+        default=0.8,
+        help="--catalog: min estimated text similarity (0-1) of near-duplicate books (default 0.8)",
+    )
+    metrics.add_arguments(p)
+    return p
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if not args.manifest:
+        build_parser().error("manifest is required")
+    if args.max_books <= 0:
+        build_parser().error("--max-books must be positive")
+    if not 0 < args.near_duplicate_threshold <= 1:
+        build_parser().error("--near-duplicate-threshold must be in (0, 1]")
+
+    llm_path = Path(args.llm_config)
+    slice_path = Path(args.slice_config)
+    if not llm_path.exists():
+        build_parser().error(f"llm config not found: {llm_path} (copy from llm.example.json)")
+    if not slice_path.exists():
+        build_parser().error(f"slice config not found: {slice_path} (copy from slice.example.json)")
+
+    providers = load_provider_config(llm_path)
+    slice_cfg = load_slice_config(slice_path)
+    jobs = load_manifest(args.manifest)
+    if not jobs:
+        build_parser().error("manifest is empty")
+
+    lock = threading.Lock()
+    done = 0
+
+    def on_done(outcome: BookOutcome) -> None:
+        nonlocal done
+        with lock:
+            done += 1
+            tail = f" ({outcome.error})" if outcome.error else ""
+            print(
+                f"[{done}/{len(jobs)}] {outcome.status} {outcome.job.txt} {outcome.elapsed_s:.1f}s{tail}",
+                file=sys.stderr,
+            )
+            if outcome.out_path:
+                print(outcome.out_path)
+                sys.stdout.flush()
+
+    exporters = metrics.start(args)
+    try:
+        if args.catalog:
+            outcomes, pool_stats = run_batch_deduplicated(
+                jobs,
+                catalog_path=args.catalog,
+                policy=args.near_duplicates,
+                threshold=args.near_duplicate_threshold,
+                providers=providers,
+                slice_config=slice_cfg,
+                max_books=args.max_books,
+                dry_run=bool(args.dry_run),
+                on_done=on_done,
+            )
+        else:
+            outcomes, pool_stats = run_batch(
+                jobs,
+                providers=providers,
+                slice_config=slice_cfg,
+                max_books=args.max_books,
+                dry_run=bool(args.dry_run),
+                on_done=on_done,
+            )
+    finally:
+        exporters.close()
+    if pool_stats:
+        print("providers: " + json.dumps(pool_stats, ensure_ascii=False), file=sys.stderr)
+    return 0 if all(o.status != "error" for o in outcomes) else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
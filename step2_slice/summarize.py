@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable
+
+from .config import ProviderConfig, SliceConfig, load_provider_config, load_slice_config
+from .providers import build_provider
+from .providers.base import ChatProvider, add_usage
+from .retry import request_with_retries
+from .segmenter import build_summary_messages, parse_summaries
+from .slicing import estimate_tokens
+
+
+# Finished batches are appended here as they complete, so an interrupted pass resumes where it
+# stopped; slices.json itself is only rewritten once, at the end.
+PARTIAL_NAME = "summaries.partial.jsonl"
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _batches(items: list[dict[str, Any]], budget_tokens: int) -> list[list[dict[str, Any]]]:
+    out: list[list[dict[str, Any]]] = []
+    cur: list[dict[str, Any]] = []
+    used = 0
+    for item in items:
+        cost = estimate_tokens(item["text"]) + 16
+        if cur and used + cost > budget_tokens:
+            out.append(cur)
+            cur = []
+            used = 0
+        cur.append(item)
+        used += cost
+    if cur:
+        out.append(cur)
+    return out
+
+
+def _load_partial(path: Path) -> dict[int, dict[str, Any]]:
+    done: dict[int, dict[str, Any]] = {}
+    if not path.exists():
+        return done
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue  # torn last line after a crash
+        done[int(rec["slice_id"])] = rec
+    return done
+
+
+def summarize_run(
+    out_dir: str | Path,
+    *,
+    providers: dict[str, ProviderConfig],
+    slice_config: SliceConfig,
+    clients: dict[str, ChatProvider] | None = None,
+    progress_cb: Callable[[int, int], None] | None = None,
+) -> dict[str, Any]:
+    # Fills in title/summary for every slice of a finished run that lacks them, several slices
+    # per request (up to chunk_input_tokens) and summary_concurrency requests at a time.
+    out_dir = Path(out_dir)
+    slices_path = out_dir / "slices.json"
+    meta_path = out_dir / "run.json"
+    partial_path = out_dir / PARTIAL_NAME
+    items: list[dict[str, Any]] = json.loads(slices_path.read_text(encoding="utf-8"))
+
+    done = _load_partial(partial_path)
+    todo = [
+        it
+        for it in items
+        if it.get("text") and not (it.get("title") and it.get("summary")) and int(it["slice_id"]) not in done
+    ]
+
+    order = slice_config.summary_provider_order or slice_config.provider_order
+    provider_clients: dict[str, tuple[ChatProvider, ProviderConfig]] = {}
+    for name in order:
+        cfg = providers.get(name)
+        if cfg is None:
+            raise ValueError(f"provider not found in llm config: {name}")
+        provider_clients[name] = ((clients or {}).get(name) or build_provider(cfg), cfg)
+    response_format = {"type": slice_config.response_format} if slice_config.response_format else None
+
+    lock = threading.Lock()
+    error_counts: dict[str, int] = {}
+    json_repairs: dict[str, int] = {}
+    usage_totals: dict[str, Any] = {}
+    batches = _batches(todo, slice_config.chunk_input_tokens)
+    finished = 0
+
+    with partial_path.open("a", encoding="utf-8") as log:
+        if partial_path.stat().st_size and not partial_path.read_bytes().endswith(b"\n"):
+            log.write("\n")  # do not glue the next record onto a torn line
+
+        def run_batch(batch: list[dict[str, Any]]) -> None:
+            nonlocal finished
+            ids = [int(it["slice_id"]) for it in batch]
+            messages = build_summary_messages([(sid, it["text"]) for sid, it in zip(ids, batch)])
+            repairs: dict[str, int] = {}
+            errors: dict[str, int] = {}
+            usage: dict[str, Any] = {}
+
+            def call(client: ChatProvider, pcfg: ProviderConfig, msgs: list[dict[str, str]]) -> Any:
+                t0 = time.monotonic()
+                result = client.chat_completions(
+                    model=pcfg.model,
+                    messages=msgs,
+                    max_tokens=slice_config.summary_completion_max_tokens,
+                    temperature=slice_config.temperature,
+                    response_format=response_format,
+                    timeout_s=slice_config.timeout_s,
+                )
+                add_usage(usage, result, elapsed_s=time.monotonic() - t0)
+                return parse_summaries(result.content, ids, repairs=repairs)
+
+            outcome = request_with_retries(
+                provider_clients,
+                messages,
+                call,
+                slice_config=slice_config,
+                error_counts=errors,
+            )
+            with lock:
+                for counts, into in ((errors, error_counts), (repairs, json_repairs), (usage, usage_totals)):
+                    for k, v in counts.items():
+                        into[k] = into.get(k, 0) + v
+                for sid, (title, summary) in (outcome.value or {}).items():
+                    rec = {"slice_id": sid, "title": title, "summary": summary, "model": outcome.model}
+                    log.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                    done[sid] = rec
+                log.flush()
+                finished += 1
+                if progress_cb:
+                    progress_cb(finished, len(batches))
+
+        with ThreadPoolExecutor(max_workers=slice_config.summary_concurrency, thread_name_prefix="summary") as ex:
+            list(ex.map(run_batch, batches))
+
+    for it in items:
+        rec = done.get(int(it["slice_id"]))
+        if rec is None:
+            continue
+        if rec.get("title") and not it.get("title"):
+            it["title"] = rec["title"]
+        if rec.get("summary") and not it.get("summary"):
+            it["summary"] = rec["summary"]
+    _write_atomic(slices_path, json.dumps(items, ensure_ascii=False, indent=2) + "\n")
+
+    missing = sum(1 for it in items if it.get("text") and not (it.get("title") and it.get("summary")))
+    stats: dict[str, Any] = {
+        "provider_order": order,
+        "requests": len(batches),
+        "slices_requested": len(todo),
+        "missing": missing,
+    }
+    if error_counts:
+        stats["request_errors"] = error_counts
+    if json_repairs:
+        stats["json_repairs"] = json_repairs
+    if usage_totals:
+        stats["usage"] = {k: round(v, 3) if isinstance(v, float) else v for k, v in usage_totals.items()}
+    if meta_path.exists():
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        meta["summaries"] = stats
+        _write_atomic(meta_path, json.dumps(meta, ensure_ascii=False, indent=2) + "\n")
+    if missing == 0:
+        partial_path.unlink(missing_ok=True)
+    return stats
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="python -m step2_slice.summarize",
+        description=(
+            "Fill in title/summary for the slices of a finished run (two-phase mode). "
+            "Resumable: re-run on the same directory to continue after an interruption."
+        ),
+    )
+    p.add_argument("run", nargs="?", help="Run directory (containing slices.json) or path to slices.json")
+    p.add_argument(
+        "--llm-config",
+        default=str(Path(__file__).resolve().parent / "config" / "llm.json"),
+        help="Path to llm.json (providers/base_url/api_key/model).",
+    )
+    p.add_argument(
+        "--slice-config",
+        default=str(Path(__file__).resolve().parent / "config" / "slice.json"),
+        help="Path to slice.json (summary_provider_order, summary_concurrency, ...).",
+    )
+    return p
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if not args.run:
+        build_parser().error("run directory is required")
+    run = Path(args.run)
+    out_dir = run.parent if run.name == "slices.json" else run
+    if not (out_dir / "slices.json").exists():
+        build_parser().error(f"slices.json not found in {out_dir}")
+
+    llm_path = Path(args.llm_config)
+    slice_path = Path(args.slice_config)
+    if not llm_path.exists():
+        build_parser().error(f"llm config not found: {llm_path} (copy from llm.example.json)")
+    if not slice_path.exists():
+        build_parser().error(f"slice config not found: {slice_path} (copy from slice.example.json)")
+
+    def progress_cb(finished: int, total: int) -> None:
+        sys.stderr.write(f"\rsummaries {finished}/{total}")
+        sys.stderr.flush()
+
+    stats = summarize_run(
+        out_dir,
+        providers=load_provider_config(llm_path),
+        slice_config=load_slice_config(slice_path),
+        progress_cb=progress_cb,
+    )
+    sys.stderr.write("\n")
+    print(json.dumps(stats, ensure_ascii=False))
+    return 0 if stats["missing"] == 0 else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import metrics
+
+from .config import ProviderConfig, SliceConfig, load_provider_config, load_slice_config
+from .pipeline import SliceRunError, slice_txt_to_json
+from .workqueue import Claim, Heartbeat, WorkQueue, default_worker_id
+
+
+def _publish_dir(tmp: Path, final: Path) -> Path:
+    # Point run.json at the final location, then move the finished run dir into place with one
+    # rename, so readers never observe a half-written slices.json/run.json.
+    meta_path = tmp / "run.json"
+    if meta_path.exists():
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        meta["output_file"] = str(final / "slices.json")
+        tmp_meta = tmp / ".run.json.tmp"
+        tmp_meta.write_text(json.dumps(meta, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        os.replace(tmp_meta, meta_path)
+    candidate = final
+    n = 1
+    while True:
+        try:
+            os.rename(tmp, candidate)
+            return candidate
+        except OSError:
+            if not candidate.exists():
+                raise
+            n += 1
+            candidate = final.with_name(f"{final.name}_{n}")
+
+
+def run_job(
+    queue: WorkQueue,
+    claim: Claim,
+    *,
+    providers: dict[str, ProviderConfig],
+    slice_config: SliceConfig,
+    worker_id: str,
+    dry_run: bool = False,
+) -> dict[str, Any]:
+    if claim.job.get("kind", "txt") != "txt":
+        error = f"unsupported job kind for this worker: {claim.job.get('kind')}"
+        queue.fail(claim, error)
+        return {"worker": worker_id, "out_dir": None, "status": "error", "error": error}
+    txt = queue.resolve_txt(claim.job)
+    final = txt.parent / f"{txt.stem}_slice" / time.strftime("%Y%m%d_%H%M%S", time.localtime())
+    tmp = final.parent / f".{final.name}.{claim.key}.tmp"
+    max_slices = claim.job.get("max_slices")
+    error: str | None = None
+    with Heartbeat(queue, claim) as hb:
+        try:
+            slice_txt_to_json(
+                txt,
+                providers=providers,
+                slice_config=slice_config,
+                out_dir=tmp,
+                max_slices=int(max_slices) if max_slices else None,
+                dry_run=dry_run,
+            )
+        except SliceRunError as e:
+            error = str(e)
+        except Exception as e:  # noqa: BLE001
+            error = f"{type(e).__name__}: {e}"
+    out_dir = _publish_dir(tmp, final) if tmp.exists() else None
+    result = {
+        "worker": worker_id,
+        "out_dir": str(out_dir) if out_dir else None,
+        "status": "error" if error else "ok",
+        "finished_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+    }
+    if hb.lost:
+        result["status"] = "lost"
+        return result
+    if error:
+        result["error"] = error
+        queue.release(claim, error)
+    else:
+        queue.complete(claim, result)
+    return result
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="python -m step2_slice.worker",
+        description="Multi-node slicing over a shared directory queue (atomic-rename claims + lease heartbeats).",
+    )
+    sub = p.add_subparsers(dest="cmd")
+
+    enq = sub.add_parser("enqueue", help="Add Step1 txt files to the queue.")
+    enq.add_argument("txt", nargs="+", help="Path(s) to Step1 output .txt")
+    enq.add_argument("--priority", type=int, default=0, help="Higher is claimed first (default 0).")
+    enq.add_argument("--max-slices", type=int, default=0, help="Max slices per book (0 means no limit).")
+
+    work = sub.add_parser("work", help="Claim and slice books until stopped.")
+    work.add_argument("--worker-id", default=default_worker_id(), help="Default: <hostname>-<pid>")
+    work.add_argument("--poll-s", type=float, default=5.0, help="Sleep between polls when idle (default 5).")
+    work.add_argument("--exit-when-empty", action="store_true", help="Exit once no job can be claimed.")
+    work.add_argument(
+        "--llm-config",
+        default=str(Path(__file__).resolve().parent / "config" / "llm.json"),
+        help="Path to llm.json (providers/base_url/api_key/model).",
+    )
+    work.add_argument(
+        "--slice-config",
+        default=str(Path(__file__).resolve().parent / "config" / "slice.json"),
+        help="Path to slice.json (slice params, retry, chunk tokens).",
+    )
+    work.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Do not call LLM; use deterministic slicing (for offline sanity check).",
+    )
+    metrics.add_arguments(work)
+
+    sub.add_parser("status", help="Print job counts per state.")
+
+    for sp in (enq, work, sub.choices["status"]):
+        sp.add_argument("--queue", required=True, help="Queue directory on the shared mount.")
+        sp.add_argument(
+            "--lease-ttl-s",
+            type=float,
+            default=300.0,
+            help="Claims whose lease is not refreshed for this long are re-queued (default 300).",
+        )
+        sp.add_argument("--max-attempts", type=int, default=3, help="Attempts per job before it fails (default 3).")
+    return p
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if not args.cmd:
+        build_parser().error("command is required (enqueue | work | status)")
+    queue = WorkQueue(args.queue, lease_ttl_s=args.lease_ttl_s, max_attempts=args.max_attempts)
+
+    if args.cmd == "enqueue":
+        for txt in args.txt:
+            if not Path(txt).exists():
+                build_parser().error(f"txt not found: {txt}")
+            print(queue.enqueue(txt, priority=args.priority, max_slices=args.max_slices or None))
+        return 0
+
+    if args.cmd == "status":
+        print(json.dumps(queue.counts()))
+        return 0
+
+    llm_path = Path(args.llm_config)
+    slice_path = Path(args.slice_config)
+    if not llm_path.exists():
+        build_parser().error(f"llm config not found: {llm_path} (copy from llm.example.json)")
+    if not slice_path.exists():
+        build_parser().error(f"slice config not found: {slice_path} (copy from slice.example.json)")
+    providers = load_provider_config(llm_path)
+    slice_cfg = load_slice_config(slice_path)
+
+    exporters = metrics.start(args)
+    try:
+        while True:
+            claim = queue.claim(args.worker_id)
+            if claim is None:
+                if args.exit_when_empty:
+                    return 0
+                time.sleep(args.poll_s)
+                continue
+            print(f"{args.worker_id} claimed {claim.key} ({claim.job['txt']})", file=sys.stderr)
+            result = run_job(
+                queue,
+                claim,
+                providers=providers,
+                slice_config=slice_cfg,
+                worker_id=args.worker_id,
+                dry_run=bool(args.dry_run),
+            )
+            print(f"{args.worker_id} {result['status']} {claim.key} -> {result.get('out_dir')}", file=sys.stderr)
+            if result.get("out_dir"):
+                print(Path(result["out_dir"]) / "slices.json")
+                sys.stdout.flush()
+    finally:
+        exporters.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
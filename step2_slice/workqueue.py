@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+
+# Queue layout on a shared POSIX mount (no broker):
+#   pending/<key>.json   waiting jobs; sorted name order = priority, then FIFO
+#   claimed/<key>.json   claimed by exactly one worker (atomic rename out of pending/)
+#   claimed/<key>.<token>.lease  owner info, one file per claim; its mtime is the heartbeat
+#   done/<key>.json      finished (job + result)
+#   failed/<key>.json    gave up after max_attempts
+_STATES = ("pending", "claimed", "done", "failed")
+
+
+@dataclass(frozen=True)
+class Claim:
+    key: str
+    job: dict[str, Any]
+    path: Path  # claimed/<key>.json
+    lease: Path
+
+
+def _write_json_atomic(path: Path, data: Any) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        f.write(json.dumps(data, ensure_ascii=False, indent=2) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    def __init__(self, root: str | Path, *, lease_ttl_s: float = 300.0, max_attempts: int = 3):
+        if lease_ttl_s <= 0:
+            raise ValueError("lease_ttl_s must be positive")
+        self.root = Path(root)
+        self.lease_ttl_s = lease_ttl_s
+        self.max_attempts = max_attempts
+        for state in _STATES:
+            (self.root / state).mkdir(parents=True, exist_ok=True)
+
+    def _dir(self, state: str) -> Path:
+        return self.root / state
+
+    def enqueue(
+        self,
+        txt: str | Path,
+        *,
+        priority: int = 0,
+        max_slices: int | None = None,
+        kind: str = "txt",
+    ) -> str:
+        # kind: "txt" (Step1 output) or "epub" (cleaned by the consumer first; service.py only).
+        txt = Path(txt).resolve()
+        # Store paths relative to the queue so nodes may mount the share at different places.
+        try:
+            rel = os.path.relpath(txt, self.root.resolve())
+        except ValueError:
+            rel = str(txt)
+        priority = max(-4999, min(4999, int(priority)))
+        key = f"{5000 - priority:04d}-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        job = {
+            "key": key,
+            "kind": kind,
+            "txt": rel,
+            "priority": priority,
+            "max_slices": max_slices,
+            "attempts": 0,
+            "enqueued_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        }
+        _write_json_atomic(self._dir("pending") / f"{key}.json", job)
+        return key
+
+    def resolve_txt(self, job: dict[str, Any]) -> Path:
+        p = Path(job["txt"])
+        return p if p.is_absolute() else (self.root / p).resolve()
+
+    def _leases(self, key: str) -> list[Path]:
+        return list(self._dir("claimed").glob(f"{key}.*.lease"))
+
+    def claim(self, worker_id: str) -> Claim | None:
+        self.reap_expired()
+        for path in sorted(self._dir("pending").glob("*.json")):
+            key = path.stem
+            target = self._dir("claimed") / path.name
+            try:
+                os.rename(path, target)  # atomic: exactly one worker wins
+            except FileNotFoundError:
+                continue
+            token = uuid.uuid4().hex[:12]
+            lease = self._dir("claimed") / f"{key}.{token}.lease"
+            _write_json_atomic(lease, {"worker": worker_id, "claimed_at": time.time()})
+            job = json.loads(target.read_text(encoding="utf-8"))
+            job["attempts"] = int(job.get("attempts", 0)) + 1
+            job["worker"] = worker_id
+            job["claim"] = token
+            _write_json_atomic(target, job)
+            claim = Claim(key=key, job=job, path=target, lease=lease)
+            if job["attempts"] > self.max_attempts:
+                self.fail(claim, "max attempts exceeded")
+                continue
+            return claim
+        return None
+
+    def heartbeat(self, claim: Claim) -> bool:
+        # The lease file name is unique per claim; reaping deletes it.
+        try:
+            os.utime(claim.lease)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _age(self, path: Path, now: float) -> float | None:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        # rename() updates ctime, so a freshly claimed job without its lease yet is not "old".
+        return now - max(st.st_mtime, st.st_ctime)
+
+    def reap_expired(self) -> list[str]:
+        # A claim is expired when its newest lease is older than the TTL *and* the claimed job
+        # file itself is older than the TTL. The second check protects a job that was just
+        # requeued and re-claimed by someone else (claiming rewrites the file) from a reaper
+        # acting on a stale observation.
+        now = time.time()
+        reaped: list[str] = []
+        for path in self._dir("claimed").glob("*.json"):
+            key = path.stem
+            leases = self._leases(key)
+            ages = [a for a in (self._age(p, now) for p in leases) if a is not None]
+            if ages and min(ages) <= self.lease_ttl_s:
+                continue
+            job_age = self._age(path, now)
+            if job_age is None or job_age <= self.lease_ttl_s:
+                continue
+            for lease in leases:
+                try:
+                    lease.unlink()
+                except FileNotFoundError:
+                    pass
+            try:
+                os.rename(path, self._dir("pending") / path.name)  # atomic: one reaper wins
+            except FileNotFoundError:
+                continue
+            reaped.append(key)
+        return reaped
+
+    def _owns(self, claim: Claim) -> bool:
+        # After expiry the same claimed/<key>.json may belong to a newer claim.
+        if not claim.lease.exists():
+            return False
+        try:
+            current = json.loads(claim.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return False
+        return current.get("claim") == claim.job.get("claim")
+
+    def _finish(self, claim: Claim, state: str, result: dict[str, Any]) -> bool:
+        if not self._owns(claim):
+            return False
+        job = {**claim.job, "result": result}
+        _write_json_atomic(claim.path, job)
+        try:
+            os.rename(claim.path, self._dir(state) / claim.path.name)
+        except FileNotFoundError:
+            return False  # lease expired and the job was handed to another worker
+        try:
+            claim.lease.unlink()
+        except FileNotFoundError:
+            pass
+        return True
+
+    def complete(self, claim: Claim, result: dict[str, Any]) -> bool:
+        return self._finish(claim, "done", result)
+
+    def fail(self, claim: Claim, error: str) -> bool:
+        return self._finish(claim, "failed", {"error": error})
+
+    def release(self, claim: Claim, error: str) -> bool:
+        # Put a job back for another attempt (or fail it once max_attempts is reached).
+        if int(claim.job.get("attempts", 0)) >= self.max_attempts:
+            return self.fail(claim, error)
+        if not self._owns(claim):
+            return False
+        job = {**claim.job, "last_error": error}
+        _write_json_atomic(claim.path, job)
+        try:
+            claim.lease.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            os.rename(claim.path, self._dir("pending") / claim.path.name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def find(self, key: str) -> tuple[str, dict[str, Any]] | None:
+        # (state, job) for a job key, or None if unknown.
+        for state in _STATES:
+            try:
+                return state, json.loads((self._dir(state) / f"{key}.json").read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                continue
+        return None
+
+    def counts(self) -> dict[str, int]:
+        return {state: len(list(self._dir(state).glob("*.json"))) for state in _STATES}
+
+
+class Heartbeat:
+    # Touches the lease every lease_ttl/3 seconds while a job runs.
+    def __init__(self, queue: WorkQueue, claim: Claim):
+        self._queue = queue
+        self._claim = claim
+        self._stop = threading.Event()
+        self.lost = False
+        self._thread = threading.Thread(target=self._run, name=f"lease:{claim.key}", daemon=True)
+
+    def _run(self) -> None:
+        interval = max(self._queue.lease_ttl_s / 3.0, 0.1)
+        while not self._stop.wait(interval):
+            if not self._queue.heartbeat(self._claim):
+                self.lost = True
+                return
+
+    def __enter__(self) -> Heartbeat:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()